@@ -0,0 +1,85 @@
+"""
+Benchmark del ensamblado del video final: stream copy (ffmpeg concat) frente a
+recodificación con moviepy.
+
+Genera clips sintéticos con el formato de seedance + mmaudio (H.264/AAC, 720x1280)
+y mide el tiempo de pared y la memoria máxima (RSS, incluyendo los procesos de
+ffmpeg) de cada método, cada uno en su propio proceso.
+
+Uso:
+    python -m benchmarks.bench_final_cut --clips 5 --seconds 5
+"""
+import argparse
+import multiprocessing
+import os
+import resource
+import subprocess
+import tempfile
+import time
+
+
+def _make_clips(directory: str, count: int, seconds: float) -> list:
+    from src.logic.video_editor import _ffmpeg_exe
+
+    clip_paths = []
+    for i in range(count):
+        clip_path = os.path.join(directory, f"clip_{i}.mp4")
+        subprocess.run(
+            [_ffmpeg_exe(), "-hide_banner", "-loglevel", "error", "-y",
+             "-f", "lavfi", "-i", "testsrc2=size=720x1280:rate=24",
+             "-f", "lavfi", "-i", f"sine=frequency={220 + 110 * i}:sample_rate=44100",
+             "-t", str(seconds), "-c:v", "libx264", "-pix_fmt", "yuv420p", "-c:a", "aac", "-shortest",
+             clip_path],
+            check=True
+        )
+        clip_paths.append(clip_path)
+    return clip_paths
+
+def _stream_copy(clip_paths: list, output_path: str):
+    from src.logic.video_editor import assemble_final_video
+    assemble_final_video("bench", clip_paths, output_path)
+
+def _moviepy_reencode(clip_paths: list, output_path: str):
+    from moviepy.editor import VideoFileClip, concatenate_videoclips
+    clips = [VideoFileClip(clip_path) for clip_path in clip_paths]
+    final = concatenate_videoclips(clips)
+    final.write_videofile(output_path, codec="libx264", audio_codec="aac", logger=None)
+    for clip in clips:
+        clip.close()
+
+def _measure(method, clip_paths: list, output_path: str, queue):
+    start = time.perf_counter()
+    method(clip_paths, output_path)
+    elapsed = time.perf_counter() - start
+    # ru_maxrss está en KB en Linux.
+    own_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children_kb = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    queue.put((elapsed, max(own_kb, children_kb) / 1024, os.path.getsize(output_path)))
+
+def run_method(method, clip_paths: list, output_path: str) -> tuple:
+    queue = multiprocessing.Queue()
+    process = multiprocessing.Process(target=_measure, args=(method, clip_paths, output_path, queue))
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clips", type=int, default=5, help="Número de clips (escenas).")
+    parser.add_argument("--seconds", type=float, default=5, help="Duración de cada clip.")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        print(f"Generando {args.clips} clips de {args.seconds}s...")
+        clip_paths = _make_clips(directory, args.clips, args.seconds)
+
+        methods = [("stream copy (ffmpeg concat)", _stream_copy), ("recodificación (moviepy)", _moviepy_reencode)]
+        print(f"\n{'Método':<30} {'Tiempo (s)':>10} {'RSS máx (MB)':>13} {'Tamaño (MB)':>12}")
+        for name, method in methods:
+            output_path = os.path.join(directory, f"{method.__name__}.mp4")
+            elapsed, peak_mb, size = run_method(method, clip_paths, output_path)
+            print(f"{name:<30} {elapsed:>10.2f} {peak_mb:>13.1f} {size / 1024 ** 2:>12.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,230 @@
+"""
+Benchmark end-to-end del pipeline sin red: ejecuta `main.run_pipeline` (y con él
+`get_graph()`) sobre un ChatOpenAI falso, un Replicate falso y SQLite.
+
+Reporta ideas/hora, p50/p95 de cada nodo del grafo y la memoria máxima, y puede
+guardar el resultado en JSON (junto con el commit actual) para comparar los
+cambios de concurrencia o caché entre commits.
+
+Uso:
+    python -m benchmarks.bench_pipeline --ideas 10 --workers 2 --output bench.json
+    python -m benchmarks.bench_pipeline --latency ideogram=1,seedance=4,mmaudio=2,llm=1 --error-rate 0.05
+    python -m benchmarks.bench_pipeline --asset-store s3   # Assets en un S3 falso local (requiere boto3)
+    python -m benchmarks.bench_pipeline --upload-mbps 20 --no-image-prep   # Subida de los PNG originales
+    python -m benchmarks.bench_pipeline --sync-predictions   # `replicate.run` en lugar del PredictionManager
+
+Por defecto las predicciones van, como en producción, por el `PredictionManager`
+contra un servidor de predicciones falso local (`FakeReplicateServer`).
+"""
+import argparse
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_LATENCY = "llm=0.2,ideogram=0.3,seedance=1.0,mmaudio=0.5"
+
+
+# Nodos que se ejecutan en paralelo (uno por escena, con `Send`).
+FAN_OUT_NODES = {"generate_scene"}
+
+
+class TimedGraph:
+    """
+    Envuelve el grafo compilado y registra la duración de cada nodo en `app.stream`.
+
+    Los nodos en paralelo se miden desde el final del último nodo secuencial,
+    no desde el evento anterior.
+    """
+    def __init__(self, app):
+        self.app = app
+        self.timings = {}
+        self._lock = threading.Lock()
+
+    def stream(self, initial_state, *args, **kwargs):
+        last = step_start = time.perf_counter()
+        for event in self.app.stream(initial_state, *args, **kwargs):
+            now = time.perf_counter()
+            with self._lock:
+                for node_name in event:
+                    start = step_start if node_name in FAN_OUT_NODES else last
+                    self.timings.setdefault(node_name, []).append(now - start)
+            if not FAN_OUT_NODES.intersection(event):
+                step_start = now
+            last = now
+            yield event
+
+def _percentile(values, fraction):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+def _parse_latency(spec: str) -> dict:
+    return {name: float(value) for name, value in (item.split("=") for item in spec.split(",") if item)}
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT,
+                              capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return "unknown"
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--ideas", type=int, default=5, help="Número de ideas a procesar.")
+    parser.add_argument("--workers", type=int, default=1, help="Ideas procesadas en paralelo.")
+    parser.add_argument("--scenes", type=int, default=3, help="Escenas por video (NUM_SCENES).")
+    parser.add_argument("--latency", default=DEFAULT_LATENCY, help="Latencias simuladas por backend, en segundos.")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Probabilidad de fallo de cada llamada a Replicate.")
+    parser.add_argument("--clip-seconds", type=float, default=2.0, help="Duración de los clips simulados.")
+    parser.add_argument("--cache", action="store_true", help="Activa la caché de salidas de Replicate.")
+    parser.add_argument("--sync-predictions", action="store_true",
+                        help="Usa `replicate.run` (REPLICATE_ASYNC_PREDICTIONS=false) en lugar del PredictionManager.")
+    parser.add_argument("--poll-interval", type=float, default=0.05,
+                        help="Intervalo de sondeo de las predicciones (REPLICATE_POLL_INTERVAL), en segundos.")
+    parser.add_argument("--asset-store", choices=["local", "s3"], default="local",
+                        help="Almacén de assets; 's3' usa un servicio S3 falso local.")
+    parser.add_argument("--upload-mbps", type=float, default=0.0,
+                        help="Ancho de banda simulado de subida a Replicate, en Mbit/s (0 = sin límite).")
+    parser.add_argument("--no-image-prep", action="store_true",
+                        help="Sube a seedance las imágenes originales, sin reducirlas ni recodificarlas.")
+    parser.add_argument("--database-url", default=None, help="Base de datos (por defecto, SQLite temporal).")
+    parser.add_argument("--output", default=None, help="Ruta del JSON con los resultados.")
+    args = parser.parse_args()
+
+    latency = _parse_latency(args.latency)
+    workdir = tempfile.mkdtemp(prefix="bench_pipeline_")
+
+    # La configuración se lee al importar `src`, así que el entorno se prepara antes.
+    os.environ.update({
+        "DATABASE_URL": args.database_url or f"sqlite:///{os.path.join(workdir, 'bench.db')}",
+        "NUM_SCENES": str(args.scenes),
+        "SCENE_WORKERS": str(args.scenes),
+        "REPLICATE_ASYNC_PREDICTIONS": "false" if args.sync_predictions else "true",
+        "REPLICATE_POLL_INTERVAL": str(args.poll_interval),
+        "REPLICATE_CACHE_ENABLED": "true" if args.cache else "false",
+        "REPLICATE_CACHE_DIR": os.path.join(workdir, "cache"),
+        "IMAGE_PREP_ENABLED": "false" if args.no_image_prep else "true",
+        "ASSET_STORE": args.asset_store,
+        "ASSET_STORE_ROOT": os.path.join(workdir, "assets"),
+        "ASSET_CACHE_DIR": os.path.join(workdir, "asset_cache"),
+        "OPENAI_API_KEY": "fake",
+        "REPLICATE_API_TOKEN": "fake",
+    })
+    sys.path.insert(0, REPO_ROOT)
+    os.chdir(workdir)
+    if args.asset_store == "s3":
+        from benchmarks.fakes import FakeS3
+        fake_s3 = FakeS3().start()
+        os.environ.update({
+            "ASSET_S3_BUCKET": "bench",
+            "ASSET_S3_ENDPOINT_URL": fake_s3.endpoint_url,
+            "AWS_ACCESS_KEY_ID": "fake",
+            "AWS_SECRET_ACCESS_KEY": "fake",
+        })
+
+    from benchmarks.fakes import FakeReplicate, FakeReplicateServer, FakeScriptLLM
+    fake_replicate = FakeReplicate(os.path.join(workdir, "fixtures"), latency=latency,
+                                   error_rate=args.error_rate, clip_seconds=args.clip_seconds,
+                                   upload_mbps=args.upload_mbps)
+    fake_server = None
+    if not args.sync_predictions:
+        fake_server = FakeReplicateServer(fake_replicate).start()
+        os.environ["REPLICATE_BASE_URL"] = fake_server.base_url
+
+    import main as service
+    from src.database.database import init_db, get_db
+    from src.database.models import Idea
+    from src.logic import content_generator, image_prep
+
+    fake_replicate.install()
+    if fake_server is not None:
+        from src.logic.video_editor import AUDIO_MODEL
+        model, version = AUDIO_MODEL.split(":")
+        fake_server.versions[version] = model
+    fake_llm = FakeScriptLLM(latency=latency.get("llm", 0.0))
+    content_generator.ChatOpenAI = lambda **kwargs: fake_llm
+
+    timed_graph = TimedGraph(service.get_graph())
+    service.get_graph = lambda: timed_graph
+
+    init_db()
+    with get_db() as db:
+        ideas = [Idea(text=f"Idea de benchmark número {i}", status='processing') for i in range(args.ideas)]
+        db.add_all(ideas)
+        db.commit()
+        idea_rows = [(idea.id, idea.text) for idea in ideas]
+
+    print(f"Procesando {args.ideas} ideas con {args.workers} workers (latencias: {latency})...")
+    tracemalloc.start()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.workers) as executor:
+        list(executor.map(lambda row: service.run_pipeline(row[1], row[0]), idea_rows))
+    elapsed = time.perf_counter() - start
+    _, python_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    if fake_server is not None:
+        fake_server.stop()
+
+    with get_db() as db:
+        completed = db.query(Idea).filter(Idea.status == 'completed').count()
+
+    results = {
+        "commit": _git_commit(),
+        "params": vars(args),
+        "elapsed_s": round(elapsed, 3),
+        "ideas_completed": completed,
+        "ideas_per_hour": round(completed / elapsed * 3600, 1) if elapsed else 0.0,
+        "nodes": {
+            node_name: {
+                "count": len(values),
+                "p50_s": round(statistics.median(values), 3),
+                "p95_s": round(_percentile(values, 0.95), 3),
+            }
+            for node_name, values in timed_graph.timings.items()
+        },
+        "replicate_calls": fake_replicate.calls,
+        "replicate_upload_bytes": fake_replicate.upload_bytes,
+        "replicate_predictions": (
+            {status: sum(1 for p in fake_server.predictions.values() if p["status"] == status)
+             for status in sorted({p["status"] for p in fake_server.predictions.values()})}
+            if fake_server is not None else None
+        ),
+        "image_prep": image_prep.stats(),
+        "peak_python_mb": round(python_peak / 1024 ** 2, 1),
+        # ru_maxrss está en KB en Linux.
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+    print(f"\n--- Resultados (commit {results['commit']}) ---")
+    print(f"Ideas completadas: {completed}/{args.ideas} en {elapsed:.1f}s -> {results['ideas_per_hour']} ideas/hora")
+    print(f"{'Nodo':<22} {'n':>4} {'p50 (s)':>9} {'p95 (s)':>9}")
+    for node_name, stats in results["nodes"].items():
+        print(f"{node_name:<22} {stats['count']:>4} {stats['p50_s']:>9.3f} {stats['p95_s']:>9.3f}")
+    print(f"Llamadas a Replicate: {fake_replicate.calls}")
+    print(f"Bytes subidos a Replicate: {fake_replicate.upload_bytes}")
+    if results["replicate_predictions"] is not None:
+        print(f"Predicciones (PredictionManager): {results['replicate_predictions']}")
+    prep = results["image_prep"]
+    if prep["images"]:
+        print(f"Imágenes para seedance: {prep['original_bytes'] / prep['images'] / 1024:.0f} KB -> "
+              f"{prep['prepared_bytes'] / prep['images'] / 1024:.0f} KB de media "
+              f"({prep['prepared']} preparadas, {prep['reused']} reutilizadas)")
+    print(f"Memoria máxima: {results['peak_rss_mb']} MB RSS, {results['peak_python_mb']} MB en objetos Python")
+
+    if args.output:
+        output_path = os.path.join(REPO_ROOT, args.output) if not os.path.isabs(args.output) else args.output
+        with open(output_path, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Resultados guardados en {output_path}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,653 @@
+"""
+Sustitutos deterministas de Replicate para ejecutar el pipeline sin red ni coste.
+
+`FakeReplicate.run` reemplaza a `replicate.run`: simula la latencia de cada
+modelo, falla con la probabilidad configurada y devuelve objetos con `.url`
+(como los `FileOutput` reales) que apuntan a `https://fake.replicate.local/...`.
+Esas URLs las sirve `LocalFileAdapter` montado sobre la sesión HTTP compartida,
+de modo que las descargas recorren el código real de `transfer.iter_download`.
+
+`FakeReplicateServer` expone el mismo comportamiento como API HTTP de
+predicciones, para ejecutar el `PredictionManager` con `REPLICATE_BASE_URL`.
+
+`FakeScriptLLM` sustituye a `ChatOpenAI` en la generación de guiones.
+"""
+import io
+import os
+import random
+import re
+import subprocess
+import threading
+import time
+from typing import Callable, Dict, Optional, Type
+import requests
+from langchain_core.messages import AIMessage
+from langchain_core.runnables import RunnableLambda
+from pydantic import BaseModel
+from requests.adapters import BaseAdapter
+from replicate.exceptions import ReplicateError
+from src.logic.schemas import ScriptStructure, Scene
+
+FAKE_BASE_URL = "https://fake.replicate.local/"
+
+
+class FakeOutput:
+    """Imita a `replicate.helpers.FileOutput`: solo expone `.url`."""
+    def __init__(self, url: str):
+        self.url = url
+
+    def __str__(self):
+        return self.url
+
+class FakeReplicateError(ReplicateError):
+    """Error transitorio simulado (503, reintentable por el limitador de tasa)."""
+    def __init__(self, detail: str):
+        super().__init__(title="Service Unavailable", status=503, detail=detail)
+
+class LocalFileAdapter(BaseAdapter):
+    """Adaptador de `requests` que sirve archivos locales registrados, con soporte de Range."""
+    def __init__(self, files: Dict[str, str]):
+        super().__init__()
+        self.files = files
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        path = self.files.get(request.url)
+        response = requests.Response()
+        response.request = request
+        response.url = request.url
+        if path is None:
+            response.status_code = 404
+            response.raw = io.BytesIO(b"")
+            return response
+
+        with open(path, "rb") as f:
+            data = f.read()
+        start = 0
+        range_header = request.headers.get("Range")
+        if range_header:
+            start = int(range_header.split("=")[1].split("-")[0])
+            response.status_code = 206
+            response.headers["Content-Range"] = f"bytes {start}-{len(data) - 1}/{len(data)}"
+        else:
+            response.status_code = 200
+        body = data[start:]
+        response.headers["Content-Length"] = str(len(body))
+        response.raw = io.BytesIO(body)
+        return response
+
+    def close(self):
+        pass
+
+class FakeReplicate:
+    """
+    Replicate simulado con archivos locales, latencia y tasa de errores configurables.
+
+    Args:
+        fixtures_dir: Directorio donde se generan las salidas simuladas.
+        latency: Segundos de espera por modelo ('ideogram', 'seedance', 'mmaudio').
+        error_rate: Probabilidad de que una llamada falle con `FakeReplicateError`.
+        clip_seconds: Duración de los clips que devuelve seedance.
+        seed: Semilla del generador aleatorio de errores.
+        image_size: Resolución de las imágenes de ideogram (por defecto, la de 9:16 de v3).
+        upload_mbps: Ancho de banda simulado para los archivos de entrada (0 = sin límite).
+    """
+    def __init__(self, fixtures_dir: str, latency: Optional[Dict[str, float]] = None, error_rate: float = 0.0,
+                 clip_seconds: float = 2.0, seed: int = 0, image_size=(864, 1536), upload_mbps: float = 0.0):
+        self.fixtures_dir = fixtures_dir
+        self.latency = latency or {}
+        self.error_rate = error_rate
+        self.clip_seconds = clip_seconds
+        self.image_size = tuple(image_size)
+        self.upload_mbps = upload_mbps
+        self.random = random.Random(seed)
+        self.files: Dict[str, str] = {}
+        self.calls: Dict[str, int] = {}
+        # Bytes de archivos de entrada recibidos por modelo.
+        self.upload_bytes: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        os.makedirs(fixtures_dir, exist_ok=True)
+
+    @staticmethod
+    def _family(model: str) -> str:
+        for family in ("ideogram", "seedance", "mmaudio"):
+            if family in model:
+                return family
+        raise ValueError(f"Modelo no soportado por FakeReplicate: {model}")
+
+    def _fixture(self, name: str, build) -> str:
+        path = os.path.join(self.fixtures_dir, name)
+        with self._lock:
+            if not os.path.exists(path):
+                build(path)
+            url = FAKE_BASE_URL + name
+            self.files[url] = path
+        return url
+
+    def _build_image(self, path: str):
+        # Degradados con grano: un PNG de tamaño parecido al de una imagen real.
+        from PIL import Image
+        width, height = self.image_size
+        gradient = Image.linear_gradient("L").resize((width, height))
+        noise = Image.effect_noise((width, height), 24)
+        Image.merge("RGB", (gradient, Image.blend(gradient, noise, 0.5), gradient.rotate(180))).save(path)
+
+    def _upload(self, family: str, input: Dict):
+        """Cuenta los bytes de los archivos de entrada y simula el tiempo de subida."""
+        size = sum(os.fstat(value.fileno()).st_size for value in input.values() if hasattr(value, "fileno"))
+        with self._lock:
+            self.upload_bytes[family] = self.upload_bytes.get(family, 0) + size
+        if self.upload_mbps:
+            time.sleep(size * 8 / (self.upload_mbps * 1e6))
+
+    def _build_video(self, path: str, seconds: float, with_audio: bool):
+        from src.logic.video_editor import _ffmpeg_exe
+        command = [_ffmpeg_exe(), "-hide_banner", "-loglevel", "error", "-y",
+                   "-f", "lavfi", "-i", "testsrc=size=720x1280:rate=24"]
+        if with_audio:
+            command += ["-f", "lavfi", "-i", "sine=frequency=330:sample_rate=44100", "-c:a", "aac", "-shortest"]
+        command += ["-t", f"{seconds:.2f}", "-c:v", "libx264", "-preset", "ultrafast", "-pix_fmt", "yuv420p", path]
+        subprocess.run(command, check=True)
+
+    def _start_call(self, model: str):
+        """Cuenta la llamada y decide si fallará; retorna (familia, falla)."""
+        family = self._family(model)
+        with self._lock:
+            self.calls[family] = self.calls.get(family, 0) + 1
+            fail = self.random.random() < self.error_rate
+        return family, fail
+
+    def output_url(self, family: str, input: Dict) -> str:
+        """URL de la salida simulada de un modelo (el archivo se genera la primera vez)."""
+        if family == "ideogram":
+            return self._fixture("image.png", self._build_image)
+        if family == "seedance":
+            return self._fixture(
+                f"clip_{self.clip_seconds:.2f}.mp4",
+                lambda path: self._build_video(path, self.clip_seconds, with_audio=False)
+            )
+        seconds = float(input.get("duration") or self.clip_seconds)
+        return self._fixture(
+            f"audio_{seconds:.2f}.mp4",
+            lambda path: self._build_video(path, seconds, with_audio=True)
+        )
+
+    def run(self, model: str, input: Optional[Dict] = None, **kwargs):
+        """Reemplazo de `replicate.run`."""
+        input = input or {}
+        family, fail = self._start_call(model)
+        self._upload(family, input)
+        time.sleep(self.latency.get(family, 0.0))
+        if fail:
+            raise FakeReplicateError(f"Fallo simulado en {model}")
+        url = self.output_url(family, input)
+        return [FakeOutput(url)] if family == "ideogram" else FakeOutput(url)
+
+    def install(self):
+        """Sustituye `replicate.run` y sirve las URLs falsas desde la sesión HTTP compartida."""
+        import replicate
+        from src.logic.transfer import get_session
+        replicate.run = self.run
+        get_session().mount(FAKE_BASE_URL, LocalFileAdapter(self.files))
+
+
+class FakeReplicateServer:
+    """
+    API HTTP de predicciones de Replicate servida en local, para ejecutar el
+    `PredictionManager` (REPLICATE_ASYNC_PREDICTIONS=true) sin red.
+
+    Implementa lo que usa el cliente oficial: subida de archivos (`POST /v1/files`),
+    creación de predicciones por modelo o por versión, consulta
+    (`GET /v1/predictions/<id>`) y cancelación. Cada predicción pasa de
+    'starting' a 'succeeded' (o 'failed', según `error_rate`) cuando vence la
+    latencia del modelo; las salidas son las URLs de `FakeReplicate`, así que
+    hay que llamar antes a `FakeReplicate.install()` para que se puedan descargar.
+
+    Args:
+        replicate_fake: El `FakeReplicate` que aporta latencias, errores y salidas.
+    """
+    def __init__(self, replicate_fake: FakeReplicate):
+        self.fake = replicate_fake
+        self.predictions: Dict[str, Dict] = {}
+        self.versions: Dict[str, str] = {}  # Versión -> modelo, como la resuelve la API real.
+        self.requests = []
+        self._timers: Dict[str, threading.Timer] = {}
+        self._lock = threading.Lock()
+        self.server = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def _upload_file(self, content_type: str, body: bytes):
+        """Guarda un archivo subido en multipart y lo sirve como una URL falsa más."""
+        from email.parser import BytesParser
+        message = BytesParser().parsebytes(f"Content-Type: {content_type}\r\n\r\n".encode() + body)
+        part = next(part for part in message.get_payload() if part.get_filename())
+        data = part.get_payload(decode=True)
+        with self._lock:
+            file_id = f"file{len(self.fake.files) + 1}"
+        path = os.path.join(self.fake.fixtures_dir, "uploads", file_id)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(data)
+        url = FAKE_BASE_URL + "uploads/" + file_id
+        with self._lock:
+            self.fake.files[url] = path
+            self.fake.upload_bytes["files"] = self.fake.upload_bytes.get("files", 0) + len(data)
+        if self.fake.upload_mbps:
+            time.sleep(len(data) * 8 / (self.fake.upload_mbps * 1e6))
+        return 201, {
+            "id": file_id, "name": part.get_filename(), "content_type": part.get_content_type(), "size": len(data),
+            "etag": file_id, "checksums": {}, "metadata": {}, "created_at": "", "expires_at": None,
+            "urls": {"get": url},
+        }
+
+    def _create(self, model: str, version: str, input: Dict):
+        family, fail = self.fake._start_call(model)
+        with self._lock:
+            prediction_id = f"p{len(self.predictions) + 1}"
+            prediction = {
+                "id": prediction_id, "model": model, "version": version, "status": "starting", "input": input,
+                "output": None, "logs": "", "error": None, "metrics": {}, "created_at": "", "started_at": None,
+                "completed_at": None, "urls": {"get": f"{self.base_url}/v1/predictions/{prediction_id}",
+                                               "cancel": f"{self.base_url}/v1/predictions/{prediction_id}/cancel"},
+            }
+            self.predictions[prediction_id] = prediction
+            timer = threading.Timer(self.fake.latency.get(family, 0.0), self._finish, (prediction_id, family, fail))
+            timer.daemon = True
+            self._timers[prediction_id] = timer
+        timer.start()
+        return 201, dict(prediction)
+
+    def _finish(self, prediction_id: str, family: str, fail: bool):
+        output = None if fail else self.fake.output_url(family, self.predictions[prediction_id]["input"])
+        with self._lock:
+            prediction = self.predictions[prediction_id]
+            self._timers.pop(prediction_id, None)
+            if prediction["status"] != "starting":
+                return
+            if fail:
+                prediction.update(status="failed", error=f"Fallo simulado en {prediction['model']}")
+            else:
+                prediction.update(status="succeeded", output=[output] if family == "ideogram" else output)
+
+    def handle(self, method: str, path: str, headers, body: bytes):
+        """Resuelve una petición y retorna (código HTTP, cuerpo JSON)."""
+        import json
+        parts = [part for part in path.split("/") if part][1:]  # Sin la versión de la API.
+        with self._lock:
+            self.requests.append((method, "/".join(parts)))
+        if method == "POST" and parts == ["files"]:
+            return self._upload_file(headers.get("Content-Type", ""), body)
+        if method == "POST" and parts == ["predictions"]:
+            payload = json.loads(body or b"{}")
+            model = self.versions.get(payload.get("version"))
+            if model is None:
+                return 422, {"detail": f"Versión desconocida: {payload.get('version')}"}
+            return self._create(model, payload["version"], payload.get("input") or {})
+        if method == "POST" and len(parts) == 4 and parts[0] == "models" and parts[3] == "predictions":
+            model = f"{parts[1]}/{parts[2]}"
+            return self._create(model, "", (json.loads(body or b"{}")).get("input") or {})
+        with self._lock:
+            prediction = self.predictions.get(parts[1]) if len(parts) >= 2 and parts[0] == "predictions" else None
+            if prediction is None:
+                return 404, {"detail": "No encontrado."}
+            if method == "POST" and len(parts) == 3 and parts[2] == "cancel":
+                if prediction["status"] == "starting":
+                    prediction["status"] = "canceled"
+                    timer = self._timers.pop(prediction["id"], None)
+                    if timer:
+                        timer.cancel()
+                return 200, dict(prediction)
+            if method == "GET" and len(parts) == 2:
+                return 200, dict(prediction)
+        return 404, {"detail": "No encontrado."}
+
+    def start(self) -> "FakeReplicateServer":
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        from urllib.parse import urlsplit
+        import json
+
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def _respond(self, method):
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length) if length else b""
+                status, payload = fake.handle(method, urlsplit(self.path).path, self.headers, body)
+                data = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                self._respond("GET")
+
+            def do_POST(self):
+                self._respond("POST")
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+
+
+class FakeGraphAPI:
+    """
+    Graph API de Instagram falsa servida en local, para probar la cola de publicación.
+
+    Implementa creación de contenedores, consulta de estado (individual y en
+    lote con `?ids=`), `media_publish` y `permalink`. Cada contenedor pasa a
+    FINISHED tras `polls_until_finished` consultas de estado.
+
+    Args:
+        polls_until_finished: Consultas de estado antes de que un contenedor esté listo.
+        fail_containers: Si es True, los contenedores terminan en ERROR.
+    """
+    def __init__(self, polls_until_finished: int = 2, fail_containers: bool = False):
+        self.polls_until_finished = polls_until_finished
+        self.fail_containers = fail_containers
+        self.containers: Dict[str, Dict] = {}
+        self.published: Dict[str, str] = {}
+        self.requests = []
+        self._lock = threading.Lock()
+        self.server = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server.server_address[1]}/v23.0"
+
+    def _status(self, container_id: str) -> Optional[str]:
+        container = self.containers.get(container_id)
+        if container is None:
+            return None
+        container["polls"] += 1
+        if container_id in self.published.values():
+            return "PUBLISHED"
+        if container["polls"] < self.polls_until_finished:
+            return "IN_PROGRESS"
+        return "ERROR" if self.fail_containers else "FINISHED"
+
+    def handle(self, method: str, path: str, params: Dict[str, str]):
+        """Resuelve una petición y retorna (código HTTP, cuerpo JSON)."""
+        parts = [part for part in path.split("/") if part][1:]  # Sin la versión de la API.
+        with self._lock:
+            self.requests.append((method, "/".join(parts), params))
+            if method == "POST" and len(parts) == 2 and parts[1] == "media":
+                container_id = f"c{len(self.containers) + 1}"
+                self.containers[container_id] = {"polls": 0, "video_url": params.get("video_url")}
+                return 200, {"id": container_id}
+            if method == "POST" and len(parts) == 2 and parts[1] == "media_publish":
+                container = self.containers.get(params.get("creation_id"))
+                if container is None or container["polls"] < self.polls_until_finished or self.fail_containers:
+                    return 400, {"error": {"message": "El contenedor no está listo."}}
+                if params["creation_id"] in self.published.values():
+                    return 400, {"error": {"message": "El contenedor ya se publicó."}}
+                media_id = f"m{len(self.published) + 1}"
+                self.published[media_id] = params["creation_id"]
+                return 200, {"id": media_id}
+            if method == "GET" and not parts and "ids" in params:
+                return 200, {
+                    container_id: {"id": container_id, "status_code": self._status(container_id)}
+                    for container_id in params["ids"].split(",")
+                }
+            if method == "GET" and len(parts) == 1 and parts[0] in self.published:
+                return 200, {"id": parts[0], "permalink": f"https://www.instagram.com/reel/{parts[0]}/"}
+            if method == "GET" and len(parts) == 1 and parts[0] in self.containers:
+                return 200, {"id": parts[0], "status_code": self._status(parts[0])}
+            return 404, {"error": {"message": "No encontrado."}}
+
+    def start(self) -> "FakeGraphAPI":
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        from urllib.parse import parse_qsl, urlsplit
+        import json
+
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _respond(self, method):
+                url = urlsplit(self.path)
+                status, body = fake.handle(method, url.path, dict(parse_qsl(url.query)))
+                data = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                self._respond("GET")
+
+            def do_POST(self):
+                self._respond("POST")
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+
+
+class FakeS3:
+    """
+    Servicio compatible con S3 servido en local (estilo MinIO), para probar el
+    almacén de assets sin credenciales ni red.
+
+    Implementa, con direccionamiento por ruta (`/<bucket>/<clave>`), lo que usa
+    `S3AssetStore`: PutObject, GetObject (con Range), HeadObject, DeleteObject,
+    CreateBucket, ListObjectsV2 y subidas multiparte. No valida firmas.
+    """
+    def __init__(self):
+        self.objects: Dict[str, bytes] = {}
+        self.uploads: Dict[str, Dict[int, bytes]] = {}
+        self.requests = []
+        self._lock = threading.Lock()
+        self.server = None
+
+    @property
+    def endpoint_url(self) -> str:
+        return f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def start(self) -> "FakeS3":
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        from urllib.parse import parse_qs, unquote, urlsplit
+        from xml.sax.saxutils import escape
+        import hashlib
+
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def _target(self):
+                url = urlsplit(self.path)
+                bucket, _, key = unquote(url.path).lstrip("/").partition("/")
+                query = {name: values[0] for name, values in parse_qs(url.query, keep_blank_values=True).items()}
+                with fake._lock:
+                    fake.requests.append((self.command, key, sorted(query)))
+                return bucket, key, query
+
+            def _body(self) -> bytes:
+                return self.rfile.read(int(self.headers.get("Content-Length") or 0))
+
+            def _send(self, status: int, body: bytes = b"", headers: Optional[Dict[str, str]] = None):
+                self.send_response(status)
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                if self.command != "HEAD":
+                    self.wfile.write(body)
+
+            def _xml(self, status: int, body: str):
+                self._send(status, ('<?xml version="1.0" encoding="UTF-8"?>' + body).encode("utf-8"),
+                           {"Content-Type": "application/xml"})
+
+            def _not_found(self):
+                self._xml(404, "<Error><Code>NoSuchKey</Code><Message>No encontrado.</Message></Error>")
+
+            def do_PUT(self):
+                bucket, key, query = self._target()
+                data = self._body()
+                if not key:
+                    self._send(200)
+                    return
+                etag = f'"{hashlib.md5(data).hexdigest()}"'
+                with fake._lock:
+                    if "uploadId" in query:
+                        fake.uploads[query["uploadId"]][int(query["partNumber"])] = data
+                    else:
+                        fake.objects[f"{bucket}/{key}"] = data
+                self._send(200, headers={"ETag": etag})
+
+            def do_POST(self):
+                bucket, key, query = self._target()
+                self._body()
+                with fake._lock:
+                    if "uploads" in query:
+                        upload_id = f"u{len(fake.uploads) + 1}"
+                        fake.uploads[upload_id] = {}
+                        self._xml(200, f"<InitiateMultipartUploadResult><Bucket>{bucket}</Bucket><Key>{escape(key)}</Key>"
+                                       f"<UploadId>{upload_id}</UploadId></InitiateMultipartUploadResult>")
+                        return
+                    parts = fake.uploads.pop(query.get("uploadId"), None)
+                    if parts is None:
+                        self._xml(404, "<Error><Code>NoSuchUpload</Code><Message>No encontrado.</Message></Error>")
+                        return
+                    fake.objects[f"{bucket}/{key}"] = b"".join(parts[number] for number in sorted(parts))
+                self._xml(200, f"<CompleteMultipartUploadResult><Bucket>{bucket}</Bucket><Key>{escape(key)}</Key>"
+                               f"<ETag>\"fake\"</ETag></CompleteMultipartUploadResult>")
+
+            def do_GET(self):
+                bucket, key, query = self._target()
+                if not key:
+                    prefix = query.get("prefix", "")
+                    with fake._lock:
+                        keys = sorted(name.partition("/")[2] for name in fake.objects
+                                      if name.startswith(f"{bucket}/{prefix}"))
+                        sizes = {name: len(fake.objects[f"{bucket}/{name}"]) for name in keys}
+                    contents = "".join(f"<Contents><Key>{escape(name)}</Key><Size>{sizes[name]}</Size>"
+                                       f"<LastModified>2025-01-01T00:00:00.000Z</LastModified></Contents>"
+                                       for name in keys)
+                    self._xml(200, f"<ListBucketResult><Name>{bucket}</Name><KeyCount>{len(keys)}</KeyCount>"
+                                   f"<IsTruncated>false</IsTruncated>{contents}</ListBucketResult>")
+                    return
+                with fake._lock:
+                    data = fake.objects.get(f"{bucket}/{key}")
+                if data is None:
+                    self._not_found()
+                    return
+                range_header = self.headers.get("Range")
+                if range_header:
+                    start, _, end = range_header.split("=")[1].partition("-")
+                    start, end = int(start), int(end) if end else len(data) - 1
+                    self._send(206, data[start:end + 1], {"Content-Range": f"bytes {start}-{end}/{len(data)}"})
+                else:
+                    self._send(200, data)
+
+            def do_HEAD(self):
+                bucket, key, _ = self._target()
+                with fake._lock:
+                    data = fake.objects.get(f"{bucket}/{key}")
+                if data is None:
+                    self._send(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+
+            def do_DELETE(self):
+                bucket, key, query = self._target()
+                with fake._lock:
+                    if "uploadId" in query:
+                        fake.uploads.pop(query["uploadId"], None)
+                    else:
+                        fake.objects.pop(f"{bucket}/{key}", None)
+                self._send(204)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+
+
+class FakeScriptLLM:
+    """
+    Sustituto determinista de `ChatOpenAI` para generar guiones sin red.
+
+    Implementa solo `with_structured_output`, que es lo que usa `content_generator`,
+    y devuelve un `ScriptStructure` construido a partir de la idea del prompt
+    (con `include_raw=True`, junto a un `AIMessage` con un consumo de tokens estimado).
+
+    Args:
+        latency: Segundos de espera simulados por llamada.
+        fail_when: Función opcional que recibe la idea y devuelve True si la
+            llamada debe fallar, para probar el aislamiento de errores.
+    """
+    def __init__(self, latency: float = 0.0, fail_when: Optional[Callable[[str], bool]] = None):
+        self.latency = latency
+        self.fail_when = fail_when
+
+    def with_structured_output(self, schema: Type[BaseModel] = ScriptStructure, include_raw: bool = False) -> RunnableLambda:
+        def respond(prompt_value):
+            text = prompt_value.to_string()
+            idea_match = re.search(r'\*\*Idea:\*\* "(.*)"', text)
+            scenes_match = re.search(r'Crea exactamente (\d+) escenas', text)
+            idea = idea_match.group(1) if idea_match else text[:50]
+            num_scenes = int(scenes_match.group(1)) if scenes_match else 1
+
+            if self.latency:
+                time.sleep(self.latency)
+            if self.fail_when and self.fail_when(idea):
+                raise RuntimeError(f"Fallo simulado para la idea '{idea}'")
+
+            parsed = ScriptStructure(
+                scenes=[
+                    Scene(
+                        scene_description=f"{idea} - escena {i+1}",
+                        image_prompt=f"POV, {idea}, scene {i+1}, cinematic, photorealistic, 4K",
+                        video_prompt="Slow zoom in"
+                    )
+                    for i in range(num_scenes)
+                ],
+                environment_prompt=f"Ambiente de {idea}",
+                audio_prompt=f"Sonido ambiente de {idea}",
+                hashtags=["#POV", "#Historia", "#IA"]
+            )
+            if not include_raw:
+                return parsed
+            content = parsed.model_dump_json()
+            # Aproximación de ~4 caracteres por token.
+            input_tokens, output_tokens = len(text) // 4, len(content) // 4
+            raw = AIMessage(content=content, usage_metadata={
+                "input_tokens": input_tokens,
+                "output_tokens": output_tokens,
+                "total_tokens": input_tokens + output_tokens
+            })
+            return {"raw": raw, "parsed": parsed, "parsing_error": None}
+
+        return RunnableLambda(respond)
@@ -1,34 +1,55 @@
 import time
 import json
+import multiprocessing
 from apscheduler.schedulers.blocking import BlockingScheduler
-from src.agents.graph import get_graph
-from src.database.database import init_db
-from src.config import check_env_vars
-from src.logic.idea_manager import get_next_pending_idea, update_idea_status
+from src.agents.graph import get_graph, find_resumable_project
+from src.database.database import init_db, engine
+from src.logic.metrics import start_metrics_server
+from src.logic.media_server import start_media_server
+from src.logic.publish_queue import start_publish_queue
+from src.logic.asset_gc import start_asset_gc
+from src.config import check_env_vars, WORKER_COUNT, WORKER_IDLE_SECONDS, NGROK_PUBLIC_URL
+from src.logic.idea_manager import (
+    get_next_pending_idea, update_idea_status, claim_pending_ideas,
+    default_worker_id, IdeaLeaseHeartbeat, pregenerate_scripts
+)
 
-def run_pipeline(idea_text: str, idea_id: int):
+def _run_graph(initial_state: dict):
+    """Ejecuta el grafo desde el estado dado y lanza una excepción si termina con error."""
+    app = get_graph()
+
+    final_state = None
+    # Invocar el grafo con el estado inicial
+    for s in app.stream(initial_state):
+        node_name = list(s.keys())[0]
+        print(f"    - Nodo completado: {node_name}")
+        final_state = list(s.values())[0]
+
+    if final_state and final_state.get("error"):
+        raise Exception(final_state.get("error"))
+
+
+def run_pipeline(idea_text: str, idea_id: int, script_data: dict = None):
     """
     Ejecuta el pipeline completo de generación de video para una idea dada.
+    Si la idea tiene un proyecto fallido con trabajo guardado, lo reanuda.
+    Si se pasa `script_data` (guion pregenerado en lote), no se vuelve a llamar al LLM.
     """
     print(f"\n--- Iniciando pipeline para la idea ID {idea_id}: '{idea_text}' ---")
-    app = get_graph()
-
-    initial_state = {
-        "idea": idea_text,
-        "project_id": None,
-        "retries": 0
-    }
-
-    final_state = None
     try:
-        # Invocar el grafo con el estado inicial
-        for s in app.stream(initial_state):
-            node_name = list(s.keys())[0]
-            print(f"    - Nodo completado: {node_name}")
-            final_state = list(s.values())[0]
+        project_id = find_resumable_project(idea_id)
+        if project_id:
+            print(f"Reanudando el proyecto fallido {project_id} de la idea ID {idea_id}.")
 
-        if final_state and final_state.get("error"):
-            raise Exception(final_state.get("error"))
+        initial_state = {
+            "idea": idea_text,
+            "idea_id": idea_id,
+            "project_id": project_id,
+            "retries": 0
+        }
+        if script_data and 'error' not in script_data:
+            initial_state["script_data"] = script_data
+        _run_graph(initial_state)
 
         print(f"--- Pipeline finalizado con éxito para la idea ID {idea_id} ---")
         update_idea_status(idea_id, 'completed')
@@ -38,6 +59,18 @@ def run_pipeline(idea_text: str, idea_id: int):
         update_idea_status(idea_id, 'failed', error_message=str(e))
 
 
+def resume_project(project_id: int):
+    """
+    Reanuda un proyecto existente desde el primer nodo que no haya completado.
+    """
+    print(f"\n--- Reanudando el proyecto ID {project_id} ---")
+    try:
+        _run_graph({"project_id": project_id, "retries": 0})
+        print(f"--- Proyecto ID {project_id} reanudado y finalizado con éxito ---")
+    except Exception as e:
+        print(f"!!! Error al reanudar el proyecto ID {project_id}: {e} !!!")
+
+
 def pipeline_job():
     """
     La función de trabajo que el scheduler ejecutará periódicamente.
@@ -47,11 +80,57 @@ def pipeline_job():
     idea = get_next_pending_idea()
     
     if idea:
-        run_pipeline(idea.text, idea.id)
+        run_pipeline(idea.text, idea.id, idea.script)
     else:
         print(f"[{time.ctime()}] No hay ideas pendientes. Esperando al próximo ciclo.")
 
 
+def worker_loop(worker_index: int):
+    """
+    Bucle de un worker del pool: reclama lotes de ideas con SKIP LOCKED y las
+    procesa una a una mientras un hilo renueva sus leases.
+    """
+    # Las conexiones heredadas del proceso padre no deben reutilizarse tras el fork.
+    engine.dispose(close=False)
+    worker_id = f"{default_worker_id()}#{worker_index}"
+    print(f"Worker {worker_id} iniciado.")
+
+    try:
+        while True:
+            ideas = claim_pending_ideas(worker_id)
+            if not ideas:
+                time.sleep(WORKER_IDLE_SECONDS)
+                continue
+
+            with IdeaLeaseHeartbeat(worker_id, [idea.id for idea in ideas]) as heartbeat:
+                # Un único lote de llamadas al LLM para todas las ideas reclamadas.
+                scripts = pregenerate_scripts(ideas)
+                for idea in ideas:
+                    run_pipeline(idea.text, idea.id, scripts.get(idea.id))
+                    heartbeat.release(idea.id)
+    except KeyboardInterrupt:
+        print(f"Worker {worker_id} detenido.")
+
+
+def run_worker_pool(num_workers: int):
+    """Lanza `num_workers` procesos que consumen ideas en paralelo."""
+    print(f"Iniciando pool de {num_workers} workers. Presiona Ctrl+C para salir.")
+    processes = [
+        multiprocessing.Process(target=worker_loop, args=(i,), name=f"worker-{i}")
+        for i in range(num_workers)
+    ]
+    for process in processes:
+        process.start()
+
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        print("Deteniendo workers...")
+        for process in processes:
+            process.join()
+        print("Servicio detenido.")
+
 
 def main():
     """Punto de entrada principal del servicio de automatización."""
@@ -63,6 +142,18 @@ def main():
         return
 
     init_db()
+    start_metrics_server()
+    # Un único recolector de assets, en el proceso principal.
+    start_asset_gc()
+    if NGROK_PUBLIC_URL:
+        # Un único servidor de medios en el proceso principal, compartido por todos los workers.
+        start_media_server()
+        # La cola de publicación también vive en el proceso principal: los workers solo encolan.
+        start_publish_queue()
+
+    if WORKER_COUNT > 1:
+        run_worker_pool(WORKER_COUNT)
+        return
 
     scheduler = BlockingScheduler(timezone="UTC")
     scheduler.add_job(pipeline_job, 'interval', minutes=30) #'hours=1'
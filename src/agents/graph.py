@@ -1,117 +1,396 @@
+import time
 import uuid
+from typing import Any, Dict, List, Optional
 from langgraph.graph import StateGraph, END
-from sqlalchemy.orm import Session
+from langgraph.constants import Send
 from .state import AppState
 from ..database.database import get_db
 from ..database.models import VideoProject
-from ..logic import content_generator, multimedia_generator, social_publisher
+from ..database.repository import (
+    ProjectRepository, get_project_repository, register_project_repository, release_project_repository
+)
+from ..config import (
+    AUDIO_MODE, PUBLISH_PLATFORMS, SCENE_WORKERS, SCENE_MAX_ATTEMPTS, SCENE_RETRY_BASE_DELAY, SCENE_RETRY_MAX_DELAY,
+    SCENE_MAX_MISSING, SCENE_MIN_SCENES
+)
+from ..logic import content_generator, multimedia_generator, publisher, video_editor
+from ..logic.metrics import instrument_node
+from ..logic.rate_limiter import backoff_delay
+from ..logic.asset_store import get_asset_store
+
+
+# Nodos con checkpoint, en el orden en que se ejecutan.
+PIPELINE_NODES = ["generate_content", "generate_multimedia", "assemble_video", "publish_video"]
+
+# Claves del estado que se guardan en el checkpoint de cada nodo.
+CHECKPOINT_KEYS = {
+    "generate_content": ["script_data"],
+    "generate_multimedia": ["image_paths", "video_paths", "audio_path", "scene_results"],
+    "assemble_video": ["video_path", "audio_path", "video_paths"],
+    "publish_video": ["published_urls"],
+}
+
+
+def _save_checkpoint(project: ProjectRepository, node_name: str, state: AppState):
+    """Registra en el proyecto la salida de un nodo completado."""
+    checkpoint = dict(project.get('checkpoint', {}))
+    completed_nodes = [n for n in checkpoint.get('completed_nodes', []) if n != node_name]
+    completed_nodes.append(node_name)
+    saved_state = dict(checkpoint.get('state', {}))
+    for key in CHECKPOINT_KEYS[node_name]:
+        saved_state[key] = state.get(key)
+
+    project.update(checkpoint={'completed_nodes': completed_nodes, 'state': saved_state})
+    state['completed_nodes'] = completed_nodes
 
+def _restore_checkpoint(project: ProjectRepository, state: AppState):
+    """Carga en el estado las salidas ya guardadas de un proyecto existente."""
+    checkpoint = project.get('checkpoint', {})
+    completed_nodes = list(checkpoint.get('completed_nodes', []))
+    saved_state = checkpoint.get('state', {})
+    store = get_asset_store()
 
+    # Escenas terminadas (también las de un intento fallido): solo se regeneran las que falten.
+    # JSON guarda los índices como texto.
+    scene_results = {}
+    for index, result in (saved_state.get('scene_results') or {}).items():
+        if result.get('error') or not all(store.exists(result[key]) for key in ('image', 'video')):
+            continue
+        scene_results[int(index)] = result
+    state['scene_results'] = scene_results
+
+    if 'generate_multimedia' in completed_nodes:
+        paths = (saved_state.get('image_paths') or []) + (saved_state.get('video_paths') or [])
+        missing = [path for path in paths if not store.exists(path)]
+        if missing:
+            print(f"Faltan {len(missing)} archivos multimedia del checkpoint. Se regenerarán.")
+            completed_nodes = [n for n in completed_nodes if n not in ('generate_multimedia', 'assemble_video', 'publish_video')]
+
+    if 'assemble_video' in completed_nodes and not (saved_state.get('video_path') and store.exists(saved_state['video_path'])):
+        print("Falta el video final del checkpoint. Se volverá a ensamblar.")
+        completed_nodes = [n for n in completed_nodes if n not in ('assemble_video', 'publish_video')]
+
+    for node_name in completed_nodes:
+        for key in CHECKPOINT_KEYS.get(node_name, []):
+            state[key] = saved_state.get(key)
+    state['completed_nodes'] = completed_nodes
+
+def find_resumable_project(idea_id: int) -> Optional[int]:
+    """Busca el último proyecto fallido de una idea que tenga trabajo ya completado."""
+    with get_db() as db:
+        project = (
+            db.query(VideoProject)
+            .filter(VideoProject.idea_id == idea_id, VideoProject.status == 'failed')
+            .order_by(VideoProject.id.desc())
+            .first()
+        )
+        if project and (project.checkpoint or {}).get('completed_nodes'):
+            return project.id
+    return None
+
+@instrument_node("start_project")
 def start_new_project(state: AppState) -> AppState:
-    """Nodo inicial: Crea una nueva entrada en la base de datos para el proyecto."""
+    """
+    Nodo inicial: Crea una nueva entrada en la base de datos para el proyecto.
+
+    Si el estado ya trae un `project_id`, reanuda ese proyecto cargando su checkpoint.
+    """
     try:
-        with get_db() as db:
-            new_project = VideoProject(
-                idea_prompt=state['idea'],
-                status='starting'
-            )
-            db.add(new_project)
-            db.commit()
-            db.refresh(new_project)
-            print(f"Nuevo proyecto iniciado con ID: {new_project.id}")
-            state['project_id'] = new_project.id
+        if state.get('project_id'):
+            project = ProjectRepository.load(state['project_id'])
+            _restore_checkpoint(project, state)
+            state['idea'] = state.get('idea') or project.get('idea_prompt')
+            project.set_status('resuming', node='start_project')
+            project.update(error_message=None)
+            project.save()
+            if all(node_name in state['completed_nodes'] for node_name in PIPELINE_NODES):
+                release_project_repository(project.id)
+            else:
+                register_project_repository(project)
+            print(f"Reanudando el proyecto {project.id}. Nodos completados: {state['completed_nodes']}")
+            return state
+
+        project = ProjectRepository.create(state['idea'], idea_id=state.get('idea_id'))
+        register_project_repository(project)
+        print(f"Nuevo proyecto iniciado con ID: {project.id}")
+        state['project_id'] = project.id
+        state['completed_nodes'] = []
     except Exception as e:
         state['error'] = f"Error en start_new_project: {e}"
     return state
 
+@instrument_node("generate_content")
 def generate_content_node(state: AppState) -> AppState:
     """Nodo para generar el guion y los prompts."""
     try:
         print("\n--- Nodo: Generando Contenido ---")
-        with get_db() as db:
-            project = db.query(VideoProject).filter(VideoProject.id == state['project_id']).one()
-            project.status = 'generating_content'
-            db.commit()
+        project = get_project_repository(state['project_id'])
+        project.set_status('generating_content', node='generate_content')
 
-            # ----------
-            # script_data = {"scenes": [{"scene_description": "Gladiator's POV: Coliseum ablaze during battle.", "image_prompt": "POV of gladiator, coliseum in flames, opponent in foreground, dramatic lighting, cinematic, photorealistic, 4K, intense atmosphere, historical accuracy", "video_prompt": "Camera shakes slightly to simulate the intensity of the battle, flames flicker and smoke drifts across the scene"}], "environment_prompt": "Ancient Roman coliseum engulfed in flames, chaotic and intense atmosphere, historical setting, rich in detail and color, evokes a sense of urgency and danger", "audio_prompt": "Crackling fire, distant roars of the crowd, clashing swords, heavy breathing of the gladiator", "hashtags": ["#GladiatorLife", "#ColiseumOnFire", "#EpicBattle"]}
-            # ----------
+        # ----------
+        # script_data = {"scenes": [{"scene_description": "Gladiator's POV: Coliseum ablaze during battle.", "image_prompt": "POV of gladiator, coliseum in flames, opponent in foreground, dramatic lighting, cinematic, photorealistic, 4K, intense atmosphere, historical accuracy", "video_prompt": "Camera shakes slightly to simulate the intensity of the battle, flames flicker and smoke drifts across the scene"}], "environment_prompt": "Ancient Roman coliseum engulfed in flames, chaotic and intense atmosphere, historical setting, rich in detail and color, evokes a sense of urgency and danger", "audio_prompt": "Crackling fire, distant roars of the crowd, clashing swords, heavy breathing of the gladiator", "hashtags": ["#GladiatorLife", "#ColiseumOnFire", "#EpicBattle"]}
+        # ----------
 
 
-            script_data = content_generator.generate_viral_script(state['idea'])
+        # El guion puede venir pregenerado en lote (Idea.script).
+        script_data = state.get('script_data') or content_generator.generate_viral_script(state['idea'])
 
-            if 'error' in script_data:
-                raise ValueError(script_data['error'])
-            
-            state['script_data'] = script_data
-            project.script = script_data
-            db.commit()
+        if 'error' in script_data:
+            raise ValueError(script_data['error'])
+
+        state['script_data'] = script_data
+        project.update(script=script_data)
+        _save_checkpoint(project, 'generate_content', state)
+        project.save()
     except Exception as e:
         state['error'] = f"Error en generate_content_node: {e}"
     return state
 
+@instrument_node("generate_multimedia")
 def generate_multimedia_node(state: AppState) -> AppState:
-    """Nodo para generar imágenes y videos a partir del guion."""
+    """
+    Nodo "map": prepara la generación de multimedia. Cada escena pendiente se
+    envía después a su propio `generate_scene` (ver `fan_out_scenes`).
+    """
     try:
         print("\n--- Nodo: Generando Multimedia (Imágenes y Videos) ---")
-        with get_db() as db:
-            project = db.query(VideoProject).filter(VideoProject.id == state['project_id']).one()
-            project.status = 'generating_multimedia'
-            db.commit()
-
-            script_data = state['script_data']
-            project_id_str = f"{state['project_id']}_{uuid.uuid4().hex[:8]}"
-
-            multimedia_results = multimedia_generator.generate_multimedia_for_idea(script_data, project_id_str)
-
-            image_paths = multimedia_results.get('images', [])
-            video_paths = multimedia_results.get('videos', [])
-            audio_path = multimedia_results.get('audio')
-
-            if not image_paths or not video_paths:
-                raise ValueError("Fallo en la generación de multimedia (imágenes o videos).")
-
-            state['image_paths'] = image_paths
-            state['video_paths'] = video_paths
-            state['audio_path'] = audio_path
-
-            project.assets_urls = {
-                'images': image_paths, 
-                'videos': video_paths,
-                'audio': audio_path
-            }
-            project.video_path = video_paths[0] if video_paths else None
-            project.status = 'multimedia_completed'
-            db.commit()
+        project = get_project_repository(state['project_id'])
+        project.set_status('generating_multimedia', node='generate_multimedia')
+        project.save()
+
+        if not state['script_data'].get('scenes'):
+            raise ValueError("El guion no contiene escenas. No se puede generar multimedia.")
+        for i in _scenes_without_prompt(state):
+            print(f"Advertencia: La escena {i+1} no tiene un prompt de imagen; se omite.")
+        if len(_scenes_without_prompt(state)) == len(state['script_data']['scenes']):
+            raise ValueError("Ninguna escena del guion tiene un prompt de imagen.")
+        state['asset_prefix'] = f"{state['project_id']}_{uuid.uuid4().hex[:8]}"
+        done = sorted(state.get('scene_results') or {})
+        if done:
+            print(f"Escenas ya generadas en un intento anterior: {[i + 1 for i in done]}")
     except Exception as e:
         state['error'] = f"Error en generate_multimedia_node: {e}"
     return state
 
+def _scenes_without_prompt(state: AppState) -> List[int]:
+    """Escenas sin `image_prompt`: no se generan y el video se monta sin ellas."""
+    return [i for i, scene in enumerate(state['script_data']['scenes']) if not scene.get('image_prompt')]
+
+def _pending_scenes(state: AppState) -> List[int]:
+    """Escenas con prompt sin resultado o cuyo último intento falló."""
+    scene_results = state.get('scene_results') or {}
+    skipped = set(_scenes_without_prompt(state))
+    return [
+        i for i in range(len(state['script_data']['scenes']))
+        if i not in skipped and (i not in scene_results or scene_results[i].get('error'))
+    ]
+
+def _scenes_to_retry(state: AppState) -> List[int]:
+    """Escenas fallidas a las que aún les quedan intentos en esta ejecución."""
+    scene_results = state.get('scene_results') or {}
+    return [
+        i for i in _pending_scenes(state)
+        if scene_results.get(i, {}).get('attempts', 0) < SCENE_MAX_ATTEMPTS
+    ]
+
+def can_skip_scenes(missing: List[int], total: int) -> bool:
+    """
+    Política de publicación con escenas perdidas: se admiten hasta
+    `SCENE_MAX_MISSING` escenas sin generar si quedan al menos
+    `SCENE_MIN_SCENES` y la primera (el gancho del Reel) está entre ellas.
+    """
+    return len(missing) <= SCENE_MAX_MISSING and total - len(missing) >= SCENE_MIN_SCENES and 0 not in missing
+
+def _send_scenes(state: AppState, indices: List[int]) -> List[Send]:
+    """Un `Send` a `generate_scene` por cada escena, con el número de intento que le toca."""
+    scenes = state['script_data']['scenes']
+    scene_results = state.get('scene_results') or {}
+    # En modo 'single' el audio se genera una sola vez sobre el video ensamblado.
+    audio_prompt = state['script_data'].get('audio_prompt', '') if AUDIO_MODE == 'per_scene' else None
+    return [
+        Send("generate_scene", {
+            'project_id': state['project_id'],
+            'asset_prefix': state['asset_prefix'],
+            'index': i,
+            'total': len(scenes),
+            'scene': scenes[i],
+            'audio_prompt': audio_prompt,
+            'attempt': scene_results.get(i, {}).get('attempts', 0) + 1,
+        })
+        for i in indices
+    ]
+
+def fan_out_scenes(state: AppState):
+    """Envía cada escena pendiente a su propio nodo `generate_scene`, que LangGraph ejecuta en paralelo."""
+    if state.get('error'):
+        return "handle_error"
+    pending = _pending_scenes(state)
+    if not pending:
+        return "collect_scenes"
+    return _send_scenes(state, pending)
+
+@instrument_node("generate_scene")
+def _generate_scene(scene_state: Dict[str, Any]) -> Dict[str, Any]:
+    index, attempt = scene_state['index'], scene_state['attempt']
+    try:
+        image_uri, video_uri = multimedia_generator.generate_scene_assets(
+            index, scene_state['total'], scene_state['scene'], scene_state['asset_prefix'], scene_state['audio_prompt'],
+            attempt=attempt
+        )
+        print(f"Escena {index+1}/{scene_state['total']} completada.")
+        return {'scene_results': {index: {'image': image_uri, 'video': video_uri, 'attempts': attempt}}}
+    except Exception as e:
+        print(f"Error en la escena {index+1} (intento {attempt}/{SCENE_MAX_ATTEMPTS}): {e}")
+        return {'error': str(e), 'scene_results': {index: {'error': str(e), 'attempts': attempt}}}
+
+def generate_scene_node(scene_state: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Nodo de una escena (imagen -> video -> audio). Recibe su parte del estado
+    por `Send` y solo escribe su entrada de `scene_results`: los errores no se
+    propagan a `error` (varias escenas escribiendo esa clave a la vez harían
+    fallar el paso) sino que los reúne `collect_scenes_node`, que también
+    espera el backoff antes de cada ronda de reintentos.
+    """
+    return {'scene_results': _generate_scene(scene_state)['scene_results']}
+
+@instrument_node("collect_scenes")
+def collect_scenes_node(state: AppState) -> AppState:
+    """
+    Nodo "reduce": reúne en orden los resultados de las escenas y guarda el checkpoint.
+
+    Si hay escenas fallidas con intentos restantes, espera un backoff
+    exponencial con jitter y `route_scenes` las vuelve a enviar. La espera
+    ocurre aquí, una vez por ronda y cuando ya no corre ninguna escena, en
+    lugar de dentro de cada escena reintentada, donde ocuparía una de las
+    `SCENE_WORKERS` plazas del grafo sin hacer nada. Agotados los intentos,
+    el proyecto sigue sin ellas si `can_skip_scenes` lo permite y falla en
+    caso contrario.
+    """
+    try:
+        retry = _scenes_to_retry(state)
+        if retry:
+            scene_results = state.get('scene_results') or {}
+            attempts = max(max(scene_results.get(i, {}).get('attempts', 0) for i in retry), 1)
+            delay = backoff_delay(attempts, SCENE_RETRY_BASE_DELAY, SCENE_RETRY_MAX_DELAY)
+            print(f"Escenas fallidas pendientes de reintento: {[i + 1 for i in retry]}; "
+                  f"nuevo intento en {delay:.1f}s.")
+            time.sleep(delay)
+            return state
+
+        project = get_project_repository(state['project_id'])
+        scene_results = state.get('scene_results') or {}
+        total = len(state['script_data']['scenes'])
+        skipped = _scenes_without_prompt(state)
+        missing = _pending_scenes(state)
+        if missing and not can_skip_scenes(missing, total - len(skipped)):
+            # Las escenas que sí terminaron se guardan para no regenerarlas al reanudar.
+            checkpoint = dict(project.get('checkpoint', {}))
+            saved_state = dict(checkpoint.get('state', {}))
+            saved_state['scene_results'] = {i: r for i, r in scene_results.items() if not r.get('error')}
+            project.update(checkpoint={**checkpoint, 'state': saved_state})
+            project.save()
+            errors = "; ".join(f"escena {i+1}: {scene_results.get(i, {}).get('error', 'sin resultado')}" for i in missing)
+            raise ValueError(f"Fallo en la generación de multimedia ({errors}).")
+
+        scenes = [i for i in range(total) if i not in missing and i not in skipped]
+        state['image_paths'] = [scene_results[i]['image'] for i in scenes]
+        state['video_paths'] = [scene_results[i]['video'] for i in scenes]
+        state['audio_path'] = None
+
+        assets_urls = {
+            'images': state['image_paths'],
+            'videos': state['video_paths'],
+            'audio': state['audio_path']
+        }
+        message = None
+        if skipped:
+            assets_urls['skipped_scenes'] = [i + 1 for i in skipped]
+        if missing:
+            assets_urls['missing_scenes'] = [i + 1 for i in missing]
+            message = f"Video con {len(scenes)} de {total} escenas; sin las escenas {assets_urls['missing_scenes']}."
+            print(f"Advertencia: {message}")
+        project.update(assets_urls=assets_urls)
+        project.set_status('multimedia_completed', node='generate_multimedia', message=message)
+        _save_checkpoint(project, 'generate_multimedia', state)
+        project.save()
+    except Exception as e:
+        state['error'] = f"Error en collect_scenes_node: {e}"
+    return state
+
+def route_scenes(state: AppState):
+    """Tras reunir las escenas: reintenta las fallidas que tengan intentos o continúa."""
+    if state.get('error'):
+        return "handle_error"
+    retry = _scenes_to_retry(state)
+    if retry:
+        return _send_scenes(state, retry)
+    return "continue"
+
+@instrument_node("assemble_video")
+def assemble_video_node(state: AppState) -> AppState:
+    """Nodo para unir los clips de las escenas en el video final (Reel)."""
+    try:
+        print("\n--- Nodo: Ensamblando Video Final ---")
+        project = get_project_repository(state['project_id'])
+        project.set_status('assembling', node='assemble_video')
+
+        final_video_path = video_editor.assemble_final_video(state['project_id'], state['video_paths'])
+
+        audio_prompt = state['script_data'].get('audio_prompt')
+        if AUDIO_MODE == 'single' and audio_prompt:
+            audio_results = video_editor.add_ambient_audio(
+                state['project_id'], final_video_path, state['video_paths'], audio_prompt
+            )
+            final_video_path = audio_results['video_path']
+            state['audio_path'] = audio_results['audio_path']
+            state['video_paths'] = audio_results['video_paths']
+            project.update(assets_urls={**project.get('assets_urls', {}), 'videos': state['video_paths'], 'audio': state['audio_path']})
+
+        state['video_path'] = final_video_path
+        project.update(final_video_url=final_video_path)
+        project.set_status('assembled', node='assemble_video')
+        _save_checkpoint(project, 'assemble_video', state)
+        project.save()
+    except Exception as e:
+        state['error'] = f"Error en assemble_video_node: {e}"
+    return state
+
+@instrument_node("publish_video")
 def publish_video_node(state: AppState) -> AppState:
-    """Nodo para publicar el video en las plataformas sociales. TEMPORALMENTE EN PAUSA."""
+    """Nodo para publicar el video en todas las plataformas habilitadas (PUBLISH_PLATFORMS) en paralelo."""
     try:
-        print("\n--- Nodo: Publicación de Video (EN PAUSA) ---")
-        video_paths = state.get('video_paths', [])
-        
-        if not video_paths:
-            print("No hay videos generados para publicar. Finalizando el proceso.")
+        print("\n--- Nodo: Publicación de Video ---")
+        project = get_project_repository(state['project_id'])
+        video_path = state.get('video_path')
+        if not video_path:
+            raise ValueError("No hay un video final para publicar.")
+
+        if not PUBLISH_PLATFORMS:
+            print("No hay plataformas de publicación habilitadas (PUBLISH_PLATFORMS). Saltando este paso.")
+            project.update(published_urls={'status': 'paused'})
+            state['published_urls'] = project.get('published_urls')
         else:
-            print(f"{len(video_paths)} videos listos para ser publicados:")
-            for path in video_paths:
-                print(f"  - {path}")
-
-        print("\nLa publicación automática está en pausa. Saltando este paso.")
-        
-        with get_db() as db:
-            project = db.query(VideoProject).filter(VideoProject.id == state['project_id']).one()
-            project.status = 'completed'
-            project.published_urls = {'status': 'paused'}
-            db.commit()
-            print("\n¡PROCESO COMPLETADO CON ÉXITO!")
+            project.set_status('publishing', node='publish_video')
+            project.save()
+            # Cada plataforma guarda su resultado en `published_urls` por su cuenta (también las
+            # que terminan en segundo plano), así que el nodo no escribe ese campo.
+            results = publisher.publish_project(project.id, video_path, state['script_data'])
+            state['published_urls'] = results
+            if results and all(result['status'] == 'failed' for result in results.values()):
+                raise RuntimeError("La publicación falló en todas las plataformas.")
+            summary = ", ".join(f"{platform}: {result['status']}" for platform, result in results.items())
+            print(f"Resultado de la publicación -> {summary}")
+
+        project.set_status('completed', node='publish_video')
+        _save_checkpoint(project, 'publish_video', state)
+        project.save()
+        release_project_repository(project.id)
+        print("\n¡PROCESO COMPLETADO CON ÉXITO!")
     except Exception as e:
         state['error'] = f"Error en publish_video_node: {e}"
     return state
 
+@instrument_node("handle_error")
 def handle_error_node(state: AppState) -> AppState:
     """Nodo para manejar errores, actualizar la BD y finalizar."""
     error_message = state.get('error', 'Error desconocido')
@@ -120,14 +399,16 @@ def handle_error_node(state: AppState) -> AppState:
     
     project_id = state.get('project_id')
     if project_id:
-        with get_db() as db:
-            try:
-                project = db.query(VideoProject).filter(VideoProject.id == project_id).one()
-                project.status = 'failed'
-                db.commit()
-                print(f"El estado del proyecto {project_id} ha sido actualizado a 'failed'.")
-            except Exception as db_error:
-                print(f"Error adicional al intentar actualizar la base de datos: {db_error}")
+        try:
+            project = get_project_repository(project_id)
+            project.update(error_message=error_message)
+            project.set_status('failed', message=error_message)
+            project.save()
+            print(f"El estado del proyecto {project_id} ha sido actualizado a 'failed'.")
+        except Exception as db_error:
+            print(f"Error adicional al intentar actualizar la base de datos: {db_error}")
+        finally:
+            release_project_repository(project_id)
     
     return state
 
@@ -136,13 +417,26 @@ def decide_next_node(state: AppState):
     if state.get('error'):
         return "handle_error"
     return "continue"
-    
+
+def decide_resume_node(state: AppState):
+    """Tras iniciar o cargar el proyecto, salta al primer nodo sin completar."""
+    if state.get('error'):
+        return "handle_error"
+    completed_nodes = state.get('completed_nodes') or []
+    for node_name in PIPELINE_NODES:
+        if node_name not in completed_nodes:
+            return node_name
+    return END
+
 
 workflow = StateGraph(AppState)
 
 workflow.add_node("start_project", start_new_project)
 workflow.add_node("generate_content", generate_content_node)
 workflow.add_node("generate_multimedia", generate_multimedia_node)
+workflow.add_node("generate_scene", generate_scene_node)
+workflow.add_node("collect_scenes", collect_scenes_node)
+workflow.add_node("assemble_video", assemble_video_node)
 workflow.add_node("publish_video", publish_video_node)
 workflow.add_node("handle_error", handle_error_node)
 
@@ -150,8 +444,15 @@ workflow.set_entry_point("start_project")
 
 workflow.add_conditional_edges(
     "start_project",
-    decide_next_node,
-    {"continue": "generate_content", "handle_error": "handle_error"}
+    decide_resume_node,
+    {
+        "generate_content": "generate_content",
+        "generate_multimedia": "generate_multimedia",
+        "assemble_video": "assemble_video",
+        "publish_video": "publish_video",
+        "handle_error": "handle_error",
+        END: END
+    }
 )
 workflow.add_conditional_edges(
     "generate_content",
@@ -160,6 +461,17 @@ workflow.add_conditional_edges(
 )
 workflow.add_conditional_edges(
     "generate_multimedia",
+    fan_out_scenes,
+    {"generate_scene": "generate_scene", "collect_scenes": "collect_scenes", "handle_error": "handle_error"}
+)
+workflow.add_edge("generate_scene", "collect_scenes")
+workflow.add_conditional_edges(
+    "collect_scenes",
+    route_scenes,
+    {"generate_scene": "generate_scene", "continue": "assemble_video", "handle_error": "handle_error"}
+)
+workflow.add_conditional_edges(
+    "assemble_video",
     decide_next_node,
     {"continue": "publish_video", "handle_error": "handle_error"}
 )
@@ -167,7 +479,11 @@ workflow.add_conditional_edges(
 workflow.add_edge("publish_video", END)
 workflow.add_edge("handle_error", END)
 
-app = workflow.compile()
+# Las escenas de un proyecto corren en paralelo en el ejecutor de LangGraph, con
+# `SCENE_WORKERS` como máximo. Cada ronda de reintentos de escenas añade dos pasos.
+app = workflow.compile().with_config(
+    max_concurrency=max(1, SCENE_WORKERS), recursion_limit=25 + 2 * max(1, SCENE_MAX_ATTEMPTS)
+)
 
 def get_graph():
     """Retorna la aplicación del grafo compilado."""
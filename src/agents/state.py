@@ -1,4 +1,11 @@
-from typing import TypedDict, List, Dict, Optional, Any
+from typing import Annotated, TypedDict, List, Dict, Optional, Any
+
+
+def merge_scene_results(current: Optional[Dict[int, Dict[str, Any]]],
+                        update: Optional[Dict[int, Dict[str, Any]]]) -> Dict[int, Dict[str, Any]]:
+    """Reductor de `scene_results`: combina los resultados por índice de escena; el más reciente gana."""
+    return {**(current or {}), **(update or {})}
+
 
 class AppState(TypedDict):
     """
@@ -6,11 +13,18 @@ class AppState(TypedDict):
     Este estado contiene toda la información necesaria para un flujo de trabajo de video.
     """
     project_id: int                   # ID del proyecto en la base de datos
+    idea_id: Optional[int]            # ID de la idea de origen, si existe
     idea: str                         # La idea inicial para el video
     script_data: Dict[str, Any]       # El guion completo con escenas, prompts, etc.
     image_paths: List[str]            # Lista de rutas a las imágenes generadas
+    video_paths: List[str]            # Lista de rutas a los clips generados por escena
+    # Resultado de cada escena por índice: {'image', 'video'} o {'error'}. Las escenas corren
+    # en paralelo y cada una escribe solo su entrada, que el reductor combina.
+    scene_results: Annotated[Dict[int, Dict[str, Any]], merge_scene_results]
+    asset_prefix: str                 # Prefijo de los archivos del proyecto en el almacén de assets
     audio_path: str                   # Ruta al archivo de audio de la narración
     video_path: str                   # Ruta al archivo de video final
-    published_urls: Dict[str, str]    # URLs de publicación en redes sociales
+    published_urls: Dict[str, Any]    # Resultado de la publicación por plataforma (estado, URL)
     error: Optional[str]              # Mensaje de error si algo falla
     retries: int                      # Contador de reintentos para manejar fallos
+    completed_nodes: List[str]        # Nodos ya completados (checkpoint), para reanudar
@@ -1,16 +1,150 @@
 import os
+import tempfile
+from pathlib import Path
 from dotenv import load_dotenv
 
 
 load_dotenv()
 
 NUM_SCENES = int(os.getenv("NUM_SCENES", 3))
+SCENE_WORKERS = int(os.getenv("SCENE_WORKERS", NUM_SCENES))
+# Intentos por escena en cada ejecución, con backoff exponencial entre ellos.
+SCENE_MAX_ATTEMPTS = int(os.getenv("SCENE_MAX_ATTEMPTS", 3))
+SCENE_RETRY_BASE_DELAY = float(os.getenv("SCENE_RETRY_BASE_DELAY", 5.0))
+SCENE_RETRY_MAX_DELAY = float(os.getenv("SCENE_RETRY_MAX_DELAY", 60.0))
+# Escenas que pueden faltar (agotados sus intentos) sin que falle el proyecto, y mínimo de escenas del video.
+SCENE_MAX_MISSING = int(os.getenv("SCENE_MAX_MISSING", 1))
+SCENE_MIN_SCENES = int(os.getenv("SCENE_MIN_SCENES", 2))
+SCRIPT_BATCH_CONCURRENCY = int(os.getenv("SCRIPT_BATCH_CONCURRENCY", 8))
+# 'single': una sola pasada de mmaudio sobre el video ensamblado; 'per_scene': una por clip.
+AUDIO_MODE = os.getenv("AUDIO_MODE", "single")
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 REPLICATE_API_TOKEN = os.getenv("REPLICATE_API_TOKEN")
 INSTAGRAM_ACCOUNT_ID = os.getenv('INSTAGRAM_ACCOUNT_ID')
 INSTAGRAM_ACCESS_TOKEN = os.getenv('INSTAGRAM_ACCESS_TOKEN')
+# Base de la Graph API; se puede apuntar a una API falsa local para pruebas.
+INSTAGRAM_GRAPH_URL = os.getenv("INSTAGRAM_GRAPH_URL", "https://graph.facebook.com/v23.0")
 NGROK_PUBLIC_URL = os.getenv('NGROK_PUBLIC_URL')
+# Servidor de medios persistente al que apunta NGROK_PUBLIC_URL.
+MEDIA_SERVER_HOST = os.getenv("MEDIA_SERVER_HOST", "0.0.0.0")
+MEDIA_SERVER_PORT = int(os.getenv("MEDIA_SERVER_PORT", 8000))
+MEDIA_SERVER_DIR = os.getenv("MEDIA_SERVER_DIR") or os.path.join(tempfile.gettempdir(), "ai-content-creator-media")
 DATABASE_URL = os.getenv("DATABASE_URL")
+# URL para el engine asíncrono; por defecto se deriva de DATABASE_URL con el driver asyncpg.
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL")
+
+# --- Pool de conexiones ---
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 5))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 10))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", 30))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", 1800))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", 30000))
+
+# --- Pool de workers ---
+WORKER_COUNT = int(os.getenv("WORKER_COUNT", 1))
+CLAIM_BATCH_SIZE = int(os.getenv("CLAIM_BATCH_SIZE", 5))
+IDEA_LEASE_SECONDS = int(os.getenv("IDEA_LEASE_SECONDS", 600))
+IDEA_HEARTBEAT_SECONDS = int(os.getenv("IDEA_HEARTBEAT_SECONDS", 60))
+WORKER_IDLE_SECONDS = int(os.getenv("WORKER_IDLE_SECONDS", 30))
+
+# --- Detección de ideas casi duplicadas ---
+IDEA_DEDUP_ENABLED = os.getenv("IDEA_DEDUP_ENABLED", "true").lower() == "true"
+# 'auto' (sentence-transformers si está instalado, si no hashing), 'hashing' o 'sentence-transformers[:modelo]'.
+IDEA_EMBEDDER = os.getenv("IDEA_EMBEDDER", "auto")
+# Sin valor, se usa el umbral calibrado de cada embedder (0.85 semántico, 0.8 hashing).
+IDEA_SIMILARITY_THRESHOLD = float(os.getenv("IDEA_SIMILARITY_THRESHOLD")) if os.getenv("IDEA_SIMILARITY_THRESHOLD") else None
+# Solo se comparan las ideas y proyectos de los últimos N días (0 = sin límite).
+IDEA_DEDUP_WINDOW_DAYS = int(os.getenv("IDEA_DEDUP_WINDOW_DAYS", 90))
+# 'skip': la idea pasa a 'duplicate' y no se genera; 'flag': se marca pero se genera.
+IDEA_DUPLICATE_ACTION = os.getenv("IDEA_DUPLICATE_ACTION", "skip")
+
+# --- Límites de tasa y reintentos (compartidos entre hilos y procesos) ---
+RATE_LIMIT_DIR = os.getenv("RATE_LIMIT_DIR") or os.path.join(tempfile.gettempdir(), "ai-content-creator-ratelimits")
+# (llamadas por segundo, ráfaga, concurrencia máxima) por modelo de cada proveedor.
+RATE_LIMITS = {
+    "openai": (
+        float(os.getenv("OPENAI_RATE_LIMIT_RPS", 5)),
+        int(os.getenv("OPENAI_RATE_LIMIT_BURST", 10)),
+        int(os.getenv("OPENAI_MAX_CONCURRENCY", 8)),
+    ),
+    "replicate": (
+        float(os.getenv("REPLICATE_RATE_LIMIT_RPS", 5)),
+        int(os.getenv("REPLICATE_RATE_LIMIT_BURST", 10)),
+        int(os.getenv("REPLICATE_MAX_CONCURRENCY", 16)),
+    ),
+    "default": (5.0, 10, 8),
+}
+RETRY_MAX_ATTEMPTS = int(os.getenv("RETRY_MAX_ATTEMPTS", 5))
+RETRY_BASE_DELAY = float(os.getenv("RETRY_BASE_DELAY", 1.0))
+RETRY_MAX_DELAY = float(os.getenv("RETRY_MAX_DELAY", 60.0))
+
+# --- Cola de publicación ---
+PUBLISH_POLL_BASE_SECONDS = float(os.getenv("PUBLISH_POLL_BASE_SECONDS", 5))
+PUBLISH_POLL_MAX_SECONDS = float(os.getenv("PUBLISH_POLL_MAX_SECONDS", 120))
+PUBLISH_MAX_ATTEMPTS = int(os.getenv("PUBLISH_MAX_ATTEMPTS", 30))
+PUBLISH_QUEUE_TICK_SECONDS = float(os.getenv("PUBLISH_QUEUE_TICK_SECONDS", 1))
+# Espera máxima de `publish_to_instagram(wait=True)`.
+INSTAGRAM_PUBLISH_TIMEOUT = float(os.getenv("INSTAGRAM_PUBLISH_TIMEOUT", 300))
+
+# --- Publicación multiplataforma ---
+# Plataformas en las que se publica cada proyecto terminado, separadas por comas
+# (ej. "youtube,instagram"). Vacío desactiva la publicación automática.
+PUBLISH_PLATFORMS = [p.strip().lower() for p in os.getenv("PUBLISH_PLATFORMS", "").split(",") if p.strip()]
+PUBLISH_WORKERS = int(os.getenv("PUBLISH_WORKERS", 4))
+# Segundos que el nodo de publicación espera a las plataformas; las que tarden más terminan en segundo plano.
+PUBLISH_FANOUT_TIMEOUT = float(os.getenv("PUBLISH_FANOUT_TIMEOUT", 30))
+
+# --- Métricas ---
+METRICS_PORT = int(os.getenv("METRICS_PORT", 9100))
+
+# --- Transferencias HTTP ---
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", 16))
+HTTP_TIMEOUT = (float(os.getenv("HTTP_CONNECT_TIMEOUT", 10)), float(os.getenv("HTTP_READ_TIMEOUT", 60)))
+DOWNLOAD_CHUNK_SIZE = int(os.getenv("DOWNLOAD_CHUNK_SIZE", 1024 * 1024))
+DOWNLOAD_MAX_RETRIES = int(os.getenv("DOWNLOAD_MAX_RETRIES", 5))
+
+# --- Predicciones de Replicate ---
+REPLICATE_ASYNC_PREDICTIONS = os.getenv("REPLICATE_ASYNC_PREDICTIONS", "true").lower() == "true"
+REPLICATE_BASE_URL = os.getenv("REPLICATE_BASE_URL") or None
+REPLICATE_POLL_INTERVAL = float(os.getenv("REPLICATE_POLL_INTERVAL", 2))
+REPLICATE_PREDICTION_TIMEOUT = float(os.getenv("REPLICATE_PREDICTION_TIMEOUT", 900))
+
+# --- Almacén de assets ---
+# 'local' (sistema de archivos) o 's3' (S3 o compatible, p. ej. MinIO; requiere boto3).
+ASSET_STORE = os.getenv("ASSET_STORE", "local")
+ASSET_STORE_ROOT = os.getenv("ASSET_STORE_ROOT") or str(Path(__file__).parent / "assets")
+ASSET_S3_BUCKET = os.getenv("ASSET_S3_BUCKET")
+ASSET_S3_PREFIX = os.getenv("ASSET_S3_PREFIX", "")
+ASSET_S3_ENDPOINT_URL = os.getenv("ASSET_S3_ENDPOINT_URL") or None
+ASSET_S3_REGION = os.getenv("ASSET_S3_REGION", "us-east-1")
+ASSET_S3_PART_SIZE = int(os.getenv("ASSET_S3_PART_SIZE", 8 * 1024 * 1024))
+# Copias locales de los assets remotos que necesita ffmpeg (y archivos en preparación).
+ASSET_CACHE_DIR = os.getenv("ASSET_CACHE_DIR") or os.path.join(tempfile.gettempdir(), "ai-content-creator-assets")
+
+# --- Retención de assets ---
+# Cada cuánto corre el recolector de basura de assets (0 lo desactiva).
+ASSET_GC_INTERVAL_SECONDS = int(os.getenv("ASSET_GC_INTERVAL_SECONDS", 600))
+# Tamaño máximo de todos los assets; al superarlo se borran primero los intermedios (0 = sin cuota).
+ASSET_DISK_QUOTA_BYTES = int(os.getenv("ASSET_DISK_QUOTA_BYTES", 20 * 1024 ** 3))
+# Días sin acceso tras los que se borra un asset, por tipo (0 = sin límite).
+ASSET_RETENTION_DAYS = {
+    "intermediate": float(os.getenv("ASSET_RETENTION_INTERMEDIATE_DAYS", 1)),
+    "image": float(os.getenv("ASSET_RETENTION_IMAGE_DAYS", 30)),
+    "video": float(os.getenv("ASSET_RETENTION_VIDEO_DAYS", 30)),
+    "audio": float(os.getenv("ASSET_RETENTION_AUDIO_DAYS", 30)),
+    "final": float(os.getenv("ASSET_RETENTION_FINAL_DAYS", 0)),
+}
+
+# --- Caché de salidas de Replicate ---
+REPLICATE_CACHE_ENABLED = os.getenv("REPLICATE_CACHE_ENABLED", "true").lower() == "true"
+REPLICATE_CACHE_DIR = os.getenv("REPLICATE_CACHE_DIR") or str(Path(__file__).parent / "assets" / "cache")
+REPLICATE_CACHE_MAX_BYTES = int(os.getenv("REPLICATE_CACHE_MAX_BYTES", 5 * 1024 ** 3))
+
+# --- Preparación de las imágenes que se suben a seedance ---
+IMAGE_PREP_ENABLED = os.getenv("IMAGE_PREP_ENABLED", "true").lower() == "true"
+IMAGE_PREP_FORMAT = os.getenv("IMAGE_PREP_FORMAT", "JPEG").upper()  # JPEG, WEBP o PNG
+IMAGE_PREP_QUALITY = int(os.getenv("IMAGE_PREP_QUALITY", 90))
 
 def check_env_vars():
     """Verifica que las variables de entorno esenciales estén configuradas."""
@@ -1,15 +1,73 @@
-from contextlib import contextmanager
-from typing import Generator
+from contextlib import contextmanager, asynccontextmanager
+from typing import AsyncGenerator, Generator
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
 from sqlalchemy.orm import sessionmaker, Session
 from .models import Base
-from ..config import DATABASE_URL
+from ..config import (
+    DATABASE_URL, ASYNC_DATABASE_URL, DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT,
+    DB_POOL_RECYCLE, DB_POOL_PRE_PING, DB_STATEMENT_TIMEOUT_MS
+)
 
 
-engine = create_engine(DATABASE_URL)
+def _engine_options(url: str, is_async: bool = False) -> dict:
+    """
+    Opciones del pool para un engine. SQLite usa su pool por defecto; en
+    PostgreSQL se aplican tamaño, overflow, reciclado, pre-ping y statement_timeout.
+    """
+    if make_url(url).get_backend_name() != 'postgresql':
+        return {}
+    options = {
+        'pool_size': DB_POOL_SIZE,
+        'max_overflow': DB_MAX_OVERFLOW,
+        'pool_timeout': DB_POOL_TIMEOUT,
+        'pool_recycle': DB_POOL_RECYCLE,
+        'pool_pre_ping': DB_POOL_PRE_PING,
+    }
+    if DB_STATEMENT_TIMEOUT_MS:
+        if is_async:
+            options['connect_args'] = {'server_settings': {'statement_timeout': str(DB_STATEMENT_TIMEOUT_MS)}}
+        else:
+            options['connect_args'] = {'options': f'-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}'}
+    return options
+
+def _async_url(url: str) -> str:
+    """Convierte la URL síncrona al driver asíncrono equivalente (asyncpg o aiosqlite)."""
+    parsed = make_url(url)
+    driver = {'postgresql': 'postgresql+asyncpg', 'sqlite': 'sqlite+aiosqlite'}.get(parsed.get_backend_name())
+    if driver is None:
+        raise ValueError(f"No hay un driver asíncrono configurado para '{parsed.get_backend_name()}'.")
+    return parsed.set(drivername=driver).render_as_string(hide_password=False)
+
+
+engine = create_engine(DATABASE_URL, **_engine_options(DATABASE_URL))
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+_async_engine = None
+_async_session_factory = None
+
+def get_async_engine():
+    """
+    Retorna el engine asíncrono, creándolo la primera vez.
+
+    Se crea bajo demanda para que el servicio síncrono no necesite el driver
+    asíncrono (asyncpg o aiosqlite) instalado.
+    """
+    global _async_engine, _async_session_factory
+    if _async_engine is None:
+        url = ASYNC_DATABASE_URL or _async_url(DATABASE_URL)
+        try:
+            _async_engine = create_async_engine(url, **_engine_options(url, is_async=True))
+        except ImportError as e:
+            driver = make_url(url).get_driver_name()
+            raise ImportError(
+                f"El engine asíncrono usa el driver '{driver}', pero no está instalado (pip install {driver})."
+            ) from e
+        _async_session_factory = async_sessionmaker(_async_engine, autoflush=False, expire_on_commit=False)
+    return _async_engine
+
 def init_db():
     """Crea todas las tablas en la base de datos."""
     print("Inicializando la base de datos...")
@@ -28,6 +86,16 @@ def get_db() -> Generator[Session, None, None]:
     finally:
         db.close()
 
+@asynccontextmanager
+async def get_async_db() -> AsyncGenerator[AsyncSession, None]:
+    """Equivalente asíncrono de `get_db`, para código asyncio."""
+    get_async_engine()
+    db = _async_session_factory()
+    try:
+        yield db
+    finally:
+        await db.close()
+
 if __name__ == '__main__':
     print("Creando la base de datos y las tablas si no existen...")
     init_db()
@@ -1,21 +1,34 @@
-from sqlalchemy import create_engine, Column, Integer, String, Text, DateTime, JSON
+from sqlalchemy import create_engine, Column, Integer, BigInteger, Float, String, Text, DateTime, JSON, ForeignKey
+import hashlib
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.sql import func
 
 Base = declarative_base()
 
+
+def hash_idea_text(text: str) -> str:
+    """Hash SHA-256 (hex) del texto normalizado de una idea, usado para deduplicar."""
+    normalized = ' '.join(text.split()).casefold()
+    return hashlib.sha256(normalized.encode('utf-8')).hexdigest()
+
+def _default_text_hash(context) -> str:
+    return hash_idea_text(context.get_current_parameters()['text'])
+
 class VideoProject(Base):
     """Modelo de la tabla para almacenar la información de cada proyecto de video."""
     __tablename__ = 'video_projects'
 
     id = Column(Integer, primary_key=True, index=True)
+    idea_id = Column(Integer, ForeignKey('ideas.id'), nullable=True, index=True)
     idea_prompt = Column(Text, nullable=False)
     script = Column(JSON, nullable=True)
     status = Column(String, default='pending', index=True) # pending, generating, editing, publishing, completed, failed
-    assets_urls = Column(JSON, nullable=True) # {"images": [...], "audio": "..."}
+    assets_urls = Column(JSON, nullable=True) # URIs del almacén de assets: {"images": [...], "videos": [...], "audio": "..."}
     final_video_url = Column(String, nullable=True)
-    published_urls = Column(JSON, nullable=True) # {"youtube": "...", "tiktok": "..."}
+    published_urls = Column(JSON, nullable=True) # {"youtube": {"status": "published", "url": "..."}, ...}
     error_message = Column(Text, nullable=True)
+    # Salida de cada nodo del grafo: {"completed_nodes": [...], "state": {...}}
+    checkpoint = Column(JSON, nullable=True)
 
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
@@ -24,17 +37,133 @@ class VideoProject(Base):
         return f"<VideoProject(id={self.id}, idea='{self.idea_prompt[:30]}...', status='{self.status}')>"
 
 
+class ProjectEvent(Base):
+    """
+    Registro append-only de las transiciones de estado de un proyecto.
+
+    Las filas nunca se actualizan: el historial completo de un proyecto es la
+    secuencia de sus eventos ordenada por `id`.
+    """
+    __tablename__ = 'project_events'
+
+    id = Column(Integer, primary_key=True, index=True)
+    project_id = Column(Integer, ForeignKey('video_projects.id'), nullable=False, index=True)
+    status = Column(String, nullable=False)
+    node = Column(String, nullable=True)
+    message = Column(Text, nullable=True)
+
+    # Se fija al registrar la transición, no al escribirla (los eventos se escriben en lote).
+    created_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+
+    def __repr__(self):
+        return f"<ProjectEvent(project_id={self.project_id}, status='{self.status}', node='{self.node}')>"
+
+
 class Idea(Base):
     """Modelo para almacenar ideas de video a ser procesadas."""
     __tablename__ = 'ideas'
 
     id = Column(Integer, primary_key=True, index=True)
-    text = Column(Text, nullable=False, unique=True)
-    # Estados: 'pending', 'processing', 'completed', 'failed'
+    text = Column(Text, nullable=False)
+    # Deduplicación con un índice de ancho fijo en lugar de un UNIQUE sobre el texto completo.
+    text_hash = Column(String(64), nullable=False, unique=True, default=_default_text_hash)
+    # Estados: 'pending', 'processing', 'completed', 'failed', 'duplicate'
     status = Column(String, default='pending', index=True)
+    # Guion pregenerado en lote; si existe, el pipeline no vuelve a llamar al LLM.
+    script = Column(JSON, nullable=True)
+    # Lease del worker que la está procesando; si expira, otro worker puede reclamarla.
+    locked_by = Column(String, nullable=True)
+    lease_expires_at = Column(DateTime(timezone=True), nullable=True, index=True)
+    # Idea anterior casi idéntica, detectada por similitud de embeddings.
+    duplicate_of = Column(Integer, ForeignKey('ideas.id'), nullable=True)
+    similarity = Column(Float, nullable=True)
     
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
     def __repr__(self):
         return f"<Idea(id={self.id}, text='{self.text[:30]}...', status='{self.status}')>"
+
+
+class NodeRun(Base):
+    """
+    Métricas de una ejecución: un nodo del grafo (kind='node') o una llamada a un
+    proveedor externo como Replicate u OpenAI (kind='call').
+    """
+    __tablename__ = 'node_runs'
+
+    id = Column(Integer, primary_key=True, index=True)
+    project_id = Column(Integer, ForeignKey('video_projects.id'), nullable=True, index=True)
+    kind = Column(String, nullable=False)  # node, call
+    node = Column(String, nullable=True, index=True)
+    provider = Column(String, nullable=True)  # replicate, openai
+    model = Column(String, nullable=True)
+    status = Column(String, nullable=False)  # ok, error
+    duration_ms = Column(Float, nullable=False)
+    retries = Column(Integer, default=0)
+    input_tokens = Column(Integer, default=0)
+    output_tokens = Column(Integer, default=0)
+    bytes_downloaded = Column(BigInteger, default=0)
+    cost_estimate = Column(Float, default=0.0)  # USD aproximados
+    error_message = Column(Text, nullable=True)
+
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    def __repr__(self):
+        return f"<NodeRun(kind='{self.kind}', node='{self.node}', model='{self.model}', status='{self.status}', duration_ms={self.duration_ms:.0f})>"
+
+
+class PublishJob(Base):
+    """
+    Trabajo de publicación de un video en una plataforma. Los de Instagram los
+    procesa la cola de publicación en segundo plano; los demás, el publicador
+    multiplataforma (`publisher`). La clave de idempotencia evita dobles posts.
+    """
+    __tablename__ = 'publish_jobs'
+
+    id = Column(Integer, primary_key=True, index=True)
+    project_id = Column(Integer, ForeignKey('video_projects.id'), nullable=True, index=True)
+    platform = Column(String, nullable=False)  # instagram, youtube
+    # Clave de idempotencia: un mismo video nunca se encola (ni se publica) dos veces.
+    idempotency_key = Column(String(64), nullable=True, unique=True)
+    # Estados: 'pending', 'container_created' (Instagram), 'publishing' (subida directa), 'published', 'failed'
+    status = Column(String, default='pending', index=True)
+    video_path = Column(String, nullable=False)
+    caption = Column(Text, nullable=True)
+    media_url_path = Column(String, nullable=True)  # Ruta en el servidor de medios
+    container_id = Column(String, nullable=True)
+    media_id = Column(String, nullable=True)
+    # Momento en que se llamó a `media_publish`: a partir de ahí el Reel puede estar publicado.
+    publish_requested_at = Column(DateTime(timezone=True), nullable=True)
+    result_url = Column(String, nullable=True)
+    attempts = Column(Integer, default=0)
+    next_attempt_at = Column(DateTime(timezone=True), nullable=True, index=True)
+    error_message = Column(Text, nullable=True)
+
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+
+    def __repr__(self):
+        return f"<PublishJob(id={self.id}, platform='{self.platform}', status='{self.status}')>"
+
+
+class Asset(Base):
+    """
+    Índice de los archivos guardados en el almacén de assets, con su tamaño y
+    último acceso, para la retención y el recolector de basura (`asset_gc`).
+    """
+    __tablename__ = 'assets'
+
+    id = Column(Integer, primary_key=True, index=True)
+    uri = Column(String, nullable=False, unique=True)
+    # Proyecto dueño, deducido de la clave; sin FK porque algunas claves usan otros identificadores.
+    project_id = Column(Integer, nullable=True, index=True)
+    # Tipos: 'image', 'video', 'audio', 'final' (video publicado), 'intermediate' (ya no referenciado)
+    kind = Column(String, nullable=False, index=True)
+    size_bytes = Column(BigInteger, nullable=False, default=0)
+
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    last_accessed_at = Column(DateTime(timezone=True), nullable=False, index=True)
+
+    def __repr__(self):
+        return f"<Asset(uri='{self.uri}', kind='{self.kind}', size_bytes={self.size_bytes})>"
@@ -0,0 +1,155 @@
+import threading
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+from sqlalchemy import select, update
+from .database import get_db, get_async_db
+from .models import VideoProject, ProjectEvent
+
+PROJECT_FIELDS = [column.name for column in VideoProject.__table__.columns]
+
+
+class ProjectRepository:
+    """
+    Copia en memoria de un `VideoProject` durante una ejecución del pipeline.
+
+    Los nodos leen y modifican el proyecto en memoria y llaman a `save` una vez
+    al terminar: los campos modificados se escriben con un único UPDATE y las
+    transiciones de estado acumuladas se añaden a `project_events`, todo en la
+    misma transacción. Así cada nodo cuesta una escritura en lugar de varias
+    consultas y commits.
+
+    Args:
+        data: Valores de las columnas del proyecto.
+    """
+    def __init__(self, data: Dict[str, Any]):
+        self.data = data
+        self._changes: Dict[str, Any] = {}
+        self._events: List[Dict[str, Any]] = []
+
+    @property
+    def id(self) -> int:
+        return self.data['id']
+
+    @classmethod
+    def create(cls, idea_prompt: str, idea_id: Optional[int] = None, status: str = 'starting') -> 'ProjectRepository':
+        """Inserta un proyecto nuevo junto con su primer evento."""
+        with get_db() as db:
+            project = VideoProject(idea_id=idea_id, idea_prompt=idea_prompt, status=status)
+            db.add(project)
+            db.flush()
+            db.add(ProjectEvent(project_id=project.id, status=status))
+            db.commit()
+            db.refresh(project)
+            return cls({field: getattr(project, field) for field in PROJECT_FIELDS})
+
+    @classmethod
+    async def create_async(cls, idea_prompt: str, idea_id: Optional[int] = None, status: str = 'starting') -> 'ProjectRepository':
+        """Versión asíncrona de `create`."""
+        async with get_async_db() as db:
+            project = VideoProject(idea_id=idea_id, idea_prompt=idea_prompt, status=status)
+            db.add(project)
+            await db.flush()
+            db.add(ProjectEvent(project_id=project.id, status=status))
+            await db.commit()
+            await db.refresh(project)
+            return cls({field: getattr(project, field) for field in PROJECT_FIELDS})
+
+    @classmethod
+    def load(cls, project_id: int) -> 'ProjectRepository':
+        """Lee el proyecto una sola vez; lanza `NoResultFound` si no existe."""
+        with get_db() as db:
+            project = db.query(VideoProject).filter(VideoProject.id == project_id).one()
+            return cls({field: getattr(project, field) for field in PROJECT_FIELDS})
+
+    @classmethod
+    async def load_async(cls, project_id: int) -> 'ProjectRepository':
+        """Versión asíncrona de `load`."""
+        async with get_async_db() as db:
+            project = (await db.execute(select(VideoProject).where(VideoProject.id == project_id))).scalar_one()
+            return cls({field: getattr(project, field) for field in PROJECT_FIELDS})
+
+    def get(self, field: str, default: Any = None) -> Any:
+        value = self.data.get(field)
+        return default if value is None else value
+
+    def update(self, **fields):
+        """Modifica campos del proyecto en memoria; se escriben en el próximo `save`."""
+        for field, value in fields.items():
+            if field not in PROJECT_FIELDS or field == 'id':
+                raise AttributeError(f"VideoProject no tiene el campo '{field}'.")
+            self.data[field] = value
+            self._changes[field] = value
+
+    def set_status(self, status: str, node: Optional[str] = None, message: Optional[str] = None):
+        """Registra una transición de estado; se escribe en el próximo `save`."""
+        self._events.append({
+            'project_id': self.id,
+            'status': status,
+            'node': node,
+            'message': message,
+            'created_at': datetime.now(timezone.utc)
+        })
+        self.update(status=status)
+
+    def save(self):
+        """Escribe los cambios pendientes y los eventos en una sola transacción."""
+        if not self._changes and not self._events:
+            return
+        with get_db() as db:
+            if self._changes:
+                db.execute(update(VideoProject).where(VideoProject.id == self.id).values(**self._changes))
+            if self._events:
+                db.execute(ProjectEvent.__table__.insert(), self._events)
+            db.commit()
+        self._changes = {}
+        self._events = []
+
+    async def save_async(self):
+        """Versión asíncrona de `save`."""
+        if not self._changes and not self._events:
+            return
+        async with get_async_db() as db:
+            if self._changes:
+                await db.execute(update(VideoProject).where(VideoProject.id == self.id).values(**self._changes))
+            if self._events:
+                await db.execute(ProjectEvent.__table__.insert(), self._events)
+            await db.commit()
+        self._changes = {}
+        self._events = []
+
+
+_active: Dict[int, ProjectRepository] = {}
+_active_lock = threading.Lock()
+
+def get_project_repository(project_id: int) -> ProjectRepository:
+    """Retorna el repositorio en memoria del proyecto, cargándolo solo la primera vez."""
+    with _active_lock:
+        repository = _active.get(project_id)
+    if repository is None:
+        repository = ProjectRepository.load(project_id)
+        with _active_lock:
+            repository = _active.setdefault(project_id, repository)
+    return repository
+
+def register_project_repository(repository: ProjectRepository):
+    """Guarda un repositorio recién creado o cargado para los siguientes nodos."""
+    with _active_lock:
+        _active[repository.id] = repository
+
+def release_project_repository(project_id: int):
+    """Olvida la copia en memoria de un proyecto al terminar su ejecución."""
+    with _active_lock:
+        _active.pop(project_id, None)
+
+def get_project_events(project_id: int) -> List[ProjectEvent]:
+    """Retorna el historial de estados de un proyecto, en orden."""
+    with get_db() as db:
+        return db.query(ProjectEvent).filter(ProjectEvent.project_id == project_id).order_by(ProjectEvent.id.asc()).all()
+
+async def get_project_events_async(project_id: int) -> List[ProjectEvent]:
+    """Versión asíncrona de `get_project_events`."""
+    async with get_async_db() as db:
+        result = await db.scalars(
+            select(ProjectEvent).where(ProjectEvent.project_id == project_id).order_by(ProjectEvent.id.asc())
+        )
+        return list(result.all())
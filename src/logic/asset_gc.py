@@ -0,0 +1,188 @@
+"""
+Recolector de basura de assets: retención por antigüedad y cuota de disco.
+
+Uso (una pasada manual):
+    python -m src.logic.asset_gc
+"""
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+from sqlalchemy import func, or_
+from ..database.database import get_db
+from ..database.models import Asset, VideoProject
+from ..config import ASSET_GC_INTERVAL_SECONDS, ASSET_DISK_QUOTA_BYTES, ASSET_RETENTION_DAYS
+from .asset_store import get_asset_store
+from .asset_index import record_asset, forget_asset
+
+# Proyectos cuyos assets ya se pueden borrar; el resto está en curso.
+FINISHED_PROJECT_STATUSES = ('completed', 'failed')
+# Orden en que se borran los assets al superar la cuota.
+DELETE_ORDER = ('intermediate', 'image', 'audio', 'video', 'final')
+
+
+def _project_uris(project: VideoProject) -> List[str]:
+    """URIs que un proyecto sigue referenciando (assets_urls y video final)."""
+    uris = [project.final_video_url] if project.final_video_url else []
+    for value in (project.assets_urls or {}).values():
+        uris.extend(value if isinstance(value, list) else [value])
+    return [uri for uri in uris if uri]
+
+
+class AssetGarbageCollector:
+    """
+    Borra assets según su tipo, su último acceso y una cuota de disco global.
+
+    En cada pasada:
+    1. Reclasifica los assets de proyectos terminados: el video final pasa a
+       'final' y los que el proyecto ya no referencia (clips sin audio,
+       salida de mmaudio, cortes previos) pasan a 'intermediate'.
+    2. Borra los assets cuyo último acceso supera la retención de su tipo.
+    3. Si el total sigue por encima de la cuota, borra en el orden de
+       `DELETE_ORDER` (intermedios primero) y, dentro de cada tipo, los
+       menos usados recientemente.
+
+    Los assets de proyectos en curso nunca se tocan. La primera pasada
+    incorpora al índice los archivos que ya existían en el almacén.
+    """
+    def __init__(self, store=None, quota_bytes: int = ASSET_DISK_QUOTA_BYTES,
+                 retention_days: Optional[Dict[str, float]] = None, interval: float = ASSET_GC_INTERVAL_SECONDS):
+        self.store = store or get_asset_store()
+        self.quota_bytes = quota_bytes
+        self.retention_days = ASSET_RETENTION_DAYS if retention_days is None else retention_days
+        self.interval = interval
+        self._indexed = False
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> 'AssetGarbageCollector':
+        self._thread = threading.Thread(target=self._loop, name="asset-gc", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread:
+            self._thread.join()
+
+    def _loop(self):
+        while not self._stopped.is_set():
+            try:
+                self.run_once()
+            except Exception as e:
+                print(f"Error en el recolector de assets: {e}")
+            self._stopped.wait(self.interval)
+
+    def index_existing(self) -> int:
+        """Registra en el índice los assets del almacén que aún no están; retorna cuántos."""
+        with get_db() as db:
+            known = {uri for (uri,) in db.query(Asset.uri).all()}
+        added = 0
+        for uri, key, size, modified in self.store.iter_assets():
+            if uri not in known:
+                record_asset(uri, key, size, accessed_at=modified)
+                added += 1
+        if added:
+            print(f"{added} assets existentes incorporados al índice.")
+        return added
+
+    def classify(self):
+        """Marca como 'final' o 'intermediate' los assets de los proyectos terminados."""
+        with get_db() as db:
+            unclassified = db.query(Asset.project_id).filter(Asset.kind.in_(('image', 'video', 'audio')))
+            projects = (
+                db.query(VideoProject)
+                .filter(VideoProject.status.in_(FINISHED_PROJECT_STATUSES), VideoProject.id.in_(unclassified))
+                .all()
+            )
+            for project in projects:
+                referenced = set(_project_uris(project))
+                assets = db.query(Asset).filter(Asset.project_id == project.id, Asset.kind.in_(('image', 'video', 'audio')))
+                for asset in assets:
+                    if asset.uri == project.final_video_url:
+                        asset.kind = 'final'
+                    elif asset.uri not in referenced:
+                        asset.kind = 'intermediate'
+            db.commit()
+
+    def _deletable(self, db):
+        """Assets sin dueño o cuyo proyecto ya terminó."""
+        in_flight = db.query(VideoProject.id).filter(~VideoProject.status.in_(FINISHED_PROJECT_STATUSES))
+        return db.query(Asset).filter(or_(Asset.project_id.is_(None), ~Asset.project_id.in_(in_flight)))
+
+    def _delete(self, db, asset: Asset) -> bool:
+        try:
+            self.store.delete(asset.uri)
+        except Exception as e:
+            print(f"Advertencia: no se pudo borrar el asset {asset.uri}: {e}")
+            return False
+        db.delete(asset)
+        forget_asset(asset.uri)
+        return True
+
+    def run_once(self) -> Dict[str, int]:
+        """Una pasada del recolector; retorna los assets borrados, los bytes liberados y el total restante."""
+        if not self._indexed:
+            self.index_existing()
+            self._indexed = True
+        self.classify()
+
+        report = {'deleted': 0, 'freed_bytes': 0}
+        now = datetime.now(timezone.utc)
+        with get_db() as db:
+            for kind, days in self.retention_days.items():
+                if not days:
+                    continue
+                expired = self._deletable(db).filter(
+                    Asset.kind == kind, Asset.last_accessed_at < now - timedelta(days=days)
+                ).all()
+                for asset in expired:
+                    if self._delete(db, asset):
+                        report['deleted'] += 1
+                        report['freed_bytes'] += asset.size_bytes
+            db.commit()
+
+            total = db.query(func.coalesce(func.sum(Asset.size_bytes), 0)).scalar()
+            if self.quota_bytes and total > self.quota_bytes:
+                for kind in DELETE_ORDER:
+                    candidates = self._deletable(db).filter(Asset.kind == kind).order_by(Asset.last_accessed_at.asc())
+                    for asset in candidates.all():
+                        if total <= self.quota_bytes:
+                            break
+                        if self._delete(db, asset):
+                            total -= asset.size_bytes
+                            report['deleted'] += 1
+                            report['freed_bytes'] += asset.size_bytes
+                    db.commit()
+                    if total <= self.quota_bytes:
+                        break
+                if total > self.quota_bytes:
+                    print(f"Advertencia: los assets ocupan {total} bytes, por encima de la cuota, "
+                          "pero el resto pertenece a proyectos en curso.")
+        report['total_bytes'] = int(total)
+
+        if report['deleted']:
+            print(f"Recolector de assets: {report['deleted']} borrados, {report['freed_bytes']} bytes liberados.")
+        return report
+
+
+_collector: Optional[AssetGarbageCollector] = None
+_collector_lock = threading.Lock()
+
+def start_asset_gc() -> Optional[AssetGarbageCollector]:
+    """Arranca el recolector de assets del proceso si está activado y aún no está en marcha."""
+    global _collector
+    if ASSET_GC_INTERVAL_SECONDS <= 0:
+        return None
+    with _collector_lock:
+        if _collector is None:
+            _collector = AssetGarbageCollector().start()
+            print("Recolector de assets iniciado.")
+        return _collector
+
+def main():
+    report = AssetGarbageCollector().run_once()
+    print(f"Assets borrados: {report['deleted']}. Bytes liberados: {report['freed_bytes']}. "
+          f"Total restante: {report['total_bytes']} bytes.")
+
+if __name__ == "__main__":
+    main()
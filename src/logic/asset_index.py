@@ -0,0 +1,93 @@
+import re
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+# Tipo de asset según el directorio de su clave en el almacén.
+KIND_BY_DIR = {'images': 'image', 'videos': 'video', 'audio': 'audio'}
+# Un mismo asset actualiza su último acceso como mucho una vez por intervalo.
+TOUCH_INTERVAL_SECONDS = 300
+
+_touched: Dict[str, float] = {}
+_touched_lock = threading.Lock()
+
+
+def asset_kind(key: str) -> str:
+    return KIND_BY_DIR.get(key.split('/', 1)[0], 'video')
+
+def owner_project(key: str) -> Optional[int]:
+    """Proyecto dueño de un asset: las claves empiezan por su ID (`videos/12_..._final.mp4`)."""
+    match = re.match(r'(\d+)_', key.rsplit('/', 1)[-1])
+    return int(match.group(1)) if match else None
+
+def _upsert_statement(values: Dict):
+    """INSERT ... ON CONFLICT (uri) DO UPDATE para el dialecto en uso."""
+    from sqlalchemy.dialects import postgresql, sqlite
+    from ..database.database import engine
+    from ..database.models import Asset
+    dialect = postgresql if engine.dialect.name == 'postgresql' else sqlite
+    statement = dialect.insert(Asset).values(values)
+    return statement.on_conflict_do_update(
+        index_elements=['uri'],
+        set_={
+            'kind': statement.excluded.kind,
+            'size_bytes': statement.excluded.size_bytes,
+            'last_accessed_at': statement.excluded.last_accessed_at,
+        }
+    )
+
+def record_asset(uri: str, key: str, size_bytes: int, accessed_at: Optional[datetime] = None):
+    """
+    Registra (o actualiza) un asset recién guardado en el índice.
+
+    Un fallo del índice nunca interrumpe el pipeline: el asset queda guardado
+    y el recolector lo incorporará al recorrer el almacén.
+    """
+    from ..database.database import get_db
+    try:
+        with get_db() as db:
+            db.execute(_upsert_statement({
+                'uri': uri,
+                'project_id': owner_project(key),
+                'kind': asset_kind(key),
+                'size_bytes': size_bytes,
+                'last_accessed_at': accessed_at or datetime.now(timezone.utc),
+            }))
+            db.commit()
+    except Exception as e:
+        print(f"Advertencia: no se pudo registrar el asset {uri} en el índice: {e}")
+        return
+    with _touched_lock:
+        _touched[uri] = time.monotonic()
+
+def touch_asset(uri: str):
+    """Actualiza el último acceso de un asset, como mucho una vez cada `TOUCH_INTERVAL_SECONDS`."""
+    from ..database.database import get_db
+    from ..database.models import Asset
+    now = time.monotonic()
+    with _touched_lock:
+        if now - _touched.get(uri, float('-inf')) < TOUCH_INTERVAL_SECONDS:
+            return
+        _touched[uri] = now
+    try:
+        with get_db() as db:
+            db.query(Asset).filter(Asset.uri == uri).update(
+                {Asset.last_accessed_at: datetime.now(timezone.utc)}, synchronize_session=False
+            )
+            db.commit()
+    except Exception as e:
+        print(f"Advertencia: no se pudo actualizar el último acceso de {uri}: {e}")
+
+def forget_asset(uri: str):
+    with _touched_lock:
+        _touched.pop(uri, None)
+
+def asset_usage() -> Dict[str, Dict[str, int]]:
+    """Número de assets y bytes ocupados por tipo, según el índice."""
+    from sqlalchemy import func
+    from ..database.database import get_db
+    from ..database.models import Asset
+    with get_db() as db:
+        rows = db.query(Asset.kind, func.count(Asset.id), func.sum(Asset.size_bytes)).group_by(Asset.kind).all()
+    return {kind: {'count': count, 'bytes': int(size or 0)} for kind, count, size in rows}
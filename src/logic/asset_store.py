@@ -0,0 +1,282 @@
+import os
+import shutil
+import threading
+from datetime import datetime, timezone
+from typing import BinaryIO, Iterable, Iterator, Optional, Tuple
+from urllib.parse import unquote, urlsplit
+from ..config import (
+    ASSET_STORE, ASSET_STORE_ROOT, ASSET_S3_BUCKET, ASSET_S3_PREFIX, ASSET_S3_ENDPOINT_URL,
+    ASSET_S3_REGION, ASSET_S3_PART_SIZE, ASSET_CACHE_DIR, REPLICATE_CACHE_DIR
+)
+from .asset_index import record_asset, touch_asset
+
+
+def _write_chunks(chunks: Iterable[bytes], path: str) -> int:
+    """Escribe los bloques en `path` a través de un `.part` que se renombra al terminar."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    part_path = f"{path}.part"
+    written = 0
+    try:
+        with open(part_path, 'wb') as f:
+            for chunk in chunks:
+                f.write(chunk)
+                written += len(chunk)
+        os.replace(part_path, path)
+    except BaseException:
+        if os.path.exists(part_path):
+            os.remove(part_path)
+        raise
+    return written
+
+def _file_path(uri: str) -> str:
+    """Ruta de una URI `file://` o de una ruta local sin esquema (checkpoints antiguos)."""
+    return unquote(urlsplit(uri).path) if uri.startswith('file://') else uri
+
+
+class LocalAssetStore:
+    """
+    Almacén de assets en el sistema de archivos local, bajo `root`.
+
+    Las URIs son `file://<ruta absoluta>`; también acepta rutas sin esquema,
+    como las guardadas en checkpoints anteriores. `local_path` no copia nada.
+    Cada asset guardado se registra en el índice (`asset_index`) y cada
+    lectura actualiza su último acceso. `iter_assets` no entra en los
+    directorios de `exclude_dirs` (por defecto, la caché de Replicate, que
+    puede vivir dentro de `root` y gestiona su propio tamaño).
+    """
+    def __init__(self, root: str = ASSET_STORE_ROOT, exclude_dirs: Iterable[str] = (REPLICATE_CACHE_DIR,)):
+        self.root = os.path.abspath(root)
+        self.exclude_dirs = {os.path.abspath(directory) for directory in exclude_dirs}
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, *key.split('/'))
+
+    def uri(self, key: str) -> str:
+        return 'file://' + self._path(key)
+
+    def put_stream(self, key: str, chunks: Iterable[bytes]) -> str:
+        """Guarda el contenido de un iterador de bloques bajo `key` y retorna su URI."""
+        size = _write_chunks(chunks, self._path(key))
+        record_asset(self.uri(key), key, size)
+        return self.uri(key)
+
+    def put_file(self, key: str, path: str) -> str:
+        """Guarda un archivo local bajo `key`; si ya está en su sitio no se copia."""
+        target = self._path(key)
+        if os.path.abspath(path) != target:
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            shutil.copyfile(path, target)
+        record_asset(self.uri(key), key, os.path.getsize(target))
+        return self.uri(key)
+
+    def working_path(self, key: str) -> str:
+        """Ruta local donde generar (p. ej. con ffmpeg) el archivo que se guardará con `put_file(key, ...)`."""
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        return path
+
+    def local_path(self, uri: str) -> str:
+        touch_asset(uri)
+        return _file_path(uri)
+
+    def open(self, uri: str) -> BinaryIO:
+        return open(self.local_path(uri), 'rb')
+
+    def exists(self, uri: str) -> bool:
+        return os.path.isfile(_file_path(uri))
+
+    def size(self, uri: str) -> Optional[int]:
+        try:
+            return os.path.getsize(_file_path(uri))
+        except FileNotFoundError:
+            return None
+
+    def delete(self, uri: str):
+        try:
+            os.remove(_file_path(uri))
+        except FileNotFoundError:
+            pass
+
+    def iter_assets(self) -> Iterator[Tuple[str, str, int, datetime]]:
+        """Recorre el almacén y produce (uri, clave, tamaño, fecha de modificación) de cada asset."""
+        for directory, dir_names, file_names in os.walk(self.root):
+            dir_names[:] = [name for name in dir_names if os.path.join(directory, name) not in self.exclude_dirs]
+            for file_name in file_names:
+                if file_name.endswith('.part'):
+                    continue
+                path = os.path.join(directory, file_name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                key = os.path.relpath(path, self.root).replace(os.sep, '/')
+                yield self.uri(key), key, stat.st_size, datetime.fromtimestamp(stat.st_mtime, timezone.utc)
+
+
+class S3AssetStore(LocalAssetStore):
+    """
+    Almacén de assets en S3 o en un servicio compatible (MinIO, R2...).
+
+    Las URIs son `s3://<bucket>/<clave>`, así que cualquier worker con acceso
+    al bucket puede leer los assets de otro. Las subidas por streaming usan
+    multiparte con partes de `part_size` bytes en memoria, sin archivo
+    temporal. ffmpeg necesita archivos locales: `local_path` los descarga una
+    vez a `cache_dir` y reutiliza la copia mientras coincida el tamaño. Las
+    URIs `file://` siguen funcionando como en `LocalAssetStore`.
+
+    Requiere `boto3` (dependencia opcional); las credenciales se leen de la
+    cadena estándar de boto3.
+    """
+    def __init__(self, bucket: Optional[str] = ASSET_S3_BUCKET, prefix: str = ASSET_S3_PREFIX,
+                 endpoint_url: Optional[str] = ASSET_S3_ENDPOINT_URL, region: str = ASSET_S3_REGION,
+                 part_size: int = ASSET_S3_PART_SIZE, cache_dir: str = ASSET_CACHE_DIR):
+        try:
+            import boto3
+            from botocore.config import Config
+        except ImportError:
+            raise ImportError("ASSET_STORE=s3 requiere el paquete boto3, que no está instalado.")
+        if not bucket:
+            raise ValueError("ASSET_STORE=s3 requiere la variable de entorno ASSET_S3_BUCKET.")
+        super().__init__(cache_dir)
+        self.bucket = bucket
+        self.prefix = prefix.strip('/')
+        self.part_size = max(part_size, 5 * 1024 * 1024)  # Mínimo de S3 por parte.
+        self.client = boto3.client(
+            's3', endpoint_url=endpoint_url, region_name=region,
+            config=Config(s3={'addressing_style': 'path'}, retries={'mode': 'standard'})
+        )
+
+    def _key(self, key: str) -> str:
+        return f"{self.prefix}/{key}" if self.prefix else key
+
+    def _split(self, uri: str):
+        parts = urlsplit(uri)
+        return parts.netloc, parts.path.lstrip('/')
+
+    def uri(self, key: str) -> str:
+        return f"s3://{self.bucket}/{self._key(key)}"
+
+    def put_stream(self, key: str, chunks: Iterable[bytes]) -> str:
+        """Sube el contenido por partes a medida que llegan los bloques, sin tocar el disco."""
+        s3_key = self._key(key)
+        buffer = bytearray()
+        upload_id = None
+        parts = []
+        size = 0
+        try:
+            for chunk in chunks:
+                size += len(chunk)
+                buffer += chunk
+                if len(buffer) >= self.part_size:
+                    if upload_id is None:
+                        upload_id = self.client.create_multipart_upload(Bucket=self.bucket, Key=s3_key)['UploadId']
+                    response = self.client.upload_part(Bucket=self.bucket, Key=s3_key, UploadId=upload_id,
+                                                       PartNumber=len(parts) + 1, Body=bytes(buffer))
+                    parts.append({'PartNumber': len(parts) + 1, 'ETag': response['ETag']})
+                    buffer.clear()
+            if upload_id is None:
+                self.client.put_object(Bucket=self.bucket, Key=s3_key, Body=bytes(buffer))
+            else:
+                if buffer:
+                    response = self.client.upload_part(Bucket=self.bucket, Key=s3_key, UploadId=upload_id,
+                                                       PartNumber=len(parts) + 1, Body=bytes(buffer))
+                    parts.append({'PartNumber': len(parts) + 1, 'ETag': response['ETag']})
+                self.client.complete_multipart_upload(Bucket=self.bucket, Key=s3_key, UploadId=upload_id,
+                                                      MultipartUpload={'Parts': parts})
+        except BaseException:
+            if upload_id is not None:
+                self.client.abort_multipart_upload(Bucket=self.bucket, Key=s3_key, UploadId=upload_id)
+            raise
+        record_asset(self.uri(key), key, size)
+        return self.uri(key)
+
+    def put_file(self, key: str, path: str) -> str:
+        self.client.upload_file(path, self.bucket, self._key(key))
+        uri = self.uri(key)
+        record_asset(uri, key, os.path.getsize(path))
+        # El archivo ya es la copia local del asset: ffmpeg no tendrá que volver a descargarlo.
+        cached = self._cache_path(uri)
+        if os.path.abspath(path) != cached:
+            os.makedirs(os.path.dirname(cached), exist_ok=True)
+            shutil.copyfile(path, cached)
+        return uri
+
+    def working_path(self, key: str) -> str:
+        path = self._cache_path(self.uri(key))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        return path
+
+    def _cache_path(self, uri: str) -> str:
+        bucket, s3_key = self._split(uri)
+        return os.path.join(self.root, bucket, *s3_key.split('/'))
+
+    def local_path(self, uri: str) -> str:
+        if not uri.startswith('s3://'):
+            return super().local_path(uri)
+        touch_asset(uri)
+        path = self._cache_path(uri)
+        if os.path.isfile(path) and os.path.getsize(path) == self.size(uri):
+            return path
+        bucket, s3_key = self._split(uri)
+        body = self.client.get_object(Bucket=bucket, Key=s3_key)['Body']
+        _write_chunks(body.iter_chunks(1024 * 1024), path)
+        return path
+
+    def open(self, uri: str) -> BinaryIO:
+        if not uri.startswith('s3://'):
+            return super().open(uri)
+        touch_asset(uri)
+        bucket, s3_key = self._split(uri)
+        return self.client.get_object(Bucket=bucket, Key=s3_key)['Body']
+
+    def size(self, uri: str) -> Optional[int]:
+        if not uri.startswith('s3://'):
+            return super().size(uri)
+        bucket, s3_key = self._split(uri)
+        try:
+            return self.client.head_object(Bucket=bucket, Key=s3_key)['ContentLength']
+        except self.client.exceptions.ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+                return None
+            raise
+
+    def exists(self, uri: str) -> bool:
+        if not uri.startswith('s3://'):
+            return super().exists(uri)
+        return self.size(uri) is not None
+
+    def delete(self, uri: str):
+        if not uri.startswith('s3://'):
+            return super().delete(uri)
+        bucket, s3_key = self._split(uri)
+        self.client.delete_object(Bucket=bucket, Key=s3_key)
+        super().delete(self._cache_path(uri))
+
+
+    def iter_assets(self) -> Iterator[Tuple[str, str, int, datetime]]:
+        paginator = self.client.get_paginator('list_objects_v2')
+        prefix = f"{self.prefix}/" if self.prefix else ''
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=prefix):
+            for item in page.get('Contents', []):
+                key = item['Key'][len(prefix):]
+                yield self.uri(key), key, item['Size'], item.get('LastModified') or datetime.now(timezone.utc)
+
+
+_store = None
+_store_lock = threading.Lock()
+
+def create_asset_store(kind: str = ASSET_STORE):
+    """Crea el almacén configurado: 'local' o 's3'."""
+    if kind == 'local':
+        return LocalAssetStore()
+    if kind == 's3':
+        return S3AssetStore()
+    raise ValueError(f"Almacén de assets desconocido: '{kind}'.")
+
+def get_asset_store():
+    """Retorna el almacén de assets del proceso, creándolo la primera vez."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = create_asset_store()
+        return _store
@@ -1,10 +1,15 @@
 import json
 from typing import Dict, Any, List
-from ..config import OPENAI_API_KEY, NUM_SCENES
+from ..config import OPENAI_API_KEY, NUM_SCENES, SCRIPT_BATCH_CONCURRENCY
 from langchain_openai import ChatOpenAI
 from langchain.prompts import ChatPromptTemplate
 from langchain.schema.output_parser import StrOutputParser
+from langchain_core.runnables import RunnableLambda
 from .schemas import ScriptStructure
+from .metrics import record_tokens, track_call
+from .rate_limiter import call_with_rate_limit
+
+SCRIPT_MODEL = "gpt-4o"
 
 
 # 1. Plantilla para generar la estructura completa del video, incluyendo prompts de imagen y video.
@@ -34,15 +39,43 @@ Para cada una de las {num_scenes} escenas, debes generar:
 Devuelve únicamente un objeto JSON válido que se ajuste a la estructura Pydantic proporcionada. No añadas texto adicional.
 """
 
-def generate_viral_script(idea: str) -> Dict[str, Any]:
-    """Función principal que orquesta la generación del guion completo en una sola llamada a la IA."""
-    print(f"Iniciando generación de guion para la idea: '{idea}'")
+def _build_chain(llm=None):
+    """
+    Construye la cadena prompt -> LLM con salida estructurada -> `ScriptStructure`.
+
+    Cada invocación del LLM (también dentro de `chain.batch`) se mide como una
+    llamada propia en `node_runs`, con sus tokens y su error si falla.
+
+    Args:
+        llm: Modelo de chat a usar. Por defecto, GPT-4o; se puede inyectar un
+            sustituto (ej. `benchmarks.fakes.FakeScriptLLM`) para ejecutar sin red.
+    """
+    if llm is None:
+        # Los reintentos los gestiona el limitador de tasa compartido.
+        llm = ChatOpenAI(model=SCRIPT_MODEL, temperature=0.7, api_key=OPENAI_API_KEY, max_retries=0)
+    # include_raw conserva el mensaje original para leer el consumo de tokens.
+    structured_llm = llm.with_structured_output(ScriptStructure, include_raw=True)
 
-    llm = ChatOpenAI(model="gpt-4o", temperature=0.7, api_key=OPENAI_API_KEY)
-    structured_llm = llm.with_structured_output(ScriptStructure)
+    def tracked_llm(prompt_value) -> ScriptStructure:
+        with track_call('openai', SCRIPT_MODEL):
+            return _parse_output(call_with_rate_limit('openai', SCRIPT_MODEL, structured_llm.invoke, prompt_value))
 
     prompt = ChatPromptTemplate.from_template(script_structure_template)
-    chain = prompt | structured_llm
+    return prompt | RunnableLambda(tracked_llm)
+
+def _parse_output(output: Dict[str, Any]) -> ScriptStructure:
+    """Registra los tokens de la respuesta y devuelve el guion parseado."""
+    usage = getattr(output.get('raw'), 'usage_metadata', None) or {}
+    record_tokens(usage.get('input_tokens', 0), usage.get('output_tokens', 0))
+    if output.get('parsing_error'):
+        raise output['parsing_error']
+    return output['parsed']
+
+def generate_viral_script(idea: str, llm=None) -> Dict[str, Any]:
+    """Función principal que orquesta la generación del guion completo en una sola llamada a la IA."""
+    print(f"Iniciando generación de guion para la idea: '{idea}'")
+
+    chain = _build_chain(llm)
 
     try:
         script_obj = chain.invoke({"idea": idea, "num_scenes": NUM_SCENES})
@@ -55,6 +88,43 @@ def generate_viral_script(idea: str) -> Dict[str, Any]:
         print(f"Error al generar la estructura del guion: {e}")
         return {"error": f"Error en la generación del guion: {e}"}
 
+def generate_viral_scripts(ideas: List[str], llm=None, max_concurrency: int = SCRIPT_BATCH_CONCURRENCY) -> List[Dict[str, Any]]:
+    """
+    Genera los guiones de muchas ideas de una vez con `chain.batch`.
+
+    Comparte una única cadena y lanza hasta `max_concurrency` llamadas en paralelo.
+    Los errores quedan aislados por idea: una idea fallida devuelve
+    `{"error": ...}` en su posición sin afectar a las demás.
+
+    Args:
+        ideas: Lista de textos de ideas.
+        llm: Modelo de chat opcional (ver `_build_chain`).
+        max_concurrency: Número máximo de llamadas simultáneas al LLM.
+
+    Returns:
+        Una lista de guiones en el mismo orden que `ideas`.
+    """
+    if not ideas:
+        return []
+    print(f"Iniciando generación de guiones en lote para {len(ideas)} ideas.")
+
+    chain = _build_chain(llm)
+    inputs = [{"idea": idea, "num_scenes": NUM_SCENES} for idea in ideas]
+    # Cada idea registra su propia llamada (ver `_build_chain`), así que los fallos cuentan por idea.
+    outputs = chain.batch(inputs, config={"max_concurrency": max_concurrency}, return_exceptions=True)
+
+    scripts = []
+    for idea, output in zip(ideas, outputs):
+        if isinstance(output, Exception):
+            print(f"Error al generar el guion para la idea '{idea}': {output}")
+            scripts.append({"error": f"Error en la generación del guion: {output}"})
+        else:
+            scripts.append(output.model_dump())
+
+    generated = sum(1 for script in scripts if 'error' not in script)
+    print(f"Guiones generados en lote: {generated}/{len(ideas)}.")
+    return scripts
+
 if __name__ == '__main__':
     test_idea = "Cleopatra entrando a Roma por primera vez, no como prisionera, sino como conquistadora silenciosa."
     
@@ -0,0 +1,293 @@
+import hashlib
+import re
+import threading
+import unicodedata
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Sequence, Tuple
+import numpy as np
+from ..database.database import get_db
+from ..database.models import Idea, VideoProject
+from ..config import IDEA_EMBEDDER, IDEA_SIMILARITY_THRESHOLD, IDEA_DUPLICATE_ACTION, IDEA_DEDUP_WINDOW_DAYS
+
+# Estados de idea que cuentan como "ya cubiertos" al buscar duplicados.
+COVERED_STATUSES = ('pending', 'processing', 'completed')
+
+# Palabras vacías que se ignoran al comparar ideas ("entrando a Roma" = "entrando en Roma").
+STOPWORDS = frozenset(
+    "a al ante con de del desde e el en entre hacia la las lo los o para por sin sobre su sus un una unos unas y".split()
+)
+
+
+class HashingEmbedder:
+    """
+    Embedder local sin dependencias: proyecta palabras y n-gramas de caracteres
+    del texto normalizado (minúsculas, sin tildes ni palabras vacías) en un
+    vector de `dim` dimensiones con hashing.
+
+    Solo detecta variantes léxicas (tildes, artículos, preposiciones, plurales),
+    no paráfrasis: "Cleopatra llega a Roma" frente a "Cleopatra entrando a Roma"
+    puntúa ~0.58, por debajo de "La caída del Imperio Romano" frente a "El auge
+    del Imperio Romano" (~0.71), así que ningún umbral separa ambos casos.
+    Calibrado: las variantes léxicas de prueba puntúan >= 0.87 y las ideas
+    distintas <= 0.71, de ahí el umbral por defecto.
+    """
+    threshold = 0.8
+
+    def __init__(self, dim: int = 1024, ngram_sizes: Sequence[int] = (3, 4)):
+        self.dim = dim
+        self.ngram_sizes = ngram_sizes
+
+    @staticmethod
+    def _normalize(text: str) -> str:
+        text = unicodedata.normalize('NFKD', text.casefold())
+        text = ''.join(c for c in text if not unicodedata.combining(c))
+        return ' '.join(word for word in re.findall(r'\w+', text) if word not in STOPWORDS)
+
+    def _features(self, text: str) -> List[str]:
+        text = self._normalize(text)
+        features = [f"w:{word}" for word in text.split()]
+        padded = f" {text} "
+        for n in self.ngram_sizes:
+            features.extend(padded[i:i + n] for i in range(len(padded) - n + 1))
+        return features
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature in self._features(text):
+                h = int.from_bytes(hashlib.blake2b(feature.encode('utf-8'), digest_size=8).digest(), 'little')
+                vectors[row, h % self.dim] += 1.0 if h >> 63 else -1.0
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.where(norms == 0, 1.0, norms)
+
+class SentenceTransformerEmbedder:
+    """Embedder semántico local con `sentence-transformers` (dependencia opcional)."""
+    threshold = 0.85
+
+    def __init__(self, model_name: str = "paraphrase-multilingual-MiniLM-L12-v2"):
+        try:
+            from sentence_transformers import SentenceTransformer
+        except ImportError:
+            raise ImportError("IDEA_EMBEDDER usa sentence-transformers, pero el paquete no está instalado.")
+        self.model = SentenceTransformer(model_name)
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        return np.asarray(self.model.encode(list(texts), normalize_embeddings=True), dtype=np.float32)
+
+def create_embedder(spec: str = IDEA_EMBEDDER):
+    """
+    Crea el embedder configurado: 'auto', 'hashing' o 'sentence-transformers[:modelo]'.
+
+    'auto' usa el embedder semántico (el único que reconoce paráfrasis) y
+    recurre a hashing si `sentence-transformers` no está instalado.
+    """
+    name, _, model_name = spec.partition(':')
+    if name == 'auto':
+        try:
+            return SentenceTransformerEmbedder(model_name) if model_name else SentenceTransformerEmbedder()
+        except ImportError:
+            print("Advertencia: sentence-transformers no está instalado; la deduplicación de ideas usa hashing "
+                  "y solo detecta variantes léxicas, no paráfrasis.")
+            return HashingEmbedder()
+    if name == 'hashing':
+        return HashingEmbedder()
+    if name == 'sentence-transformers':
+        return SentenceTransformerEmbedder(model_name) if model_name else SentenceTransformerEmbedder()
+    raise ValueError(f"Embedder desconocido: '{spec}'.")
+
+
+class IdeaIndex:
+    """
+    Índice de embeddings normalizados con búsqueda por similitud coseno
+    (un producto matriz-vector de NumPy sobre todas las entradas).
+
+    Las claves son tuplas ('idea', id) o ('project', id). La matriz crece por
+    duplicación, así que añadir entradas de forma incremental es barato.
+
+    Cada entrada ocupa `dim` float32 (4 KB con hashing, 1.5 KB con MiniLM), y
+    cada búsqueda recorre la matriz entera; con `window_days` solo se indexan
+    las ideas y proyectos de ese periodo y las entradas más antiguas se
+    descartan en cada `refresh`, así que memoria y coste quedan acotados.
+    """
+    def __init__(self, embedder=None, window_days: int = IDEA_DEDUP_WINDOW_DAYS):
+        self.embedder = embedder or create_embedder()
+        self.window = timedelta(days=window_days) if window_days > 0 else None
+        self.keys: List[Tuple[str, int]] = []
+        self._positions: Dict[Tuple[str, int], int] = {}
+        self._created: List[Optional[datetime]] = []
+        self._matrix: Optional[np.ndarray] = None
+        self._lock = threading.Lock()
+        self.last_idea_id = 0
+        self.last_refresh: Optional[datetime] = None
+
+    def __len__(self):
+        return len(self.keys)
+
+    def add(self, keys: List[Tuple[str, int]], texts: List[str], created: Optional[List[Optional[datetime]]] = None):
+        created = created or [None] * len(keys)
+        new = [(key, text, when) for key, text, when in zip(keys, texts, created) if key not in self._positions]
+        if not new:
+            return
+        vectors = self.embedder.embed([text for _, text, _ in new])
+        with self._lock:
+            size = len(self.keys)
+            if self._matrix is None:
+                self._matrix = np.zeros((max(64, len(new)), vectors.shape[1]), dtype=np.float32)
+            if size + len(new) > self._matrix.shape[0]:
+                grown = np.zeros((max(2 * self._matrix.shape[0], size + len(new)), vectors.shape[1]), dtype=np.float32)
+                grown[:size] = self._matrix[:size]
+                self._matrix = grown
+            self._matrix[size:size + len(new)] = vectors
+            for offset, (key, _, when) in enumerate(new):
+                self._positions[key] = size + offset
+                self.keys.append(key)
+                self._created.append(when)
+
+    def prune(self, cutoff: datetime) -> int:
+        """Descarta las entradas creadas antes de `cutoff`; retorna cuántas."""
+        with self._lock:
+            keep = [i for i, when in enumerate(self._created) if when is None or _aware(when) >= cutoff]
+            removed = len(self.keys) - len(keep)
+            if removed:
+                self._matrix = self._matrix[keep].copy() if keep else None
+                self.keys = [self.keys[i] for i in keep]
+                self._created = [self._created[i] for i in keep]
+                self._positions = {key: position for position, key in enumerate(self.keys)}
+        return removed
+
+    def search(self, text: str, k: int = 5, exclude: Optional[Tuple[str, int]] = None) -> List[Tuple[Tuple[str, int], float]]:
+        """Retorna las `k` entradas más parecidas a `text` como [(clave, similitud)]."""
+        with self._lock:
+            if not self.keys:
+                return []
+            matrix = self._matrix[:len(self.keys)]
+            keys = list(self.keys)
+            position = self._positions.get(exclude)
+        scores = matrix @ self.embedder.embed([text])[0]
+        if position is not None:
+            scores[position] = -1.0
+        top = np.argsort(-scores)[:k]
+        return [(keys[i], float(scores[i])) for i in top if scores[i] > -1.0]
+
+    def refresh(self):
+        """
+        Añade las ideas nuevas y los proyectos completados desde la última
+        actualización, y descarta los que han salido de la ventana.
+        """
+        now = datetime.now(timezone.utc)
+        cutoff = now - self.window if self.window else None
+        with get_db() as db:
+            ideas_query = db.query(Idea.id, Idea.text, Idea.created_at).filter(Idea.id > self.last_idea_id)
+            if cutoff is not None:
+                ideas_query = ideas_query.filter(Idea.created_at >= cutoff)
+            ideas = ideas_query.order_by(Idea.id.asc()).all()
+            # Proyectos lanzados sin idea en la tabla (p. ej. `run_pipeline` manual).
+            projects_query = db.query(VideoProject.id, VideoProject.idea_prompt, VideoProject.created_at).filter(
+                VideoProject.status == 'completed', VideoProject.idea_id.is_(None)
+            )
+            if self.last_refresh is not None:
+                projects_query = projects_query.filter(VideoProject.updated_at >= self.last_refresh)
+            if cutoff is not None:
+                projects_query = projects_query.filter(VideoProject.created_at >= cutoff)
+            projects = projects_query.all()
+
+        if ideas:
+            self.add([('idea', row.id) for row in ideas], [row.text for row in ideas], [row.created_at for row in ideas])
+            self.last_idea_id = ideas[-1].id
+        if projects:
+            self.add([('project', row.id) for row in projects], [row.idea_prompt for row in projects],
+                     [row.created_at for row in projects])
+        if cutoff is not None:
+            self.prune(cutoff)
+        self.last_refresh = now
+
+
+def _aware(when: datetime) -> datetime:
+    # SQLite devuelve fechas sin zona; se guardan en UTC.
+    return when if when.tzinfo else when.replace(tzinfo=timezone.utc)
+
+
+_index: Optional[IdeaIndex] = None
+_index_lock = threading.Lock()
+
+def get_idea_index() -> IdeaIndex:
+    """Retorna el índice del proceso, construyéndolo la primera vez."""
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = IdeaIndex()
+        return _index
+
+def find_duplicate(idea: Idea, index: Optional[IdeaIndex] = None,
+                   threshold: Optional[float] = IDEA_SIMILARITY_THRESHOLD) -> Optional[Tuple[Tuple[str, int], float]]:
+    """
+    Busca una idea anterior o un proyecto completado casi idéntico a `idea`.
+
+    Solo cuentan las ideas con un id menor que sigan vivas (pendientes, en
+    proceso o completadas), de modo que entre dos ideas parecidas siempre se
+    genera la más antigua, aunque las reclamen workers distintos a la vez.
+
+    Sin `threshold` se usa el umbral calibrado del embedder del índice.
+
+    Returns:
+        (clave, similitud) del mejor candidato por encima del umbral, o None.
+    """
+    index = index or get_idea_index()
+    if threshold is None:
+        threshold = index.embedder.threshold
+    matches = [
+        (key, score) for key, score in index.search(idea.text, exclude=('idea', idea.id))
+        if score >= threshold and not (key[0] == 'idea' and key[1] > idea.id)
+    ]
+    if not matches:
+        return None
+
+    idea_ids = [key[1] for key, _ in matches if key[0] == 'idea']
+    with get_db() as db:
+        alive = {
+            idea_id for (idea_id,) in
+            db.query(Idea.id).filter(Idea.id.in_(idea_ids), Idea.status.in_(COVERED_STATUSES)).all()
+        } if idea_ids else set()
+    for key, score in matches:
+        if key[0] == 'project' or key[1] in alive:
+            return key, score
+    return None
+
+def filter_duplicate_ideas(ideas: List[Idea], action: str = IDEA_DUPLICATE_ACTION) -> List[Idea]:
+    """
+    Revisa las ideas reclamadas contra el índice antes de gastar presupuesto de generación.
+
+    Con `action='skip'` las duplicadas pasan a estado 'duplicate' y no se
+    devuelven; con 'flag' se marcan (`duplicate_of`, `similarity`) pero se
+    procesan igualmente.
+    """
+    if not ideas:
+        return ideas
+    index = get_idea_index()
+    try:
+        index.refresh()
+    except Exception as e:
+        print(f"Advertencia: no se pudo actualizar el índice de ideas: {e}")
+        return ideas
+
+    kept = []
+    with get_db() as db:
+        for idea in ideas:
+            duplicate = find_duplicate(idea, index)
+            if duplicate is None:
+                kept.append(idea)
+                continue
+
+            (kind, other_id), score = duplicate
+            values = {Idea.similarity: score}
+            if kind == 'idea':
+                values[Idea.duplicate_of] = other_id
+            if action == 'skip':
+                values.update({Idea.status: 'duplicate', Idea.locked_by: None, Idea.lease_expires_at: None})
+                print(f"Idea ID {idea.id} descartada: similitud {score:.2f} con {kind} {other_id}.")
+            else:
+                kept.append(idea)
+                print(f"Advertencia: la idea ID {idea.id} se parece a {kind} {other_id} (similitud {score:.2f}).")
+            db.query(Idea).filter(Idea.id == idea.id).update(values, synchronize_session=False)
+        db.commit()
+    return kept
@@ -0,0 +1,106 @@
+"""
+Carga masiva de ideas desde CSV o JSONL.
+
+Uso:
+    python -m src.logic.idea_ingest ideas.csv
+    python -m src.logic.idea_ingest ideas.jsonl --batch-size 2000
+"""
+import argparse
+import csv
+import json
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List
+from sqlalchemy.dialects import postgresql, sqlite
+from ..database.database import get_db, engine
+from ..database.models import Idea, hash_idea_text
+
+INGEST_BATCH_SIZE = 1000
+
+
+def read_ideas(path: str) -> Iterator[str]:
+    """
+    Lee los textos de las ideas de un archivo, sin cargarlo entero en memoria.
+
+    - CSV: columna `text` si existe; si no, la primera columna.
+    - JSONL: cada línea es un objeto con la clave `text` o directamente un string.
+    """
+    with open(path, newline='', encoding='utf-8') as f:
+        if path.endswith(('.jsonl', '.ndjson')):
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    yield record['text'] if isinstance(record, dict) else record
+            return
+
+        reader = csv.reader(f)
+        header = next(reader, None)
+        if header is None:
+            return
+        if 'text' in header:
+            column = header.index('text')
+        else:
+            column = 0
+            yield header[0]
+        for row in reader:
+            if len(row) > column:
+                yield row[column]
+
+def _insert_statement(rows: List[Dict[str, str]]):
+    """INSERT multi-fila con `ON CONFLICT (text_hash) DO NOTHING` para el dialecto en uso."""
+    dialect = postgresql if engine.dialect.name == 'postgresql' else sqlite
+    return (
+        dialect.insert(Idea)
+        .values(rows)
+        .on_conflict_do_nothing(index_elements=['text_hash'])
+        .returning(Idea.id)
+    )
+
+def ingest_ideas(texts: Iterable[str], batch_size: int = INGEST_BATCH_SIZE) -> Dict[str, int]:
+    """
+    Inserta ideas en lotes y omite las que ya existen (mismo `text_hash`).
+
+    Cada lote es un único INSERT multi-fila; los duplicados, tanto contra la tabla
+    como dentro del propio archivo, se descartan sin error.
+
+    Returns:
+        Un diccionario con el número de ideas `inserted` y `skipped`.
+    """
+    report = {'inserted': 0, 'skipped': 0}
+    texts = iter(texts)
+    with get_db() as db:
+        while True:
+            batch = list(islice(texts, batch_size))
+            if not batch:
+                break
+            rows = {}
+            for text in batch:
+                text = text.strip()
+                if not text:
+                    report['skipped'] += 1
+                    continue
+                text_hash = hash_idea_text(text)
+                if text_hash in rows:
+                    report['skipped'] += 1
+                    continue
+                rows[text_hash] = {'text': text, 'text_hash': text_hash, 'status': 'pending'}
+            if not rows:
+                continue
+
+            inserted = len(db.execute(_insert_statement(list(rows.values()))).all())
+            db.commit()
+            report['inserted'] += inserted
+            report['skipped'] += len(rows) - inserted
+            print(f"Lote procesado: {inserted} ideas nuevas de {len(rows)}.")
+    return report
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path", help="Archivo CSV o JSONL con las ideas.")
+    parser.add_argument("--batch-size", type=int, default=INGEST_BATCH_SIZE, help="Filas por INSERT.")
+    args = parser.parse_args()
+
+    report = ingest_ideas(read_ideas(args.path), batch_size=args.batch_size)
+    print(f"Ideas insertadas: {report['inserted']}. Omitidas (duplicadas o vacías): {report['skipped']}.")
+
+if __name__ == "__main__":
+    main()
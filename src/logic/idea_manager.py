@@ -1,41 +1,280 @@
+import asyncio
+import os
+import socket
+import threading
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import or_, and_, select, update
 from sqlalchemy.orm import Session
 from ..database.models import Idea
-from ..database.database import get_db
-from typing import Optional
+from ..database.database import get_db, get_async_db
+from ..config import CLAIM_BATCH_SIZE, IDEA_LEASE_SECONDS, IDEA_HEARTBEAT_SECONDS, IDEA_DEDUP_ENABLED
+from .content_generator import generate_viral_scripts
+from .idea_dedup import filter_duplicate_ideas
+from typing import Optional, List, Dict, Any
+
+FINAL_STATUSES = ('completed', 'failed', 'duplicate')
+
+
+def default_worker_id() -> str:
+    """Identificador del proceso actual, usado como dueño de los leases."""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+def _claimable_ideas_query(now: datetime, batch_size: int):
+    """SELECT de las ideas reclamables, compartido por las versiones síncrona y asíncrona."""
+    return (
+        select(Idea)
+        .filter(or_(
+            Idea.status == 'pending',
+            and_(Idea.status == 'processing', Idea.lease_expires_at < now)
+        ))
+        .order_by(Idea.created_at.asc())
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+    )
+
+def _lease_ideas(ideas: List[Idea], worker_id: str, now: datetime, lease_seconds: int):
+    for idea in ideas:
+        if idea.status == 'processing':
+            print(f"Idea ID {idea.id} con lease expirado de '{idea.locked_by}'. Reclamándola.")
+        idea.status = 'processing'
+        idea.locked_by = worker_id
+        idea.lease_expires_at = now + timedelta(seconds=lease_seconds)
+
+def _idea_status_values(status: str) -> Dict:
+    values = {Idea.status: status}
+    if status in FINAL_STATUSES:
+        values[Idea.locked_by] = None
+        values[Idea.lease_expires_at] = None
+    return values
+
+def claim_pending_ideas(worker_id: str, batch_size: int = CLAIM_BATCH_SIZE, lease_seconds: int = IDEA_LEASE_SECONDS,
+                        skip_duplicates: bool = IDEA_DEDUP_ENABLED) -> List[Idea]:
+    """
+    Reclama un lote de ideas para un worker usando `FOR UPDATE SKIP LOCKED`.
+
+    Se reclaman las ideas pendientes y también las que quedaron en 'processing'
+    con un lease expirado (por ejemplo, tras la caída de un worker). Las filas
+    bloqueadas por otro worker se saltan en lugar de esperar.
+
+    Args:
+        worker_id: Identificador del worker que toma las ideas.
+        batch_size: Número máximo de ideas a reclamar.
+        lease_seconds: Duración del lease antes de que otro worker pueda reclamarlas.
+        skip_duplicates: Si es True, las ideas casi duplicadas se descartan o se
+            marcan antes de devolverlas (ver `idea_dedup.filter_duplicate_ideas`).
+
+    Returns:
+        La lista de ideas reclamadas (puede estar vacía).
+    """
+    try:
+        with get_db() as db:
+            now = datetime.now(timezone.utc)
+            ideas = db.scalars(_claimable_ideas_query(now, batch_size)).all()
+            _lease_ideas(ideas, worker_id, now, lease_seconds)
+            db.commit()
+
+            for idea in ideas:
+                db.refresh(idea)
+            if ideas:
+                print(f"Worker {worker_id} reclamó las ideas {[idea.id for idea in ideas]}.")
+    except Exception as e:
+        print(f"Error al reclamar ideas pendientes: {e}")
+        return []
+    return filter_duplicate_ideas(ideas) if skip_duplicates else ideas
+
+async def claim_pending_ideas_async(worker_id: str, batch_size: int = CLAIM_BATCH_SIZE, lease_seconds: int = IDEA_LEASE_SECONDS,
+                                    skip_duplicates: bool = IDEA_DEDUP_ENABLED) -> List[Idea]:
+    """Versión asíncrona de `claim_pending_ideas`."""
+    try:
+        async with get_async_db() as db:
+            now = datetime.now(timezone.utc)
+            ideas = (await db.scalars(_claimable_ideas_query(now, batch_size))).all()
+            _lease_ideas(ideas, worker_id, now, lease_seconds)
+            await db.commit()
+            if ideas:
+                print(f"Worker {worker_id} reclamó las ideas {[idea.id for idea in ideas]}.")
+    except Exception as e:
+        print(f"Error al reclamar ideas pendientes: {e}")
+        return []
+    # El índice de similitud es síncrono: se consulta en un hilo para no bloquear el event loop.
+    return await asyncio.to_thread(filter_duplicate_ideas, list(ideas)) if skip_duplicates else list(ideas)
+
+def heartbeat_ideas(idea_ids: List[int], worker_id: str, lease_seconds: int = IDEA_LEASE_SECONDS) -> int:
+    """
+    Renueva el lease de las ideas que el worker sigue procesando.
+
+    Returns:
+        El número de ideas cuyo lease se renovó. Si es menor que `len(idea_ids)`,
+        alguna idea fue reclamada por otro worker o ya terminó.
+    """
+    if not idea_ids:
+        return 0
+    try:
+        with get_db() as db:
+            renewed = (
+                db.query(Idea)
+                .filter(
+                    Idea.id.in_(idea_ids),
+                    Idea.locked_by == worker_id,
+                    Idea.status == 'processing'
+                )
+                .update(
+                    {Idea.lease_expires_at: datetime.now(timezone.utc) + timedelta(seconds=lease_seconds)},
+                    synchronize_session=False
+                )
+            )
+            db.commit()
+            return renewed
+    except Exception as e:
+        print(f"Error al renovar el lease de las ideas {idea_ids}: {e}")
+        return 0
+
+async def heartbeat_ideas_async(idea_ids: List[int], worker_id: str, lease_seconds: int = IDEA_LEASE_SECONDS) -> int:
+    """Versión asíncrona de `heartbeat_ideas`."""
+    if not idea_ids:
+        return 0
+    try:
+        async with get_async_db() as db:
+            result = await db.execute(
+                update(Idea)
+                .where(Idea.id.in_(idea_ids), Idea.locked_by == worker_id, Idea.status == 'processing')
+                .values({Idea.lease_expires_at: datetime.now(timezone.utc) + timedelta(seconds=lease_seconds)})
+            )
+            await db.commit()
+            return result.rowcount
+    except Exception as e:
+        print(f"Error al renovar el lease de las ideas {idea_ids}: {e}")
+        return 0
+
+class IdeaLeaseHeartbeat:
+    """
+    Context manager que renueva en segundo plano el lease de las ideas de un worker.
+
+    Las ideas se liberan con `release` a medida que terminan; el hilo se detiene
+    al salir del bloque.
+    """
+    def __init__(self, worker_id: str, idea_ids: List[int], interval: int = IDEA_HEARTBEAT_SECONDS):
+        self.worker_id = worker_id
+        self.idea_ids = set(idea_ids)
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self.thread = None
+
+    def release(self, idea_id: int):
+        with self._lock:
+            self.idea_ids.discard(idea_id)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            with self._lock:
+                idea_ids = list(self.idea_ids)
+            renewed = heartbeat_ideas(idea_ids, self.worker_id)
+            if renewed < len(idea_ids):
+                print(f"Advertencia: el worker {self.worker_id} solo renovó {renewed}/{len(idea_ids)} leases.")
+
+    def __enter__(self):
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self._stop.set()
+        if self.thread:
+            self.thread.join()
 
 def get_next_pending_idea() -> Optional[Idea]:
     """
     Busca la primera idea pendiente de la base de datos, la marca como 'processing'
     para evitar que otro proceso la tome (bloqueo a nivel de fila), y la devuelve.
 
+    Las ideas casi duplicadas de otra anterior se saltan (o se marcan) según
+    `IDEA_DUPLICATE_ACTION`.
+
     Returns:
         La entidad Idea si se encuentra una pendiente, de lo contrario None.
     """
-    try:
-        with get_db() as db:
-            idea = db.query(Idea).filter(Idea.status == 'pending').order_by(Idea.created_at.asc()).with_for_update().first()
-            
-            if idea:
-                print(f"Idea ID {idea.id} seleccionada. Cambiando estado a 'processing'.")
-                idea.status = 'processing'
-                db.commit()
-                db.refresh(idea)
-                return idea
+    while True:
+        claimed = claim_pending_ideas(default_worker_id(), batch_size=1, skip_duplicates=False)
+        if not claimed:
             return None
-    except Exception as e:
-        print(f"Error al obtener la siguiente idea: {e}")
-        return None
+        ideas = filter_duplicate_ideas(claimed) if IDEA_DEDUP_ENABLED else claimed
+        if ideas:
+            return ideas[0]
+
+async def get_next_pending_idea_async() -> Optional[Idea]:
+    """Versión asíncrona de `get_next_pending_idea`."""
+    while True:
+        claimed = await claim_pending_ideas_async(default_worker_id(), batch_size=1, skip_duplicates=False)
+        if not claimed:
+            return None
+        ideas = await asyncio.to_thread(filter_duplicate_ideas, claimed) if IDEA_DEDUP_ENABLED else claimed
+        if ideas:
+            return ideas[0]
 
 def update_idea_status(idea_id: int, status: str, error_message: str = None):
-    """Actualiza el estado de una idea."""
+    """
+    Actualiza el estado de una idea y libera su lease si el estado es final.
+
+    Se resuelve con un único UPDATE, sin leer antes la fila.
+    """
+    if error_message:
+        print(f"Error en idea {idea_id}: {error_message}")
     try:
         with get_db() as db:
-            idea = db.query(Idea).filter(Idea.id == idea_id).first()
-            if idea:
-                idea.status = status
-                if error_message:
-                    print(f"Error en idea {idea_id}: {error_message}")
-                db.commit()
-                print(f"Idea ID {idea.id} actualizada a estado '{status}'.")
+            updated = db.query(Idea).filter(Idea.id == idea_id).update(_idea_status_values(status), synchronize_session=False)
+            db.commit()
+            if updated:
+                print(f"Idea ID {idea_id} actualizada a estado '{status}'.")
+    except Exception as e:
+        print(f"Error al actualizar el estado de la idea {idea_id}: {e}")
+
+async def update_idea_status_async(idea_id: int, status: str, error_message: str = None):
+    """Versión asíncrona de `update_idea_status`."""
+    if error_message:
+        print(f"Error en idea {idea_id}: {error_message}")
+    try:
+        async with get_async_db() as db:
+            result = await db.execute(update(Idea).where(Idea.id == idea_id).values(_idea_status_values(status)))
+            await db.commit()
+            if result.rowcount:
+                print(f"Idea ID {idea_id} actualizada a estado '{status}'.")
     except Exception as e:
         print(f"Error al actualizar el estado de la idea {idea_id}: {e}")
+
+def pregenerate_scripts(ideas: Optional[List[Idea]] = None, limit: int = 100, llm=None) -> Dict[int, Dict[str, Any]]:
+    """
+    Genera en lote los guiones de las ideas que aún no tienen uno y los guarda en cada idea.
+
+    Args:
+        ideas: Ideas a procesar. Si es None, se toman hasta `limit` ideas pendientes sin guion.
+        limit: Número máximo de ideas pendientes a consultar cuando `ideas` es None.
+        llm: Modelo de chat opcional para `generate_viral_scripts`.
+
+    Returns:
+        Un diccionario {idea_id: guion}. Las ideas fallidas tienen `{"error": ...}`
+        y no se guardan, para que el pipeline lo reintente de forma individual.
+    """
+    try:
+        with get_db() as db:
+            if ideas is None:
+                ideas = (
+                    db.query(Idea)
+                    .filter(Idea.status == 'pending', Idea.script.is_(None))
+                    .order_by(Idea.created_at.asc())
+                    .limit(limit)
+                    .all()
+                )
+            scripts = {idea.id: idea.script for idea in ideas if idea.script}
+            missing = [idea for idea in ideas if not idea.script]
+
+            generated = generate_viral_scripts([idea.text for idea in missing], llm=llm)
+            for idea, script in zip(missing, generated):
+                scripts[idea.id] = script
+                if 'error' not in script:
+                    db.query(Idea).filter(Idea.id == idea.id).update({Idea.script: script}, synchronize_session=False)
+            db.commit()
+            return scripts
+    except Exception as e:
+        print(f"Error al pregenerar los guiones en lote: {e}")
+        return {}
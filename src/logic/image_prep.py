@@ -0,0 +1,92 @@
+import hashlib
+import io
+import os
+import threading
+from typing import Tuple
+from PIL import Image, ImageOps
+from ..config import IMAGE_PREP_ENABLED, IMAGE_PREP_FORMAT, IMAGE_PREP_QUALITY
+from .asset_store import get_asset_store
+
+# Extensión de la variante preparada según el formato de Pillow.
+EXTENSIONS = {'JPEG': 'jpg', 'WEBP': 'webp', 'PNG': 'png'}
+
+_stats = {'images': 0, 'prepared': 0, 'reused': 0, 'original_bytes': 0, 'prepared_bytes': 0}
+_stats_lock = threading.Lock()
+
+
+def _count(**values):
+    with _stats_lock:
+        for name, value in values.items():
+            _stats[name] += value
+
+def _encode(path: str, size: Tuple[int, int], image_format: str, quality: int) -> bytes:
+    """Reduce la imagen para que quepa en `size` (nunca la amplía) y la recodifica."""
+    with Image.open(path) as image:
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail(size, Image.LANCZOS)
+        if image_format == 'JPEG' and image.mode != 'RGB':
+            image = image.convert('RGB')
+        buffer = io.BytesIO()
+        image.save(buffer, format=image_format, quality=quality, optimize=True)
+    return buffer.getvalue()
+
+def prepare_image(image_uri: str, size: Tuple[int, int], image_format: str = IMAGE_PREP_FORMAT,
+                  quality: int = IMAGE_PREP_QUALITY, store=None) -> str:
+    """
+    Prepara la imagen de una escena para subirla a un modelo de video.
+
+    Las imágenes de ideogram llegan como PNG a mayor resolución de la que
+    usa el clip; subirlas tal cual solo alarga la subida de cada predicción.
+    La variante reducida y recodificada se guarda en el almacén junto al
+    original (`images/prepared/...`) con el hash del original en el nombre,
+    así que se reutiliza en los reintentos y nunca queda desfasada. Si la
+    variante no es más pequeña que el original, se usa el original.
+
+    Args:
+        image_uri: URI (o ruta local) de la imagen original.
+        size: Resolución máxima (ancho, alto) del clip.
+        image_format: Formato de Pillow de la variante ('JPEG', 'WEBP' o 'PNG').
+        quality: Calidad de la recodificación (JPEG/WEBP).
+        store: Almacén de assets; por defecto, el del proceso.
+
+    Returns:
+        La ruta local del archivo a subir.
+    """
+    store = store or get_asset_store()
+    original_path = store.local_path(image_uri)
+    original_size = os.path.getsize(original_path)
+    if not IMAGE_PREP_ENABLED:
+        _count(images=1, original_bytes=original_size, prepared_bytes=original_size)
+        return original_path
+
+    with open(original_path, 'rb') as f:
+        digest = hashlib.sha256(f.read()).hexdigest()[:16]
+    stem = os.path.splitext(os.path.basename(original_path))[0]
+    key = f"images/prepared/{stem}_{digest}_{size[0]}x{size[1]}_q{quality}.{EXTENSIONS[image_format]}"
+    uri = store.uri(key)
+
+    if store.exists(uri):
+        _count(reused=1)
+    else:
+        try:
+            data = _encode(original_path, size, image_format, quality)
+        except (OSError, ValueError) as e:
+            print(f"Advertencia: no se pudo preparar la imagen {image_uri}; se sube el original: {e}")
+            _count(images=1, original_bytes=original_size, prepared_bytes=original_size)
+            return original_path
+        if len(data) >= original_size:
+            _count(images=1, original_bytes=original_size, prepared_bytes=original_size)
+            return original_path
+        store.put_stream(key, [data])
+        _count(prepared=1)
+
+    prepared_path = store.local_path(uri)
+    prepared_size = os.path.getsize(prepared_path)
+    _count(images=1, original_bytes=original_size, prepared_bytes=prepared_size)
+    print(f"  \\_ Imagen preparada para el video: {original_size} -> {prepared_size} bytes.")
+    return prepared_path
+
+def stats():
+    """Imágenes procesadas, variantes creadas y reutilizadas, y bytes antes y después."""
+    with _stats_lock:
+        return dict(_stats)
@@ -0,0 +1,183 @@
+import errno
+import mimetypes
+import os
+import re
+import secrets
+import shutil
+import threading
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional, Tuple
+from urllib.parse import quote, unquote
+from ..config import MEDIA_SERVER_HOST, MEDIA_SERVER_PORT, MEDIA_SERVER_DIR, NGROK_PUBLIC_URL
+
+RANGE_PATTERN = re.compile(r'^bytes=(\d*)-(\d*)$')
+# Tokens y nombres de archivo publicados: sin separadores ni '..'.
+TOKEN_PATTERN = re.compile(r'^[A-Za-z0-9_-][A-Za-z0-9_.-]*$')
+
+
+def parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    Interpreta una cabecera `Range` de un solo rango sobre un archivo de `size` bytes.
+
+    Returns:
+        (inicio, fin) inclusivos, o None si el rango no es satisfacible.
+        Los rangos múltiples no se soportan y se tratan como el archivo completo.
+    """
+    match = RANGE_PATTERN.match(header.strip())
+    if not match:
+        return (0, size - 1)
+    start, end = match.groups()
+    if not start:
+        # Sufijo: los últimos N bytes.
+        if not end or int(end) == 0:
+            return None
+        return (max(0, size - int(end)), size - 1)
+    start = int(start)
+    end = min(int(end), size - 1) if end else size - 1
+    if start >= size or start > end:
+        return None
+    return (start, end)
+
+
+class _MediaRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    server: 'MediaServer'
+
+    def do_HEAD(self):
+        self._serve(send_body=False)
+
+    def do_GET(self):
+        self._serve(send_body=True)
+
+    def _serve(self, send_body: bool):
+        path = self.server.resolve(unquote(self.path.split('?')[0]))
+        if path is None or not os.path.isfile(path):
+            self.send_error(404)
+            return
+
+        size = os.path.getsize(path)
+        start, end = 0, size - 1
+        status = 200
+        range_header = self.headers.get('Range')
+        if range_header and size:
+            byte_range = parse_range(range_header, size)
+            if byte_range is None:
+                self.send_response(416)
+                self.send_header('Content-Range', f'bytes */{size}')
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            start, end = byte_range
+            status = 206 if (start, end) != (0, size - 1) else 200
+        length = max(0, end - start + 1)
+
+        self.send_response(status)
+        self.send_header('Content-Type', mimetypes.guess_type(path)[0] or 'application/octet-stream')
+        self.send_header('Content-Length', str(length))
+        self.send_header('Accept-Ranges', 'bytes')
+        self.send_header('Last-Modified', formatdate(os.path.getmtime(path), usegmt=True))
+        if status == 206:
+            self.send_header('Content-Range', f'bytes {start}-{end}/{size}')
+        self.end_headers()
+
+        if send_body and length:
+            with open(path, 'rb') as f:
+                try:
+                    # socket.sendfile usa os.sendfile: los bytes van del page cache al socket sin pasar por Python.
+                    self.connection.sendfile(f, offset=start, count=length)
+                except (BrokenPipeError, ConnectionResetError):
+                    # El cliente cortó la conexión (habitual al pedir rangos); no es un error del servidor.
+                    self.close_connection = True
+
+    def log_message(self, format, *args):
+        pass
+
+
+def publish_file(file_path: str, media_dir: str = MEDIA_SERVER_DIR) -> str:
+    """
+    Añade un archivo a la lista de archivos servibles y retorna su ruta URL (`/<token>/<nombre>`).
+
+    La lista es un directorio de enlaces simbólicos (`<media_dir>/<token>/<nombre>`),
+    así que el servidor la ve aunque el archivo lo publique otro proceso worker.
+    """
+    file_path = os.path.abspath(file_path)
+    if not os.path.isfile(file_path):
+        raise FileNotFoundError(f"No existe el archivo a servir: {file_path}")
+    token = secrets.token_urlsafe(16)
+    filename = re.sub(r'[^A-Za-z0-9_.-]', '_', os.path.basename(file_path)).lstrip('.') or 'media'
+    os.makedirs(os.path.join(media_dir, token))
+    os.symlink(file_path, os.path.join(media_dir, token, filename))
+    return f"/{token}/{filename}"
+
+def unpublish_file(url_path: str, media_dir: str = MEDIA_SERVER_DIR):
+    """Retira un archivo publicado con `publish_file`."""
+    token_dir = os.path.join(media_dir, url_path.strip('/').split('/')[0])
+    shutil.rmtree(token_dir, ignore_errors=True)
+
+def resolve_file(url_path: str, media_dir: str = MEDIA_SERVER_DIR) -> Optional[str]:
+    """Retorna el archivo real de una ruta publicada, o None si no está en la lista."""
+    parts = url_path.strip('/').split('/')
+    if len(parts) != 2 or not all(TOKEN_PATTERN.match(part) for part in parts):
+        return None
+    link = os.path.join(media_dir, *parts)
+    return os.path.realpath(link) if os.path.islink(link) else None
+
+
+class MediaServer(ThreadingHTTPServer):
+    """
+    Servidor HTTP persistente y multihilo para exponer archivos a fetchers externos
+    (p. ej. el de Meta al crear un Reel).
+
+    Solo sirve los archivos publicados con `publish_file`, cada uno bajo un
+    token aleatorio, sin cambiar el directorio de trabajo del proceso. Soporta
+    `Range` y envía los archivos con `sendfile`. Varios publishes (de cualquier
+    proceso) pueden compartirlo a la vez.
+    """
+    daemon_threads = True
+    allow_reuse_address = True
+    request_queue_size = 64
+
+    def __init__(self, host: str = MEDIA_SERVER_HOST, port: int = MEDIA_SERVER_PORT, media_dir: str = MEDIA_SERVER_DIR):
+        super().__init__((host, port), _MediaRequestHandler)
+        self.media_dir = media_dir
+        self.thread: Optional[threading.Thread] = None
+
+    def resolve(self, url_path: str) -> Optional[str]:
+        return resolve_file(url_path, self.media_dir)
+
+    def start(self) -> 'MediaServer':
+        self.thread = threading.Thread(target=self.serve_forever, name="media-server", daemon=True)
+        self.thread.start()
+        print(f"Servidor de medios escuchando en el puerto {self.server_address[1]}.")
+        return self
+
+
+_server: Optional[MediaServer] = None
+_server_lock = threading.Lock()
+
+def start_media_server() -> Optional[MediaServer]:
+    """
+    Arranca el servidor de medios del proceso si aún no está en marcha.
+
+    Si el puerto ya está ocupado se asume que otro proceso (p. ej. el proceso
+    principal del pool de workers) lo está sirviendo y se retorna None.
+    """
+    global _server
+    with _server_lock:
+        if _server is None:
+            os.makedirs(MEDIA_SERVER_DIR, exist_ok=True)
+            try:
+                _server = MediaServer().start()
+            except OSError as e:
+                if e.errno != errno.EADDRINUSE:
+                    raise
+                print(f"El puerto {MEDIA_SERVER_PORT} ya está en uso; se usará el servidor de medios existente.")
+                return None
+        return _server
+
+def public_url(url_path: str, base_url: Optional[str] = NGROK_PUBLIC_URL) -> str:
+    """URL pública (a través de NGROK_PUBLIC_URL) de una ruta publicada."""
+    if not base_url:
+        raise ValueError("La variable de entorno NGROK_PUBLIC_URL no está configurada.")
+    return base_url.rstrip('/') + quote(url_path)
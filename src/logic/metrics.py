@@ -0,0 +1,304 @@
+import contextvars
+import functools
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Tuple
+from ..config import METRICS_PORT
+
+# Precios aproximados en USD, solo para estimar costes; la fuente de verdad es la facturación.
+REPLICATE_COST_PER_PREDICTION = {
+    "ideogram-ai/ideogram-v3-turbo": 0.03,
+    "bytedance/seedance-1-pro": 0.15,
+    "zsxkib/mmaudio": 0.01,
+}
+# (entrada, salida) por millón de tokens.
+OPENAI_COST_PER_MILLION_TOKENS = {
+    "gpt-4o": (2.50, 10.00),
+}
+
+_node_stats = contextvars.ContextVar("node_stats", default=None)
+_call_stats = contextvars.ContextVar("call_stats", default=None)
+
+
+class RunStats:
+    """Acumulador de métricas de un nodo del grafo o de una llamada a un proveedor."""
+    def __init__(self, kind: str, node: Optional[str], provider: Optional[str] = None,
+                 model: Optional[str] = None, project_id: Optional[int] = None):
+        self.kind = kind
+        self.node = node
+        self.provider = provider
+        self.model = model
+        self.project_id = project_id
+        self.retries = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.bytes_downloaded = 0
+        self._lock = threading.Lock()
+
+    def add(self, retries: int = 0, input_tokens: int = 0, output_tokens: int = 0, bytes_downloaded: int = 0):
+        # Los hilos de las escenas comparten el acumulador del nodo.
+        with self._lock:
+            self.retries += retries
+            self.input_tokens += input_tokens
+            self.output_tokens += output_tokens
+            self.bytes_downloaded += bytes_downloaded
+
+    def cost_estimate(self) -> float:
+        if self.provider == 'replicate':
+            return REPLICATE_COST_PER_PREDICTION.get((self.model or '').split(':')[0], 0.0)
+        if self.provider == 'openai':
+            input_price, output_price = OPENAI_COST_PER_MILLION_TOKENS.get(self.model, (0.0, 0.0))
+            return (self.input_tokens * input_price + self.output_tokens * output_price) / 1_000_000
+        return 0.0
+
+def _save(stats: RunStats, status: str, duration_ms: float, error_message: Optional[str] = None):
+    """Guarda una fila en `node_runs`. Un fallo de métricas nunca interrumpe el pipeline."""
+    from ..database.database import get_db
+    from ..database.models import NodeRun
+    try:
+        with get_db() as db:
+            db.add(NodeRun(
+                project_id=stats.project_id,
+                kind=stats.kind,
+                node=stats.node,
+                provider=stats.provider,
+                model=stats.model,
+                status=status,
+                duration_ms=duration_ms,
+                retries=stats.retries,
+                input_tokens=stats.input_tokens,
+                output_tokens=stats.output_tokens,
+                bytes_downloaded=stats.bytes_downloaded,
+                cost_estimate=stats.cost_estimate() if status == 'ok' else 0.0,
+                error_message=error_message
+            ))
+            db.commit()
+    except Exception as e:
+        print(f"Advertencia: no se pudieron guardar las métricas de '{stats.node}': {e}")
+
+def _current_stats() -> Optional[RunStats]:
+    return _call_stats.get() or _node_stats.get()
+
+def record_tokens(input_tokens: int, output_tokens: int):
+    """Suma tokens de LLM a la llamada en curso."""
+    stats = _current_stats()
+    if stats:
+        stats.add(input_tokens=input_tokens, output_tokens=output_tokens)
+
+def record_bytes(num_bytes: int):
+    """Suma bytes descargados al nodo en curso (y a la llamada, si la hay)."""
+    for stats in {_node_stats.get(), _call_stats.get()} - {None}:
+        stats.add(bytes_downloaded=num_bytes)
+
+def record_retry():
+    """Cuenta un reintento en la llamada o el nodo en curso."""
+    stats = _current_stats()
+    if stats:
+        stats.add(retries=1)
+
+def instrument_node(node_name: str) -> Callable:
+    """
+    Decorador para los nodos del grafo: mide su duración y guarda una fila en
+    `node_runs` con el resultado y lo acumulado por las llamadas internas.
+    """
+    def decorator(node_fn: Callable) -> Callable:
+        @functools.wraps(node_fn)
+        def wrapper(state):
+            previous_error = state.get('error')
+            stats = RunStats('node', node_name, project_id=state.get('project_id'))
+            token = _node_stats.set(stats)
+            start = time.perf_counter()
+            try:
+                result = node_fn(state)
+            finally:
+                _node_stats.reset(token)
+            duration_ms = (time.perf_counter() - start) * 1000
+
+            stats.project_id = result.get('project_id') or stats.project_id
+            error = result.get('error')
+            failed = bool(error) and error != previous_error
+            _save(stats, 'error' if failed else 'ok', duration_ms, error if failed else None)
+            return result
+        return wrapper
+    return decorator
+
+@contextmanager
+def track_call(provider: str, model: str):
+    """
+    Mide una llamada a un proveedor externo (Replicate, OpenAI) y la guarda en
+    `node_runs`, asociada al nodo y proyecto en curso.
+    """
+    node_stats = _node_stats.get()
+    stats = RunStats(
+        'call',
+        node_stats.node if node_stats else None,
+        provider=provider,
+        model=model,
+        project_id=node_stats.project_id if node_stats else None
+    )
+    token = _call_stats.set(stats)
+    start = time.perf_counter()
+    try:
+        yield stats
+    except Exception as e:
+        _call_stats.reset(token)
+        _save(stats, 'error', (time.perf_counter() - start) * 1000, str(e))
+        raise
+    _call_stats.reset(token)
+    _save(stats, 'ok', (time.perf_counter() - start) * 1000)
+
+def submit_in_context(executor, fn: Callable, *args, **kwargs):
+    """`executor.submit` que conserva el contexto de métricas (nodo y proyecto) en el hilo."""
+    return executor.submit(contextvars.copy_context().run, fn, *args, **kwargs)
+
+
+# --- Endpoint de Prometheus ---
+
+def _escape(value) -> str:
+    return str(value if value is not None else '').replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _labels(**labels) -> str:
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + '}'
+
+class _RunTotals:
+    """
+    Totales acumulados de `node_runs` por serie (kind, node, provider, model, status).
+
+    Cada `refresh` agrega solo las filas nuevas, por id (clave primaria), y
+    las suma a lo acumulado, así que un scrape cuesta lo que haya crecido la
+    tabla desde el anterior y no un GROUP BY completo. Las filas se incorporan
+    un scrape más tarde (hasta el id máximo visto en el anterior) para no
+    saltarse las de transacciones que aún no habían hecho commit.
+    """
+    def __init__(self):
+        self.totals: Dict[Tuple, List[float]] = {}
+        self.last_id = 0
+        self.seen_max_id: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def refresh(self) -> List[Tuple]:
+        from sqlalchemy import func
+        from ..database.database import get_db
+        from ..database.models import NodeRun
+
+        with self._lock:
+            with get_db() as db:
+                max_id = db.query(func.max(NodeRun.id)).scalar() or 0
+                upto = max_id if self.seen_max_id is None else self.seen_max_id
+                if upto > self.last_id:
+                    rows = (
+                        db.query(
+                            NodeRun.kind, NodeRun.node, NodeRun.provider, NodeRun.model, NodeRun.status,
+                            func.count(NodeRun.id), func.sum(NodeRun.duration_ms), func.sum(NodeRun.retries),
+                            func.sum(NodeRun.input_tokens), func.sum(NodeRun.output_tokens),
+                            func.sum(NodeRun.bytes_downloaded), func.sum(NodeRun.cost_estimate)
+                        )
+                        .filter(NodeRun.id > self.last_id, NodeRun.id <= upto)
+                        .group_by(NodeRun.kind, NodeRun.node, NodeRun.provider, NodeRun.model, NodeRun.status)
+                        .all()
+                    )
+                    for row in rows:
+                        totals = self.totals.setdefault(tuple(row[:5]), [0] * 7)
+                        for i, value in enumerate(row[5:]):
+                            totals[i] += value or 0
+                    self.last_id = upto
+            self.seen_max_id = max_id
+            return [key + tuple(values) for key, values in self.totals.items()]
+
+_run_totals = _RunTotals()
+
+# Los assets son un gauge del estado actual (la tabla la acota el GC); basta con recalcularlo cada poco.
+ASSET_USAGE_TTL_SECONDS = 60
+_asset_usage_cache: Tuple[float, Dict[str, Dict[str, int]]] = (0.0, {})
+
+def _cached_asset_usage() -> Dict[str, Dict[str, int]]:
+    global _asset_usage_cache
+    from .asset_index import asset_usage
+    fetched_at, usage = _asset_usage_cache
+    if not fetched_at or time.monotonic() - fetched_at >= ASSET_USAGE_TTL_SECONDS:
+        usage = asset_usage()
+        _asset_usage_cache = (time.monotonic(), usage)
+    return usage
+
+def render_prometheus() -> str:
+    """
+    Genera las métricas en formato de texto de Prometheus a partir de `node_runs`.
+
+    Se agregan desde la base de datos, así que reflejan a todos los workers;
+    ver `_RunTotals` para el coste de cada scrape.
+    """
+    rows = _run_totals.refresh()
+
+    metrics = {
+        "content_creator_node_runs_total": ("counter", "Ejecuciones de nodos del grafo.", []),
+        "content_creator_node_duration_seconds_sum": ("counter", "Tiempo total en cada nodo del grafo.", []),
+        "content_creator_node_downloaded_bytes_total": ("counter", "Bytes descargados por nodo.", []),
+        "content_creator_provider_calls_total": ("counter", "Llamadas a proveedores externos.", []),
+        "content_creator_provider_call_duration_seconds_sum": ("counter", "Tiempo total en llamadas a proveedores.", []),
+        "content_creator_provider_retries_total": ("counter", "Reintentos de llamadas a proveedores.", []),
+        "content_creator_llm_tokens_total": ("counter", "Tokens consumidos por el LLM.", []),
+        "content_creator_cost_estimate_usd_total": ("counter", "Coste estimado en USD.", []),
+    }
+    tokens = {}
+    for kind, node, provider, model, status, count, duration_ms, retries, input_tokens, output_tokens, num_bytes, cost in rows:
+        if kind == 'node':
+            labels = _labels(node=node, status=status)
+            metrics["content_creator_node_runs_total"][2].append((labels, count))
+            metrics["content_creator_node_duration_seconds_sum"][2].append((labels, (duration_ms or 0) / 1000))
+            metrics["content_creator_node_downloaded_bytes_total"][2].append((labels, num_bytes or 0))
+            continue
+        labels = _labels(node=node, provider=provider, model=model, status=status)
+        metrics["content_creator_provider_calls_total"][2].append((labels, count))
+        metrics["content_creator_provider_call_duration_seconds_sum"][2].append((labels, (duration_ms or 0) / 1000))
+        metrics["content_creator_provider_retries_total"][2].append((labels, retries or 0))
+        metrics["content_creator_cost_estimate_usd_total"][2].append((labels, cost or 0.0))
+        if provider == 'openai':
+            tokens[(model, "input")] = tokens.get((model, "input"), 0) + (input_tokens or 0)
+            tokens[(model, "output")] = tokens.get((model, "output"), 0) + (output_tokens or 0)
+    # Los tokens se agregan sin `status` para no duplicar series.
+    for (model, direction), value in tokens.items():
+        metrics["content_creator_llm_tokens_total"][2].append((_labels(model=model, direction=direction), value))
+
+    metrics["content_creator_assets"] = ("gauge", "Assets en el almacén, por tipo.", [])
+    metrics["content_creator_asset_bytes"] = ("gauge", "Bytes ocupados por los assets, por tipo.", [])
+    for kind, usage in _cached_asset_usage().items():
+        metrics["content_creator_assets"][2].append((_labels(kind=kind), usage['count']))
+        metrics["content_creator_asset_bytes"][2].append((_labels(kind=kind), usage['bytes']))
+
+    lines = []
+    for name, (metric_type, help_text, samples) in metrics.items():
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {metric_type}")
+        lines.extend(f"{name}{labels} {value}" for labels, value in samples)
+    return '\n'.join(lines) + '\n'
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+        try:
+            body = render_prometheus().encode('utf-8')
+        except Exception as e:
+            self.send_error(500, str(e))
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def start_metrics_server(port: int = METRICS_PORT) -> Optional[ThreadingHTTPServer]:
+    """Arranca en segundo plano el endpoint `/metrics` para Prometheus (port=0 lo desactiva)."""
+    if not port:
+        return None
+    server = ThreadingHTTPServer(("", port), _MetricsHandler)
+    thread = threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True)
+    thread.start()
+    print(f"Endpoint de métricas disponible en http://0.0.0.0:{port}/metrics")
+    return server
@@ -1,169 +1,87 @@
 import os
-from pathlib import Path
-from typing import List, Dict, Optional
+from typing import Dict, Optional, Tuple
 import requests
 from openai import OpenAI
-from ..config import OPENAI_API_KEY
-import replicate
-from .video_editor import generate_videos_from_images
+from ..config import OPENAI_API_KEY, AUDIO_MODE
+from .video_editor import generate_video_for_image
+from .replicate_cache import run_cached
+from .prediction_manager import run_model
 
-# --- Configuración de Directorios ---
-ASSETS_DIR = Path(__file__).parent.parent / "assets"
-IMAGES_DIR = ASSETS_DIR / "images"
-AUDIO_DIR = ASSETS_DIR / "audio"
+IMAGE_MODEL = "ideogram-ai/ideogram-v3-turbo"
 
-# Crear directorios si no existen
-IMAGES_DIR.mkdir(parents=True, exist_ok=True)
-AUDIO_DIR.mkdir(parents=True, exist_ok=True)
-
-
-def _download_image(url: str, save_path: Path):
-    """Descarga una imagen desde una URL y la guarda localmente."""
-    try:
-        response = requests.get(url, stream=True)
-        response.raise_for_status()
-        with open(save_path, 'wb') as f:
-            for chunk in response.iter_content(chunk_size=8192):
-                f.write(chunk)
-        print(f"Imagen descargada y guardada en: {save_path}")
-    except requests.exceptions.RequestException as e:
-        print(f"Error al descargar la imagen desde {url}: {e}")
-        raise
-
-def generate_scene_images(scenes: List[Dict[str, str]], project_id: str) -> List[str]:
+def _generate_scene_image(index: int, total: int, prompt: str, project_id: str, attempt: int = 1) -> str:
     """
-    Genera una imagen para cada escena utilizando Replicate (ideogram-v3-turbo).
+    Genera y descarga la imagen de una única escena.
 
     Args:
-        scenes: Una lista de diccionarios, donde cada uno contiene el 'image_prompt'.
+        index: Posición de la escena (base 0) dentro del guion.
+        total: Número total de escenas, usado solo para los mensajes de progreso.
+        prompt: El prompt de imagen de la escena.
         project_id: Un identificador único para nombrar los archivos.
+        attempt: Intento de la escena; cada reintento pide una salida nueva en lugar de la cacheada.
 
     Returns:
-        Una lista de rutas a las imágenes generadas.
+        La URI de la imagen generada en el almacén de assets.
     """
-    image_paths = []
-    if not scenes:
-        print("Advertencia: No hay escenas para generar imágenes.")
-        return image_paths
+    asset_key = f"images/{project_id}_scene_{index+1}.png"
 
-    for i, scene in enumerate(scenes):
-        prompt = scene.get('image_prompt')
-        if not prompt:
-            print(f"Advertencia: La escena {i+1} no tiene un prompt de imagen.")
-            continue
+    print(f"Generando imagen para la escena {index+1}/{total}")
+    print(f"  \_ Con prompt de imagen: '{prompt}'")
+    input_data = {
+        "prompt": prompt,
+        "aspect_ratio": "9:16"
+    }
 
-        file_name = f"{project_id}_scene_{i+1}.png"
-        image_path = IMAGES_DIR / file_name
+    def produce():
+        output_list = run_model(IMAGE_MODEL, input_data)
 
-        print(f"Generando imagen para la escena {i+1}/{len(scenes)}")
-        print(f"  \_ Con prompt de imagen: '{prompt}'")
-        try:
-            input_data = {
-                "prompt": prompt,
-                "aspect_ratio": "9:16"
-            }
-
-            output_list = replicate.run(
-                "ideogram-ai/ideogram-v3-turbo",
-                input=input_data
-            )
-
-            if output_list and isinstance(output_list, list):
-                file_output_object = output_list[0]
-                image_url = file_output_object.url
-            else:
-                image_url = output_list.url
-
-            # # ----------------
-            # image_url = "src/assets/images/79_a265a246_scene_1.png"
-            # image_paths.append(str(image_url))
-            # # ----------------
-
-            if not image_url or not isinstance(image_url, str):
-                raise ValueError("La salida de la API no es una URL válida.")
-
-            if not image_url.startswith('https'):
-                raise ValueError(f"La URL procesada no es válida: '{image_url}'")
-    
-            _download_image(image_url, image_path)    
-            image_paths.append(str(image_path))
+        if output_list and isinstance(output_list, list):
+            file_output_object = output_list[0]
+            image_url = file_output_object.url
+        else:
+            image_url = output_list.url
 
-        except Exception as e:
-            print(f"Error al generar la imagen para la escena {i+1}: {e}")
-            continue
+        if not image_url or not isinstance(image_url, str):
+            raise ValueError("La salida de la API no es una URL válida.")
 
-    return image_paths
+        if not image_url.startswith('https'):
+            raise ValueError(f"La URL procesada no es válida: '{image_url}'")
 
-def generate_multimedia_for_idea(script_data: Dict, project_id: str) -> Dict[str, List[str]]:
-    """
-    Orquesta la generación de todo el contenido multimedia para una idea.
+        return image_url
 
-    Primero genera las imágenes para cada escena, y luego genera un video
-    corto para cada una de esas imágenes usando su prompt de video correspondiente.
+    try:
+        image_uri = run_cached(IMAGE_MODEL, input_data, asset_key, produce, attempt=attempt)
+    except (requests.exceptions.RequestException, IOError) as e:
+        print(f"Error al descargar la imagen de la escena {index+1}: {e}")
+        raise
+    print(f"Imagen guardada en: {image_uri}")
+    return image_uri
 
-    Args:
-        script_data: El diccionario completo del guion, incluyendo la lista de escenas.
-        project_id: El ID único del proyecto.
+def generate_scene_assets(index: int, total: int, scene: Dict[str, str], project_id: str, audio_prompt: str,
+                          attempt: int = 1) -> Tuple[str, str]:
+    """
+    Cadena completa de una escena: imagen -> clip de seedance -> audio de mmaudio
+    (este último solo si se pasa `audio_prompt`). Con `attempt` > 1 ninguna
+    etapa reutiliza la salida cacheada de un intento anterior.
 
     Returns:
-        Un diccionario con las rutas a los archivos generados ('images' y 'videos').
+        Una tupla (URI de la imagen, URI del video) de la escena.
     """
-    multimedia_paths = {
-        "images": [],
-        "videos": [],
-        "audio": None
-    }
-    scenes = script_data.get('scenes', [])
-    if not scenes:
-        print("El guion no contiene escenas. No se puede generar multimedia.")
-        return multimedia_paths
+    prompt = scene.get('image_prompt')
+    if not prompt:
+        raise ValueError(f"La escena {index+1} no tiene un prompt de imagen.")
 
-    # 2. Generar imágenes
-    image_paths = generate_scene_images(scenes, project_id)
-    if not image_paths:
-        print("No se generaron imágenes. Deteniendo el proceso de generación de video.")
-        return multimedia_paths
-    
-    multimedia_paths["images"] = image_paths
-
-    video_prompts = [scene.get('video_prompt', '') for scene in scenes]
-    audio_prompt = script_data.get('audio_prompt', '')
-    video_paths = generate_videos_from_images(project_id, image_paths, video_prompts, audio_prompt)
-    multimedia_paths["videos"] = video_paths
-
-    return multimedia_paths
+    image_path = _generate_scene_image(index, total, prompt, project_id, attempt)
+    video_path = generate_video_for_image(project_id, index, image_path, scene.get('video_prompt', ''), audio_prompt, attempt)
+    return image_path, video_path
 
 
 # --- Ejemplo de Uso (para pruebas) ---
 if __name__ == '__main__':
-    # Simular datos de un guion generado
+    # Genera un guion de prueba y recorre cada escena como lo hace el grafo (imagen -> video).
+    from .content_generator import generate_viral_script
     test_project_id = "cleopatra_test_01"
-    test_audio_prompt = "Viento del desierto, arena, atmósfera misteriosa y antigua, con un toque de majestuosidad."
-    test_scenes_data = [
-        {
-            'scene_description': 'Cleopatra en un carro dorado',
-            'image_prompt': 'Photorealistic, 4K, cinematic shot of Cleopatra on a majestic golden chariot entering ancient Rome. The streets are filled with cheering crowds. Majestic Roman architecture is visible. Golden hour light. Cleopatra looks proud and defiant. Epic composition.'
-        },
-        {
-            'scene_description': 'Cleopatra observando el Senado Romano',
-            'image_prompt': 'Ultra-realistic, 4K, cinematic still of Cleopatra standing on a balcony, looking down at the Roman Senate. She is draped in royal blue and gold. Her expression is a mix of curiosity and strategic calculation. The lighting is dramatic, with long shadows. Focus on her intense gaze.'
-        }
-    ]
-
     print("--- INICIANDO PRUEBA DE GENERACIÓN DE MULTIMEDIA ---")
-    
-    # 1. Probar generación de audio
-    # 1. Probar generación de audio (actualmente es un placeholder)
-    audio_file = generate_ambient_sound(test_audio_prompt, test_project_id)
-    if audio_file:
-        print(f"\nPrueba de audio exitosa. Archivo: {audio_file}")
-    else:
-        print("\nPrueba de audio fallida.")
-
-    # 2. Probar el flujo completo de generación de multimedia (imágenes y videos)
-    # Primero, necesitamos un guion completo que incluya los video_prompts
-    from .content_generator import generate_viral_script
-    print("\n--- Generando Guion Completo para la Prueba ---")
     test_idea = "Cleopatra entrando a Roma por primera vez, no como prisionera, sino como conquistadora silenciosa."
     full_script_data = generate_viral_script(test_idea)
 
@@ -171,21 +89,12 @@ if __name__ == '__main__':
         print(f"Error al generar el guion de prueba: {full_script_data['error']}")
         exit()
 
-    print("--- Guion de Prueba Generado ---")
-    # print(json.dumps(full_script_data, indent=2, ensure_ascii=False))
-
-    multimedia_results = generate_multimedia_for_idea(full_script_data, test_project_id)
+    scenes = full_script_data['scenes']
+    audio_prompt = full_script_data.get('audio_prompt', '') if AUDIO_MODE == 'per_scene' else None
     print("\n--- Resultados de la Generación de Multimedia ---")
-    if multimedia_results["images"]:
-        print(f"{len(multimedia_results['images'])} imágenes generadas:")
-        for f in multimedia_results['images']:
-            print(f"- {f}")
-    else:
-        print("Fallo en la generación de imágenes.")
-
-    if multimedia_results["videos"]:
-        print(f"\n{len(multimedia_results['videos'])} videos generados:")
-        for f in multimedia_results['videos']:
-            print(f"- {f}")
-    else:
-        print("\nFallo en la generación de videos.")
+    for i, scene in enumerate(scenes):
+        try:
+            image_path, video_path = generate_scene_assets(i, len(scenes), scene, test_project_id, audio_prompt)
+            print(f"Escena {i+1}: imagen {image_path}, video {video_path}")
+        except Exception as e:
+            print(f"Fallo en la escena {i+1}: {e}")
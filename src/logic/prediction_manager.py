@@ -0,0 +1,161 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from typing import Any, Dict, Optional
+import replicate
+from replicate.exceptions import ModelError
+from replicate.helpers import transform_output
+from .metrics import track_call
+from .rate_limiter import call_with_rate_limit
+from ..config import (
+    REPLICATE_API_TOKEN, REPLICATE_BASE_URL, REPLICATE_ASYNC_PREDICTIONS,
+    REPLICATE_POLL_INTERVAL, REPLICATE_PREDICTION_TIMEOUT
+)
+
+TERMINAL_STATUSES = ('succeeded', 'failed', 'canceled')
+
+
+class PredictionManager:
+    """
+    Gestiona muchas predicciones de Replicate en vuelo desde un único hilo de sondeo.
+
+    `submit` crea la predicción con la API predictions.create (sin bloquear) y
+    devuelve un `Future`. Un solo hilo consulta el estado de todas las
+    predicciones pendientes en cada ciclo y resuelve cada `Future` en cuanto su
+    predicción termina, de modo que el coste de tener decenas de trabajos de
+    seedance/mmaudio en vuelo es un único hilo en lugar de uno por predicción.
+
+    Args:
+        client: Cliente de Replicate. Por defecto usa `REPLICATE_BASE_URL`, lo que
+            permite apuntar a un servidor falso local.
+        poll_interval: Segundos entre ciclos de sondeo.
+    """
+    def __init__(self, client: Optional[replicate.Client] = None, poll_interval: float = REPLICATE_POLL_INTERVAL):
+        self.client = client or replicate.Client(api_token=REPLICATE_API_TOKEN, base_url=REPLICATE_BASE_URL)
+        self.poll_interval = poll_interval
+        self._pending: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = False
+        self._thread = threading.Thread(target=self._poll_loop, name="replicate-poller", daemon=True)
+        self._thread.start()
+
+    def _create(self, model: str, input: Dict[str, Any]):
+        if ':' in model:
+            _, version_id = model.split(':', 1)
+            return self.client.predictions.create(version=version_id, input=input)
+        owner, name = model.split('/', 1)
+        return self.client.models.predictions.create(model=(owner, name), input=input)
+
+    def submit(self, model: str, input: Dict[str, Any]) -> Future:
+        """
+        Crea una predicción y devuelve un `Future` que se resuelve con su salida.
+
+        Los archivos de `input` se suben durante esta llamada, así que pueden
+        cerrarse en cuanto retorna.
+        """
+        prediction = self._create(model, input)
+        future = Future()
+        future.prediction_id = prediction.id
+        with self._lock:
+            if self._stopped:
+                raise RuntimeError("El PredictionManager está detenido.")
+            self._pending[prediction.id] = future
+        self._wakeup.set()
+        return future
+
+    async def submit_async(self, model: str, input: Dict[str, Any]) -> Any:
+        """Versión awaitable de `submit` para código asyncio."""
+        loop = asyncio.get_running_loop()
+        future = await loop.run_in_executor(None, self.submit, model, input)
+        return await asyncio.wrap_future(future)
+
+    def run(self, model: str, input: Dict[str, Any], timeout: Optional[float] = REPLICATE_PREDICTION_TIMEOUT) -> Any:
+        """Equivalente bloqueante de `replicate.run` que comparte el hilo de sondeo."""
+        future = self.submit(model, input)
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeoutError:
+            self.cancel(future.prediction_id)
+            raise TimeoutError(f"La predicción {future.prediction_id} de '{model}' superó {timeout}s.")
+
+    def cancel(self, prediction_id: str):
+        """Cancela una predicción en Replicate y deja de sondearla."""
+        with self._lock:
+            future = self._pending.pop(prediction_id, None)
+        try:
+            self.client.predictions.cancel(prediction_id)
+        except Exception as e:
+            print(f"Advertencia: no se pudo cancelar la predicción {prediction_id}: {e}")
+        if future and not future.done():
+            future.cancel()
+
+    def _resolve(self, prediction, future: Future):
+        if prediction.status == 'succeeded':
+            future.set_result(transform_output(prediction.output, self.client))
+        elif prediction.status == 'failed':
+            future.set_exception(ModelError(prediction))
+        else:
+            future.cancel()
+
+    def _poll_loop(self):
+        while True:
+            with self._lock:
+                if self._stopped:
+                    return
+                pending = list(self._pending.items())
+            if not pending:
+                self._wakeup.wait()
+                self._wakeup.clear()
+                continue
+
+            for prediction_id, future in pending:
+                try:
+                    prediction = self.client.predictions.get(prediction_id)
+                except Exception as e:
+                    # Error transitorio de red: se reintenta en el siguiente ciclo.
+                    print(f"Advertencia: no se pudo consultar la predicción {prediction_id}: {e}")
+                    continue
+                if prediction.status in TERMINAL_STATUSES:
+                    with self._lock:
+                        self._pending.pop(prediction_id, None)
+                    self._resolve(prediction, future)
+
+            time.sleep(self.poll_interval)
+
+    def shutdown(self):
+        """Detiene el hilo de sondeo; las predicciones pendientes quedan canceladas localmente."""
+        with self._lock:
+            self._stopped = True
+            pending = list(self._pending.values())
+            self._pending.clear()
+        self._wakeup.set()
+        for future in pending:
+            future.cancel()
+
+
+_manager = None
+_manager_lock = threading.Lock()
+
+def get_manager() -> PredictionManager:
+    """Retorna el PredictionManager del proceso, creándolo la primera vez."""
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = PredictionManager()
+        return _manager
+
+def run_model(model: str, input: Dict[str, Any]) -> Any:
+    """
+    Ejecuta un modelo de Replicate y espera su salida.
+
+    Con `REPLICATE_ASYNC_PREDICTIONS` activo, la predicción se sondea junto con
+    el resto desde el PredictionManager; si no, se usa `replicate.run`. La
+    llamada pasa por el limitador de tasa compartido, que reintenta los 429 y
+    los errores transitorios.
+    """
+    with track_call('replicate', model):
+        if REPLICATE_ASYNC_PREDICTIONS:
+            return call_with_rate_limit('replicate', model, get_manager().run, model, input)
+        return call_with_rate_limit('replicate', model, replicate.run, model, input=input)
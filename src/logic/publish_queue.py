@@ -0,0 +1,381 @@
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+from sqlalchemy import or_
+from sqlalchemy.exc import IntegrityError
+from ..database.database import get_db
+from ..database.models import PublishJob, VideoProject
+from ..config import (
+    INSTAGRAM_ACCOUNT_ID, INSTAGRAM_ACCESS_TOKEN, INSTAGRAM_GRAPH_URL, HTTP_TIMEOUT,
+    PUBLISH_POLL_BASE_SECONDS, PUBLISH_POLL_MAX_SECONDS, PUBLISH_MAX_ATTEMPTS, PUBLISH_QUEUE_TICK_SECONDS
+)
+from .transfer import get_session
+from .media_server import start_media_server, publish_file, unpublish_file, public_url
+from .rate_limiter import classify_error
+
+ACTIVE_STATUSES = ('pending', 'container_created')
+FINAL_STATUSES = ('published', 'failed')
+# Tiempo que un proceso se reserva un trabajo mientras lo procesa.
+CLAIM_SECONDS = 60
+
+
+class InstagramGraphClient:
+    """Cliente mínimo de la Graph API para publicar Reels, con timeouts en todas las llamadas."""
+    def __init__(self, base_url: str = INSTAGRAM_GRAPH_URL, account_id: Optional[str] = INSTAGRAM_ACCOUNT_ID,
+                 access_token: Optional[str] = INSTAGRAM_ACCESS_TOKEN):
+        self.base_url = base_url.rstrip('/')
+        self.account_id = account_id
+        self.access_token = access_token
+        self.session = get_session()
+
+    def _request(self, method: str, path: str, **params) -> Dict:
+        params['access_token'] = self.access_token
+        response = self.session.request(method, f"{self.base_url}/{path}", params=params, timeout=HTTP_TIMEOUT)
+        response.raise_for_status()
+        return response.json()
+
+    def create_container(self, video_url: str, caption: str) -> str:
+        data = self._request('POST', f"{self.account_id}/media", media_type='REELS', video_url=video_url,
+                             caption=caption, share_to_feed='true')
+        if not data.get('id'):
+            raise ValueError("No se pudo obtener el ID de creación del contenedor.")
+        return data['id']
+
+    def container_statuses(self, container_ids: List[str]) -> Dict[str, str]:
+        """Consulta el estado de varios contenedores en una sola petición (`?ids=`)."""
+        data = self._request('GET', '', ids=','.join(container_ids), fields='status_code')
+        return {container_id: (data.get(container_id) or {}).get('status_code') for container_id in container_ids}
+
+    def publish(self, container_id: str) -> str:
+        """Publica un contenedor listo y retorna el ID del medio."""
+        media_id = self._request('POST', f"{self.account_id}/media_publish", creation_id=container_id).get('id')
+        if not media_id:
+            raise ValueError("La Graph API no devolvió el ID del medio publicado.")
+        return media_id
+
+    def permalink(self, media_id: str) -> Optional[str]:
+        return self._request('GET', media_id, fields='permalink').get('permalink')
+
+
+def build_instagram_caption(script_data: Dict) -> str:
+    caption = script_data.get('idea', 'Un video increíble generado por IA.')
+    hashtags = script_data.get('hashtags', [])
+    if hashtags:
+        caption += "\n\n" + " ".join([f"#{h.strip().lstrip('#')}" for h in hashtags])
+    return caption
+
+def enqueue_publish(platform: str, video_path: str, caption: str, project_id: Optional[int] = None,
+                    idempotency_key: Optional[str] = None) -> int:
+    """
+    Encola la publicación de un video y retorna el ID del trabajo.
+
+    Si ya existe un trabajo con la misma `idempotency_key`, se retorna ese en
+    lugar de crear otro, así que reintentar nunca publica dos veces.
+    """
+    with get_db() as db:
+        if idempotency_key:
+            existing = db.query(PublishJob.id).filter(PublishJob.idempotency_key == idempotency_key).first()
+            if existing:
+                return existing[0]
+        job = PublishJob(
+            project_id=project_id,
+            platform=platform,
+            idempotency_key=idempotency_key,
+            video_path=video_path,
+            caption=caption,
+            next_attempt_at=datetime.now(timezone.utc)
+        )
+        db.add(job)
+        try:
+            db.commit()
+        except IntegrityError:
+            # Otro proceso encoló la misma clave a la vez.
+            db.rollback()
+            return db.query(PublishJob.id).filter(PublishJob.idempotency_key == idempotency_key).one()[0]
+        print(f"Publicación en {platform} encolada (trabajo {job.id}).")
+        job_id = job.id
+    queue = _queue
+    if queue:
+        queue.notify()
+    return job_id
+
+def retry_failed_job(job_id: int) -> bool:
+    """
+    Vuelve a poner en cola un trabajo fallido desde el principio; retorna False si no se puede.
+
+    Solo se reintentan los fallos anteriores a `media_publish`: un trabajo que
+    llegó a pedir la publicación (o que tiene `media_id`) puede tener el Reel
+    ya en línea, y crear otro contenedor lo publicaría dos veces.
+    """
+    with get_db() as db:
+        updated = db.query(PublishJob).filter(
+            PublishJob.id == job_id,
+            PublishJob.status == 'failed',
+            PublishJob.media_id.is_(None),
+            PublishJob.publish_requested_at.is_(None),
+            PublishJob.result_url.is_(None)
+        ).update({
+            PublishJob.status: 'pending',
+            PublishJob.attempts: 0,
+            PublishJob.container_id: None,
+            PublishJob.media_url_path: None,
+            PublishJob.error_message: None,
+            PublishJob.next_attempt_at: datetime.now(timezone.utc)
+        }, synchronize_session=False)
+        db.commit()
+        job = db.query(PublishJob.project_id, PublishJob.platform).filter(PublishJob.id == job_id).first()
+    if not updated:
+        return False
+    if job and job.project_id:
+        # El 'failed' guardado en el proyecto ya no es final: el trabajo vuelve a estar en cola.
+        record_published_url(job.project_id, job.platform, {'status': 'queued', 'job_id': job_id}, replace_final=True)
+    queue = _queue
+    if queue:
+        queue.notify()
+    return True
+
+def get_publish_job(job_id: int) -> Optional[PublishJob]:
+    with get_db() as db:
+        return db.query(PublishJob).filter(PublishJob.id == job_id).first()
+
+def wait_for_job(job_id: int, timeout: float, interval: float = 1.0) -> Optional[PublishJob]:
+    """Espera a que un trabajo llegue a un estado final; retorna el trabajo o None si vence el plazo."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = get_publish_job(job_id)
+        if job and job.status in FINAL_STATUSES:
+            return job
+        time.sleep(interval)
+    return None
+
+
+class PublishQueue:
+    """
+    Procesa en un único hilo todos los trabajos de publicación pendientes.
+
+    En cada ciclo crea los contenedores de los trabajos nuevos, consulta el
+    estado de todos los contenedores pendientes en una sola petición y publica
+    los que ya están FINISHED. Cada contenedor se vuelve a consultar con
+    backoff exponencial, así que ningún hilo del pipeline queda bloqueado
+    esperando a Instagram.
+
+    Los trabajos viven en `publish_jobs`: sobreviven a reinicios y se
+    reclaman con `SKIP LOCKED`, de modo que varias colas pueden convivir.
+    """
+    def __init__(self, client: Optional[InstagramGraphClient] = None, tick: float = PUBLISH_QUEUE_TICK_SECONDS):
+        self.client = client or InstagramGraphClient()
+        self.tick = tick
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> 'PublishQueue':
+        self._thread = threading.Thread(target=self._loop, name="publish-queue", daemon=True)
+        self._thread.start()
+        return self
+
+    def notify(self):
+        self._wakeup.set()
+
+    def stop(self):
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread:
+            self._thread.join()
+
+    def _loop(self):
+        while not self._stopped.is_set():
+            try:
+                self.run_once()
+            except Exception as e:
+                print(f"Error en la cola de publicación: {e}")
+            self._wakeup.wait(self.tick)
+            self._wakeup.clear()
+
+    def _claim_due_jobs(self) -> List[PublishJob]:
+        now = datetime.now(timezone.utc)
+        with get_db() as db:
+            jobs = (
+                db.query(PublishJob)
+                .filter(
+                    PublishJob.platform == 'instagram',
+                    PublishJob.status.in_(ACTIVE_STATUSES),
+                    or_(PublishJob.next_attempt_at.is_(None), PublishJob.next_attempt_at <= now)
+                )
+                .order_by(PublishJob.next_attempt_at.asc())
+                .limit(50)
+                .with_for_update(skip_locked=True)
+                .all()
+            )
+            for job in jobs:
+                job.next_attempt_at = now + timedelta(seconds=CLAIM_SECONDS)
+            db.commit()
+            for job in jobs:
+                db.refresh(job)
+                db.expunge(job)
+            return jobs
+
+    def _save(self, job: PublishJob, **values):
+        with get_db() as db:
+            db.query(PublishJob).filter(PublishJob.id == job.id).update(values, synchronize_session=False)
+            db.commit()
+
+    def _backoff(self, attempts: int) -> datetime:
+        delay = min(PUBLISH_POLL_MAX_SECONDS, PUBLISH_POLL_BASE_SECONDS * 2 ** max(0, attempts - 1))
+        return datetime.now(timezone.utc) + timedelta(seconds=delay)
+
+    def _fail(self, job: PublishJob, message: str):
+        print(f"!!! Publicación {job.id} en Instagram fallida: {message} !!!")
+        if job.media_url_path:
+            unpublish_file(job.media_url_path)
+        self._save(job, status='failed', error_message=message, next_attempt_at=None)
+        if job.project_id:
+            record_published_url(job.project_id, job.platform, {'status': 'failed', 'error': message, 'job_id': job.id})
+
+    def _retry_or_fail(self, job: PublishJob, error: Exception):
+        attempts = (job.attempts or 0) + 1
+        if classify_error(error) == 'fatal' or attempts >= PUBLISH_MAX_ATTEMPTS:
+            self._fail(job, str(error))
+        else:
+            print(f"Error transitorio en la publicación {job.id}: {error}. Se reintentará.")
+            self._save(job, attempts=attempts, next_attempt_at=self._backoff(attempts))
+
+    def _create_container(self, job: PublishJob):
+        try:
+            if not job.media_url_path:
+                start_media_server()
+                job.media_url_path = publish_file(job.video_path)
+                self._save(job, media_url_path=job.media_url_path)
+            container_id = self.client.create_container(public_url(job.media_url_path), job.caption or '')
+        except Exception as e:
+            self._retry_or_fail(job, e)
+            return
+        print(f"Contenedor {container_id} creado para la publicación {job.id}.")
+        self._save(job, status='container_created', container_id=container_id, attempts=0,
+                   next_attempt_at=self._backoff(1))
+
+    def _publish(self, job: PublishJob):
+        """
+        Publica un contenedor listo. `media_publish` es el único paso que no se
+        puede repetir: en cuanto retorna, el trabajo queda 'published' con su
+        `media_id`, y un trabajo con `media_id` nunca vuelve a llamarlo. El
+        permalink se pide después y, si falla, el Reel sigue publicado sin URL.
+        """
+        if not job.media_id:
+            if not job.publish_requested_at:
+                job.publish_requested_at = datetime.now(timezone.utc)
+                self._save(job, publish_requested_at=job.publish_requested_at)
+            try:
+                job.media_id = self.client.publish(job.container_id)
+            except Exception as e:
+                self._retry_or_fail(job, e)
+                return
+            self._save(job, status='published', media_id=job.media_id, next_attempt_at=None, error_message=None)
+        unpublish_file(job.media_url_path)
+
+        try:
+            permalink = self.client.permalink(job.media_id)
+        except Exception as e:
+            print(f"Advertencia: el Reel {job.media_id} se publicó, pero no se pudo obtener su URL: {e}")
+            permalink = None
+        self._save(job, status='published', result_url=permalink, next_attempt_at=None, error_message=None)
+        print(f"¡Publicación {job.id} en Instagram completada! URL del Reel: {permalink}")
+        if job.project_id:
+            record_published_url(job.project_id, job.platform, {'status': 'published', 'url': permalink, 'job_id': job.id})
+
+    def _published_without_media_id(self, job: PublishJob):
+        unpublish_file(job.media_url_path)
+        self._save(job, status='published', next_attempt_at=None, error_message=None)
+        print(f"La publicación {job.id} ya estaba en Instagram (contenedor {job.container_id}); no se vuelve a publicar.")
+        if job.project_id:
+            record_published_url(job.project_id, job.platform, {'status': 'published', 'url': None, 'job_id': job.id})
+
+    def run_once(self):
+        """Un ciclo de la cola: crea contenedores, consulta estados y publica."""
+        jobs = self._claim_due_jobs()
+        if not jobs:
+            return
+
+        for job in jobs:
+            if job.status == 'pending':
+                self._create_container(job)
+
+        # Un trabajo que ya tiene `media_id` está publicado: solo queda cerrarlo.
+        for job in jobs:
+            if job.status == 'container_created' and job.media_id:
+                self._publish(job)
+        waiting = [job for job in jobs if job.status == 'container_created' and not job.media_id]
+        if not waiting:
+            return
+        try:
+            statuses = self.client.container_statuses([job.container_id for job in waiting])
+        except Exception as e:
+            for job in waiting:
+                self._retry_or_fail(job, e)
+            return
+
+        for job in waiting:
+            status = statuses.get(job.container_id)
+            attempts = (job.attempts or 0) + 1
+            if status == 'FINISHED':
+                self._publish(job)
+            elif status == 'PUBLISHED':
+                # `media_publish` llegó a Instagram aunque se perdió su respuesta: el Reel ya está en línea.
+                self._published_without_media_id(job)
+            elif status in ('ERROR', 'EXPIRED'):
+                self._fail(job, f"El contenedor {job.container_id} terminó con estado {status}.")
+            elif attempts >= PUBLISH_MAX_ATTEMPTS:
+                self._fail(job, f"El contenedor {job.container_id} no estuvo listo a tiempo.")
+            else:
+                self._save(job, attempts=attempts, next_attempt_at=self._backoff(attempts))
+
+def record_published_url(project_id: int, platform: str, result: Dict, replace_final: bool = False):
+    """
+    Guarda el resultado de una plataforma en `published_urls` del proyecto sin pisar
+    las demás. Un resultado final ('published', 'failed') nunca se reemplaza por uno
+    intermedio, aunque las escrituras lleguen desordenadas, salvo con `replace_final`
+    (un trabajo fallido que se vuelve a encolar).
+    """
+    with get_db() as db:
+        project = db.query(VideoProject).filter(VideoProject.id == project_id).with_for_update().first()
+        if project:
+            current = (project.published_urls or {}).get(platform)
+            if (not replace_final and isinstance(current, dict) and current.get('status') in FINAL_STATUSES
+                    and result.get('status') not in FINAL_STATUSES):
+                return
+            project.published_urls = {**(project.published_urls or {}), platform: result}
+            db.commit()
+
+
+_queue: Optional[PublishQueue] = None
+_queue_lock = threading.Lock()
+# True en un worker creado por fork desde un proceso con la cola en marcha.
+_parent_queue = False
+
+def start_publish_queue() -> Optional[PublishQueue]:
+    """
+    Arranca la cola de publicación del proceso si aún no está en marcha.
+
+    En un worker hijo del proceso que ya tiene la cola no arranca otra y
+    retorna None: el worker solo encola y la cola del padre recoge el trabajo
+    de la base de datos en su siguiente ciclo (`PUBLISH_QUEUE_TICK_SECONDS`).
+    """
+    global _queue
+    with _queue_lock:
+        if _queue is None and not _parent_queue:
+            _queue = PublishQueue().start()
+            print("Cola de publicación iniciada.")
+        return _queue
+
+def _forget_queue_after_fork():
+    # El hilo de la cola no sobrevive al fork: el objeto heredado no procesaría
+    # nada y `notify()` sobre él no despertaría a la cola del padre.
+    global _queue, _queue_lock, _parent_queue
+    _parent_queue = _queue is not None
+    _queue = None
+    _queue_lock = threading.Lock()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_forget_queue_after_fork)
@@ -0,0 +1,142 @@
+import hashlib
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, List, Optional
+from ..database.database import get_db
+from ..database.models import PublishJob
+from ..config import (
+    INSTAGRAM_ACCOUNT_ID, INSTAGRAM_ACCESS_TOKEN, NGROK_PUBLIC_URL,
+    PUBLISH_PLATFORMS, PUBLISH_WORKERS, PUBLISH_FANOUT_TIMEOUT
+)
+from .publish_queue import (
+    start_publish_queue, enqueue_publish, get_publish_job, retry_failed_job, record_published_url,
+    build_instagram_caption
+)
+from .asset_store import get_asset_store
+
+# Hilos compartidos por todas las publicaciones del proceso. No son daemon: una
+# subida que siga en curso al terminar el pipeline se completa antes de salir.
+_executor = ThreadPoolExecutor(max_workers=PUBLISH_WORKERS, thread_name_prefix="publisher")
+
+
+def idempotency_key(project_id: int, platform: str) -> str:
+    """Clave de idempotencia de la publicación de un proyecto en una plataforma."""
+    return hashlib.sha256(f"project:{project_id}:{platform}".encode('utf-8')).hexdigest()
+
+def _job_result(job: PublishJob) -> Dict[str, Any]:
+    if job.status == 'published':
+        return {'status': 'published', 'url': job.result_url, 'job_id': job.id}
+    if job.status == 'failed':
+        return {'status': 'failed', 'error': job.error_message, 'job_id': job.id}
+    return {'status': 'in_progress', 'job_id': job.id}
+
+def _claim_job(job_id: int) -> bool:
+    """Marca un trabajo como 'publishing' si nadie lo ha tomado ya; solo un proceso lo consigue."""
+    with get_db() as db:
+        claimed = db.query(PublishJob).filter(
+            PublishJob.id == job_id, PublishJob.status.in_(('pending', 'failed'))
+        ).update({PublishJob.status: 'publishing', PublishJob.error_message: None}, synchronize_session=False)
+        db.commit()
+    return bool(claimed)
+
+def _finish_job(job_id: int, url: Optional[str], error: Optional[str] = None):
+    with get_db() as db:
+        values = {PublishJob.status: 'published', PublishJob.result_url: url} if url else \
+                 {PublishJob.status: 'failed', PublishJob.error_message: error or "La plataforma no devolvió una URL."}
+        db.query(PublishJob).filter(PublishJob.id == job_id).update(values, synchronize_session=False)
+        db.commit()
+
+def _publish_direct(platform: str, upload: Callable[[str, Dict[str, Any]], Optional[str]],
+                    project_id: int, video_path: str, script_data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Publica con una función de subida síncrona que retorna la URL.
+
+    El trabajo en `publish_jobs` actúa de candado: un reintento del nodo (o
+    otro worker) que encuentre la publicación ya tomada o terminada no vuelve
+    a subir el video. Si un proceso muere a mitad de la subida, el trabajo
+    queda en 'publishing' y no se reintenta solo, para no arriesgar un doble post.
+    """
+    job_id = enqueue_publish(platform, video_path, script_data.get('idea', ''),
+                             project_id=project_id, idempotency_key=idempotency_key(project_id, platform))
+    if not _claim_job(job_id):
+        return _job_result(get_publish_job(job_id))
+    try:
+        url = upload(video_path, script_data)
+    except Exception as e:
+        _finish_job(job_id, None, str(e))
+        raise
+    _finish_job(job_id, url)
+    return _job_result(get_publish_job(job_id))
+
+def _publish_youtube(project_id: int, video_path: str, script_data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    `social_publisher.publish_to_youtube` todavía es una simulación: publicar con
+    ella guardaría una URL inventada como si el video estuviera en YouTube. Hasta
+    que exista la subida real (que irá por `_publish_direct`), se omite.
+    """
+    return {'status': 'skipped', 'error': "La publicación en YouTube aún no está implementada."}
+
+def _publish_instagram(project_id: int, video_path: str, script_data: Dict[str, Any]) -> Dict[str, Any]:
+    """Encola el Reel en la cola de publicación; la URL se guarda en el proyecto cuando esté listo."""
+    if not INSTAGRAM_ACCOUNT_ID or not INSTAGRAM_ACCESS_TOKEN or not NGROK_PUBLIC_URL:
+        return {'status': 'skipped', 'error': "Faltan las credenciales de Instagram o NGROK_PUBLIC_URL."}
+    start_publish_queue()
+    job_id = enqueue_publish('instagram', video_path, build_instagram_caption(script_data),
+                             project_id=project_id, idempotency_key=idempotency_key(project_id, 'instagram'))
+    # Un reintento del proyecto vuelve a intentar las publicaciones que fallaron.
+    retry_failed_job(job_id)
+    result = _job_result(get_publish_job(job_id))
+    return {**result, 'status': 'queued'} if result['status'] == 'in_progress' else result
+
+# Plataformas disponibles: cada función publica el proyecto y retorna su resultado.
+PUBLISHERS: Dict[str, Callable[[int, str, Dict[str, Any]], Dict[str, Any]]] = {
+    'youtube': _publish_youtube,
+    'instagram': _publish_instagram,
+}
+
+
+def _run_publisher(platform: str, project_id: int, video_path: str, script_data: Dict[str, Any]) -> Dict[str, Any]:
+    try:
+        result = PUBLISHERS[platform](project_id, video_path, script_data)
+    except Exception as e:
+        print(f"!!! Error publicando el proyecto {project_id} en {platform}: {e} !!!")
+        result = {'status': 'failed', 'error': str(e)}
+    record_published_url(project_id, platform, result)
+    return result
+
+def publish_project(project_id: int, video_path: str, script_data: Dict[str, Any],
+                    platforms: Optional[List[str]] = None, timeout: float = PUBLISH_FANOUT_TIMEOUT) -> Dict[str, Dict[str, Any]]:
+    """
+    Publica un proyecto terminado en todas las plataformas a la vez.
+
+    Cada plataforma corre en su propio hilo y guarda su resultado en
+    `published_urls` del proyecto en cuanto termina. Se espera como mucho
+    `timeout` segundos: las plataformas que sigan en curso aparecen como
+    'in_progress' y completan su resultado en segundo plano. `video_path`
+    puede ser una URI del almacén de assets.
+
+    Returns:
+        {plataforma: {'status': ..., 'url': ..., 'error': ..., 'job_id': ...}}, donde
+        status es 'published', 'queued', 'in_progress', 'skipped' o 'failed'.
+    """
+    platforms = PUBLISH_PLATFORMS if platforms is None else platforms
+    # Las plataformas suben un archivo local: los assets remotos se descargan una vez.
+    video_path = get_asset_store().local_path(video_path)
+    results: Dict[str, Dict[str, Any]] = {}
+    futures = {}
+    for platform in platforms:
+        if platform not in PUBLISHERS:
+            results[platform] = {'status': 'failed', 'error': f"Plataforma desconocida: '{platform}'."}
+            record_published_url(project_id, platform, results[platform])
+            continue
+        futures[platform] = _executor.submit(_run_publisher, platform, project_id, video_path, script_data)
+
+    done, _ = wait(futures.values(), timeout=timeout)
+    for platform, future in futures.items():
+        if future in done:
+            results[platform] = future.result()
+        else:
+            print(f"La publicación en {platform} sigue en curso; su resultado se guardará al terminar.")
+            results[platform] = {'status': 'in_progress'}
+            # Nunca pisa un resultado final que el hilo haya guardado entretanto.
+            record_published_url(project_id, platform, results[platform])
+    return results
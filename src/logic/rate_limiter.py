@@ -0,0 +1,213 @@
+import fcntl
+import json
+import os
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Optional
+from ..config import (
+    RATE_LIMIT_DIR, RATE_LIMITS, RETRY_MAX_ATTEMPTS, RETRY_BASE_DELAY, RETRY_MAX_DELAY
+)
+from .metrics import record_retry
+
+# Errores de red que siempre se consideran transitorios.
+TRANSIENT_ERROR_NAMES = {
+    'ConnectionError', 'Timeout', 'ConnectTimeout', 'ReadTimeout', 'TimeoutException',
+    'TransportError', 'APIConnectionError', 'APITimeoutError', 'InternalServerError',
+}
+TRANSIENT_STATUS_CODES = {500, 502, 503, 504}
+
+
+class RateLimitedError(Exception):
+    """Se agotaron los reintentos de una llamada limitada por el proveedor."""
+
+
+def _status_code(error: Exception) -> Optional[int]:
+    for attribute in ('status_code', 'status'):
+        value = getattr(error, attribute, None)
+        if isinstance(value, int):
+            return value
+    response = getattr(error, 'response', None)
+    return getattr(response, 'status_code', None)
+
+def _retry_after(error: Exception) -> Optional[float]:
+    """Lee `Retry-After` (en segundos) de la respuesta asociada al error, si la hay."""
+    response = getattr(error, 'response', None)
+    headers = getattr(response, 'headers', None) or {}
+    value = headers.get('retry-after') or headers.get('Retry-After')
+    if value is None:
+        # Replicate incluye la espera en el detalle del error ("... resets in ~5s").
+        match = re.search(r'resets in ~?(\d+(?:\.\d+)?)s', str(getattr(error, 'detail', '') or ''))
+        return float(match.group(1)) if match else None
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+def classify_error(error: Exception) -> str:
+    """Clasifica un error como 'throttled' (429), 'transient' (reintentable) o 'fatal'."""
+    status = _status_code(error)
+    if status == 429 or type(error).__name__ == 'RateLimitError':
+        return 'throttled'
+    if status in TRANSIENT_STATUS_CODES:
+        return 'transient'
+    if any(cls.__name__ in TRANSIENT_ERROR_NAMES for cls in type(error).__mro__):
+        return 'transient'
+    # TimeoutError no se incluye: es el plazo total de una predicción, no un fallo de red.
+    if isinstance(error, ConnectionError):
+        return 'transient'
+    return 'fatal'
+
+
+class AdaptiveRateLimiter:
+    """
+    Token bucket + límite de concurrencia AIMD para un proveedor/modelo.
+
+    El estado vive en un archivo JSON bajo `RATE_LIMIT_DIR` protegido con
+    `flock`, así que lo comparten todos los hilos y procesos worker de la
+    máquina. La concurrencia permitida crece en +1 por cada "ventana" de
+    llamadas correctas y se reduce a la mitad con cada 429, respetando
+    `Retry-After` para todo el proveedor.
+
+    Args:
+        key: Identificador del limitador (ej. 'replicate:bytedance/seedance-1-pro').
+        rate: Llamadas por segundo que se reponen en el bucket.
+        burst: Tamaño del bucket.
+        max_concurrency: Techo de llamadas simultáneas.
+        min_concurrency: Suelo de llamadas simultáneas tras los recortes.
+    """
+    def __init__(self, key: str, rate: float, burst: int, max_concurrency: int, min_concurrency: int = 1,
+                 state_dir: str = RATE_LIMIT_DIR):
+        self.key = key
+        self.rate = rate
+        self.burst = burst
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        os.makedirs(state_dir, exist_ok=True)
+        self.path = os.path.join(state_dir, re.sub(r'[^A-Za-z0-9_.-]', '_', key) + '.json')
+
+    @contextmanager
+    def _state(self):
+        with open(self.path, 'a+') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                f.seek(0)
+                content = f.read()
+                state = json.loads(content) if content else {}
+                now = time.time()
+                state.setdefault('tokens', float(self.burst))
+                state.setdefault('updated', now)
+                state.setdefault('limit', float(self.max_concurrency))
+                state.setdefault('blocked_until', 0.0)
+                # Los slots de procesos que ya no existen se liberan.
+                state['in_flight'] = {pid: count for pid, count in state.get('in_flight', {}).items() if _pid_alive(int(pid))}
+                state['tokens'] = min(self.burst, state['tokens'] + (now - state['updated']) * self.rate)
+                state['updated'] = now
+                yield state, now
+                f.seek(0)
+                f.truncate()
+                json.dump(state, f)
+                f.flush()
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def acquire(self):
+        """Bloquea hasta obtener un token y un slot de concurrencia."""
+        pid = str(os.getpid())
+        while True:
+            with self._state() as (state, now):
+                in_flight = sum(state['in_flight'].values())
+                if now < state['blocked_until']:
+                    wait = state['blocked_until'] - now
+                elif in_flight >= max(self.min_concurrency, int(state['limit'])):
+                    wait = 0.1
+                elif state['tokens'] < 1:
+                    wait = (1 - state['tokens']) / self.rate
+                else:
+                    state['tokens'] -= 1
+                    state['in_flight'][pid] = state['in_flight'].get(pid, 0) + 1
+                    return
+            time.sleep(min(wait, 1.0) * random.uniform(0.8, 1.2))
+
+    def release(self, outcome: str = 'ok', retry_after: Optional[float] = None):
+        """Libera el slot y ajusta la concurrencia según el resultado ('ok', 'throttled', ...)."""
+        pid = str(os.getpid())
+        with self._state() as (state, now):
+            remaining = state['in_flight'].get(pid, 0) - 1
+            if remaining > 0:
+                state['in_flight'][pid] = remaining
+            else:
+                state['in_flight'].pop(pid, None)
+
+            if outcome == 'throttled':
+                state['limit'] = max(float(self.min_concurrency), state['limit'] / 2)
+                if retry_after:
+                    state['blocked_until'] = max(state['blocked_until'], now + retry_after)
+                print(f"Límite de tasa en '{self.key}': concurrencia reducida a {int(state['limit'])}.")
+            elif outcome == 'ok':
+                state['limit'] = min(float(self.max_concurrency), state['limit'] + 1 / max(state['limit'], 1.0))
+
+    def concurrency_limit(self) -> int:
+        with self._state() as (state, _):
+            return int(state['limit'])
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+_limiters: Dict[str, AdaptiveRateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+def get_limiter(provider: str, model: str) -> AdaptiveRateLimiter:
+    """Retorna el limitador de un proveedor/modelo, con la configuración de `RATE_LIMITS`."""
+    key = f"{provider}:{model.split(':')[0]}"
+    with _limiters_lock:
+        if key not in _limiters:
+            rate, burst, max_concurrency = RATE_LIMITS.get(provider, RATE_LIMITS['default'])
+            _limiters[key] = AdaptiveRateLimiter(key, rate, burst, max_concurrency)
+        return _limiters[key]
+
+def backoff_delay(attempt: int, base: float = RETRY_BASE_DELAY, maximum: float = RETRY_MAX_DELAY) -> float:
+    """Espera exponencial con jitter completo para el intento `attempt` (desde 1)."""
+    return random.uniform(0, min(maximum, base * 2 ** (attempt - 1)))
+
+def call_with_rate_limit(provider: str, model: str, fn: Callable, *args,
+                         max_attempts: int = RETRY_MAX_ATTEMPTS, **kwargs) -> Any:
+    """
+    Ejecuta `fn(*args, **kwargs)` bajo el limitador del proveedor/modelo.
+
+    Los 429 reducen la concurrencia compartida y se reintentan tras
+    `Retry-After` (o un backoff con jitter); los errores transitorios (red,
+    5xx) se reintentan con backoff; el resto se propaga de inmediato.
+    """
+    limiter = get_limiter(provider, model)
+    for attempt in range(1, max_attempts + 1):
+        limiter.acquire()
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as e:
+            outcome = classify_error(e)
+            retry_after = _retry_after(e) if outcome == 'throttled' else None
+            limiter.release(outcome, retry_after)
+            if outcome == 'fatal':
+                raise
+            if attempt == max_attempts:
+                if outcome == 'throttled':
+                    raise RateLimitedError(f"'{model}' siguió limitado tras {max_attempts} intentos: {e}") from e
+                raise
+            delay = retry_after or backoff_delay(attempt)
+            record_retry()
+            print(f"Error {'de límite de tasa' if outcome == 'throttled' else 'transitorio'} en '{model}' "
+                  f"(intento {attempt}/{max_attempts}): {e}. Reintentando en {delay:.1f}s...")
+            time.sleep(delay)
+            continue
+        limiter.release('ok')
+        return result
@@ -0,0 +1,191 @@
+import os
+import json
+import hashlib
+import tempfile
+import threading
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+from ..config import REPLICATE_CACHE_ENABLED, REPLICATE_CACHE_DIR, REPLICATE_CACHE_MAX_BYTES
+from .asset_store import get_asset_store
+from .transfer import iter_download, download_to_store
+
+
+def _hash_file(path: Path) -> str:
+    """Calcula el SHA-256 del contenido de un archivo."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class ReplicateCache:
+    """
+    Caché local direccionada por contenido para las salidas de Replicate.
+
+    La clave es un hash de (modelo/versión, parámetros de entrada, bytes de los
+    archivos de entrada) y el valor es el archivo de salida descargado. El tamaño
+    total se limita con desalojo LRU, usando la fecha de modificación de cada
+    archivo como marca del último acceso.
+
+    El tamaño total se lleva en memoria y solo se recorre el directorio al
+    superar `max_bytes`, o cada `rescan_every` entradas nuevas para contar las
+    que hayan escrito otros procesos que comparten el directorio. El desalojo
+    baja hasta el 90% del límite, para no recorrerlo de nuevo en la siguiente
+    entrada.
+    """
+    def __init__(self, cache_dir: Union[str, Path], max_bytes: int, rescan_every: int = 100):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self.rescan_every = rescan_every
+        self.hits = 0
+        self.misses = 0
+        self._total_bytes: Optional[int] = None
+        self._inserts_since_scan = 0
+        self._lock = threading.Lock()
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    def make_key(self, model: str, params: Dict[str, Any], attempt: int = 1) -> str:
+        """
+        Genera la clave de caché de una petición.
+
+        Los valores de tipo `Path` se interpretan como archivos de entrada y se
+        sustituyen por el hash de su contenido. Los reintentos (`attempt` > 1)
+        tienen su propia clave: un reintento pide una salida nueva en lugar de
+        repetir la del intento que falló, y al reanudarse reutiliza la suya.
+        """
+        normalized = {
+            name: f"sha256:{_hash_file(value)}" if isinstance(value, Path) else value
+            for name, value in params.items()
+        }
+        request = {"model": model, "input": normalized}
+        if attempt > 1:
+            request["attempt"] = attempt
+        payload = json.dumps(request, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def _entry_path(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / key
+
+    def get(self, key: str, store, asset_key: str) -> Optional[str]:
+        """Guarda la salida cacheada en el almacén bajo `asset_key` y retorna su URI, o None si no existe."""
+        entry = self._entry_path(key)
+        try:
+            os.utime(entry)
+            uri = store.put_file(asset_key, str(entry))
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return uri
+
+    def tee(self, key: str, chunks: Iterable[bytes]) -> Iterator[bytes]:
+        """
+        Reenvía los bloques de una descarga mientras los guarda bajo `key`.
+
+        La entrada solo se publica si la descarga llega al final; después se
+        aplica el límite de tamaño.
+        """
+        entry = self._entry_path(key)
+        entry.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=entry.parent, prefix='.tmp-')
+        try:
+            written = 0
+            with os.fdopen(fd, 'wb') as f:
+                for chunk in chunks:
+                    f.write(chunk)
+                    written += len(chunk)
+                    yield chunk
+            replaced = entry.stat().st_size if entry.exists() else 0
+            os.replace(tmp_path, entry)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        self._account(written - replaced)
+
+    def _account(self, delta: int):
+        """Suma `delta` bytes al total y desaloja (recorriendo el directorio) solo si hace falta."""
+        with self._lock:
+            rescan = self._total_bytes is None or self._inserts_since_scan >= self.rescan_every
+            if not rescan:
+                self._total_bytes += delta
+                self._inserts_since_scan += 1
+            over_limit = rescan or self._total_bytes > self.max_bytes
+        if over_limit:
+            self._evict()
+
+    def _scan(self) -> Tuple[List[Tuple[float, int, Path]], int]:
+        entries = []
+        total = 0
+        for path in self.cache_dir.glob('*/*'):
+            if path.name.startswith('.tmp-'):
+                continue
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+        return entries, total
+
+    def _evict(self):
+        """Si se supera `max_bytes`, elimina las entradas usadas hace más tiempo hasta bajar al 90%."""
+        entries, total = self._scan()
+        if total > self.max_bytes:
+            target = self.max_bytes * 0.9
+            for _, size, path in sorted(entries):
+                if total <= target:
+                    break
+                try:
+                    path.unlink()
+                    total -= size
+                except FileNotFoundError:
+                    continue
+        with self._lock:
+            self._total_bytes = total
+            self._inserts_since_scan = 0
+
+    def stats(self) -> Dict[str, int]:
+        """Devuelve los contadores de aciertos y fallos de la caché."""
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses}
+
+
+_cache = ReplicateCache(REPLICATE_CACHE_DIR, REPLICATE_CACHE_MAX_BYTES) if REPLICATE_CACHE_ENABLED else None
+
+def get_cache() -> Optional[ReplicateCache]:
+    """Retorna la caché global, o None si está desactivada."""
+    return _cache
+
+def run_cached(model: str, params: Dict[str, Any], asset_key: str, produce: Callable[[], str], store=None,
+               attempt: int = 1) -> str:
+    """
+    Resuelve una petición a Replicate desde la caché o, si no está, ejecutándola.
+
+    La salida se descarga directamente al almacén de assets; si la caché está
+    activa, se guarda en ella durante la misma descarga.
+
+    Args:
+        model: El identificador del modelo (con versión, si la tiene).
+        params: Los parámetros de entrada; los archivos se pasan como `Path`.
+        asset_key: Clave de la salida en el almacén (ej. 'videos/12_0_final.mp4').
+        produce: Función que llama a Replicate y retorna la URL de la salida.
+        store: Almacén de destino; por defecto, el del proceso.
+        attempt: Intento de la petición; los reintentos no reutilizan la salida de intentos anteriores.
+
+    Returns:
+        La URI del asset de salida.
+    """
+    store = store or get_asset_store()
+    cache = get_cache()
+    if cache is None:
+        return download_to_store(produce(), asset_key, store)
+
+    key = cache.make_key(model, params, attempt)
+    uri = cache.get(key, store, asset_key)
+    if uri:
+        print(f"  \\_ Salida de '{model}' recuperada de la caché: {uri}")
+        return uri
+
+    return store.put_stream(asset_key, cache.tee(key, iter_download(produce())))
@@ -0,0 +1,159 @@
+import os
+import re
+import time
+import threading
+from pathlib import Path
+from typing import Iterator, Optional, Tuple, Union
+import requests
+from requests.adapters import HTTPAdapter
+from ..config import HTTP_POOL_SIZE, HTTP_TIMEOUT, DOWNLOAD_CHUNK_SIZE, DOWNLOAD_MAX_RETRIES
+from .metrics import record_bytes, record_retry
+from .asset_store import get_asset_store
+
+# Errores tras los cuales se reanuda la descarga desde el último byte recibido.
+RESUMABLE_ERRORS = (
+    requests.exceptions.ConnectionError,
+    requests.exceptions.ChunkedEncodingError,
+    requests.exceptions.Timeout,
+)
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session() -> requests.Session:
+    """
+    Retorna la sesión HTTP compartida del proceso.
+
+    La sesión mantiene un pool de conexiones keep-alive por host, de modo que
+    las descargas y llamadas a APIs reutilizan las conexiones TCP/TLS.
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _session = session
+        return _session
+
+def _remove_quietly(path: str):
+    if os.path.exists(path):
+        os.remove(path)
+
+def _expected_size(response: requests.Response, offset: int) -> Optional[int]:
+    """Calcula el tamaño total del archivo a partir de Content-Range o Content-Length."""
+    content_range = response.headers.get('Content-Range')
+    if content_range:
+        match = re.match(r'bytes \d+-\d+/(\d+)', content_range)
+        if match:
+            return int(match.group(1))
+    content_length = response.headers.get('Content-Length')
+    if content_length is not None:
+        return offset + int(content_length)
+    return None
+
+def iter_download(
+    url: str,
+    chunk_size: int = DOWNLOAD_CHUNK_SIZE,
+    max_retries: int = DOWNLOAD_MAX_RETRIES,
+    timeout: Tuple[float, float] = HTTP_TIMEOUT,
+) -> Iterator[bytes]:
+    """
+    Descarga una URL por streaming y produce su contenido en bloques.
+
+    Si la conexión se corta, reanuda desde el último byte entregado con una
+    cabecera `Range` (si el servidor la ignora, se descartan los bytes ya
+    entregados de la nueva respuesta). Al terminar, verifica el tamaño contra
+    Content-Length y lanza `IOError` si la descarga quedó incompleta.
+
+    Args:
+        url: La URL a descargar.
+        chunk_size: Tamaño de los bloques de lectura.
+        max_retries: Número máximo de reanudaciones tras un error de red.
+        timeout: Timeouts (conexión, lectura) en segundos.
+    """
+    session = get_session()
+    downloaded = 0
+    total = None
+    attempt = 0
+
+    while True:
+        # Sin compresión, para que los bytes recibidos coincidan con Content-Length.
+        headers = {'Accept-Encoding': 'identity'}
+        if downloaded:
+            headers['Range'] = f'bytes={downloaded}-'
+        try:
+            with session.get(url, stream=True, timeout=timeout, headers=headers) as response:
+                response.raise_for_status()
+                # Si el servidor ignoró el Range, la respuesta empieza de nuevo desde el byte 0.
+                skip = downloaded if downloaded and response.status_code != 206 else 0
+                total = _expected_size(response, downloaded - skip)
+                for chunk in response.iter_content(chunk_size=chunk_size):
+                    if skip:
+                        dropped = min(skip, len(chunk))
+                        chunk = chunk[dropped:]
+                        skip -= dropped
+                    if chunk:
+                        downloaded += len(chunk)
+                        yield chunk
+            break
+        except RESUMABLE_ERRORS as e:
+            attempt += 1
+            if attempt > max_retries:
+                raise
+            print(f"Conexión interrumpida en {downloaded} bytes ({e}). Reanudando ({attempt}/{max_retries})...")
+            record_retry()
+            time.sleep(min(2 ** attempt, 30))
+
+    if total is not None and downloaded != total:
+        raise IOError(f"Descarga incompleta de {url}: {downloaded} de {total} bytes.")
+    record_bytes(downloaded)
+
+def download_file(
+    url: str,
+    save_path: Union[str, Path],
+    chunk_size: int = DOWNLOAD_CHUNK_SIZE,
+    max_retries: int = DOWNLOAD_MAX_RETRIES,
+    timeout: Tuple[float, float] = HTTP_TIMEOUT,
+) -> int:
+    """
+    Descarga un archivo por streaming a un archivo temporal y lo renombra de forma atómica.
+
+    Ver `iter_download` para la reanudación y la verificación de tamaño.
+
+    Args:
+        url: La URL a descargar.
+        save_path: Ruta final del archivo.
+        chunk_size: Tamaño de los bloques de lectura y del buffer de escritura.
+        max_retries: Número máximo de reanudaciones tras un error de red.
+        timeout: Timeouts (conexión, lectura) en segundos.
+
+    Returns:
+        El número de bytes descargados.
+    """
+    save_path = str(save_path)
+    part_path = f"{save_path}.part"
+    downloaded = 0
+    try:
+        with open(part_path, 'wb', buffering=chunk_size) as f:
+            for chunk in iter_download(url, chunk_size, max_retries, timeout):
+                f.write(chunk)
+                downloaded += len(chunk)
+    except BaseException:
+        _remove_quietly(part_path)
+        raise
+    os.replace(part_path, save_path)
+    return downloaded
+
+def download_to_store(url: str, key: str, store=None) -> str:
+    """
+    Descarga una URL directamente al almacén de assets, sin copia temporal
+    intermedia (en S3 los bloques se suben por partes a medida que llegan).
+
+    Returns:
+        La URI del asset guardado.
+    """
+    store = store or get_asset_store()
+    return store.put_stream(key, iter_download(url))
@@ -1,61 +1,73 @@
 import os
+import re
+import subprocess
+import tempfile
+from pathlib import Path
 import replicate
 import requests
 from src.config import REPLICATE_API_TOKEN
+from .replicate_cache import run_cached
+from .prediction_manager import run_model
+from .asset_store import get_asset_store
+from .image_prep import prepare_image
 
 
 if REPLICATE_API_TOKEN:
     os.environ["REPLICATE_API_TOKEN"] = REPLICATE_API_TOKEN
 
-def _download_video(url: str, save_path: str):
-    """Descarga un archivo de video desde una URL y lo guarda localmente."""
+VIDEO_MODEL = "bytedance/seedance-1-pro"
+AUDIO_MODEL = "zsxkib/mmaudio:62871fb59889b2d7c13777f08deb3b36bdff88f7e1d53a50ad7694548a41b484"
+
+# Formato del Reel final cuando hay que recodificar.
+FINAL_WIDTH = 720
+FINAL_HEIGHT = 1280
+FINAL_FPS = 24
+
+def _run_to_store(model: str, params: dict, asset_key: str, produce, label: str = "Video", attempt: int = 1) -> str:
+    """`run_cached` con los mensajes de descarga; `label` nombra la salida en el log."""
     try:
-        response = requests.get(url, stream=True)
-        response.raise_for_status() 
-        with open(save_path, 'wb') as f:
-            for chunk in response.iter_content(chunk_size=8192):
-                f.write(chunk)
-        print(f"Video descargado y guardado en: {save_path}")
-    except requests.exceptions.RequestException as e:
-        print(f"Error al descargar el video desde {url}: {e}")
+        uri = run_cached(model, params, asset_key, produce, attempt=attempt)
+    except (requests.exceptions.RequestException, IOError) as e:
+        print(f"Error al descargar la salida de '{model}' en {asset_key}: {e}")
         raise
+    print(f"{label} guardado en: {uri}")
+    return uri
 
-def generate_videos_from_images(idea_id: int, image_paths: list[str], video_prompts: list[str], audio_prompt: str = None) -> list[str]:
+def generate_video_for_image(idea_id: int, index: int, image_uri: str, video_prompt: str, audio_prompt: str = None,
+                             attempt: int = 1) -> str:
     """
-    Genera un video corto para cada imagen proporcionada utilizando la API de Replicate.
+    Genera el clip de una única escena: anima la imagen con seedance y, si hay
+    `audio_prompt`, le añade el sonido ambiente con mmaudio.
 
     Args:
         idea_id (int): El ID de la idea, usado para nombrar los archivos de salida.
-        image_paths (list[str]): Una lista de rutas a los archivos de imagen locales.
-        video_prompts (list[str]): Una lista de prompts de texto para guiar la animación del video.
+        index (int): Posición de la escena (base 0), usada en el nombre del archivo.
+        image_uri (str): URI (o ruta local) de la imagen de la escena en el almacén de assets.
+        video_prompt (str): Prompt de texto para guiar la animación del video.
+        audio_prompt (str): Prompt opcional para generar el audio del clip.
+        attempt (int): Intento de la escena; los reintentos no reutilizan la salida cacheada.
 
     Returns:
-        list[str]: Una lista de rutas a los archivos de video generados.
+        str: La URI del video generado.
     """
-    print(f"Iniciando la generación de videos para la idea ID: {idea_id}")
-    video_paths = []
-    video_dir = os.path.join("src", "assets", "videos")
-    os.makedirs(video_dir, exist_ok=True)
-
-    if len(image_paths) != len(video_prompts):
-        raise ValueError("La cantidad de imágenes y prompts de video no coincide.")
-
-    for i, image_path in enumerate(image_paths):
-        video_prompt = video_prompts[i]
-        print(f"Procesando imagen {i+1}/{len(image_paths)}: {image_path}")
-        print(f"  \_ Con prompt de video: '{video_prompt}'")
-        try:
+    store = get_asset_store()
+    print(f"Procesando imagen {index+1}: {image_uri}")
+    print(f"  \_ Con prompt de video: '{video_prompt}'")
+    try:
+        # Se sube la variante reducida a 720p, no el PNG original de ideogram.
+        image_path = prepare_image(image_uri, (FINAL_WIDTH, FINAL_HEIGHT), store=store)
+        video_key = f"videos/{idea_id}_{index}_final.mp4"
+        video_input = {
+            "image": Path(image_path),
+            "prompt": video_prompt,
+            "resolution": "720p",
+            "aspect_ratio": "9:16"
+        }
+
+        def produce_video():
             with open(image_path, "rb") as image_file:
-                output_url = replicate.run(
-                    "bytedance/seedance-1-pro",
-                    input={
-                        "image": image_file,
-                        "prompt": video_prompt,
-                        "resolution": "720p",
-                        "aspect_ratio": "9:16"
-                    }
-                )
-            
+                output_url = run_model(VIDEO_MODEL, {**video_input, "image": image_file})
+
             if not output_url:
                 raise ValueError("La API de Replicate no devolvió una URL de salida.")
 
@@ -63,39 +75,267 @@ def generate_videos_from_images(idea_id: int, image_paths: list[str], video_prom
                 output_url = output_url[0]
 
             print(f"URL del video generado por Replicate: {output_url}")
+            return output_url.url
+
+        video_uri = _run_to_store(VIDEO_MODEL, video_input, video_key, produce_video, attempt=attempt)
+
+        if not audio_prompt:
+            return video_uri
+
+        print(f" \_ Generando audio para el video: '{audio_prompt}'")
+        video_path = store.local_path(video_uri)
+        audio_input = {
+            "video": Path(video_path),
+            "prompt": audio_prompt
+        }
+
+        def produce_audio():
+            with open(video_path, "rb") as video_file:
+                audio_video_output = run_model(AUDIO_MODEL, {**audio_input, "video": video_file})
+            return audio_video_output.url
+
+        return _run_to_store(AUDIO_MODEL, audio_input, video_key.replace('.mp4', '_with_audio.mp4'), produce_audio,
+                             label="Video con audio", attempt=attempt)
+
+    except replicate.exceptions.ReplicateError as e:
+        print(f"Error de la API de Replicate al procesar {image_uri}: {e}")
+        raise
+    except Exception as e:
+        print(f"Un error inesperado ocurrió al procesar {image_uri}: {e}")
+        raise
+
+def _ffmpeg_exe() -> str:
+    """Retorna el binario de ffmpeg (el que incluye moviepy vía imageio-ffmpeg, o el del sistema)."""
+    try:
+        import imageio_ffmpeg
+        return imageio_ffmpeg.get_ffmpeg_exe()
+    except Exception:
+        return "ffmpeg"
+
+def probe_video(path: str) -> dict:
+    """
+    Obtiene los parámetros de los streams de un video a partir de la salida de `ffmpeg -i`.
+
+    Returns:
+        dict: Con 'video_codec', 'width', 'height', 'pix_fmt', 'fps', 'audio_codec'
+        (None si no hay audio), 'sample_rate', 'channels' y 'duration' en segundos.
+    """
+    result = subprocess.run([_ffmpeg_exe(), "-hide_banner", "-i", path], capture_output=True, text=True)
+    info = {
+        "video_codec": None, "width": None, "height": None, "pix_fmt": None, "fps": None,
+        "audio_codec": None, "sample_rate": None, "channels": None, "duration": None
+    }
+    for line in result.stderr.splitlines():
+        line = line.strip()
+        duration = re.match(r"Duration: (\d+):(\d+):([\d.]+)", line)
+        if duration:
+            hours, minutes, seconds = duration.groups()
+            info["duration"] = int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+        elif "Video:" in line and info["video_codec"] is None:
+            params = line.split("Video:", 1)[1]
+            info["video_codec"] = params.split()[0].strip(",")
+            size = re.search(r"(\d{2,5})x(\d{2,5})", params)
+            if size:
+                info["width"], info["height"] = int(size.group(1)), int(size.group(2))
+            pix_fmt = re.search(r", (\w+)(?:\(|,)", params)
+            info["pix_fmt"] = pix_fmt.group(1) if pix_fmt else None
+            fps = re.search(r"([\d.]+) fps", params)
+            info["fps"] = float(fps.group(1)) if fps else None
+        elif "Audio:" in line and info["audio_codec"] is None:
+            params = line.split("Audio:", 1)[1]
+            info["audio_codec"] = params.split()[0].strip(",")
+            sample_rate = re.search(r"(\d+) Hz", params)
+            info["sample_rate"] = int(sample_rate.group(1)) if sample_rate else None
+            info["channels"] = params.split(",")[2].strip() if params.count(",") >= 2 else None
+    if info["video_codec"] is None:
+        raise ValueError(f"No se encontró un stream de video en {path}.")
+    return info
+
+def _can_stream_copy(probes: list[dict]) -> bool:
+    """Comprueba si todos los clips comparten códecs y parámetros, requisito para concatenar sin recodificar."""
+    keys = ("video_codec", "width", "height", "pix_fmt", "fps", "audio_codec", "sample_rate", "channels")
+    first = tuple(probes[0][key] for key in keys)
+    return all(tuple(probe[key] for key in keys) == first for probe in probes[1:])
+
+def _concat_stream_copy(clip_paths: list[str], output_path: str) -> bool:
+    """Concatena con el demuxer concat de ffmpeg y `-c copy` (sin recodificar)."""
+    with tempfile.NamedTemporaryFile("w", suffix=".txt", delete=False) as list_file:
+        for clip_path in clip_paths:
+            escaped = os.path.abspath(clip_path).replace("'", "'\\''")
+            list_file.write(f"file '{escaped}'\n")
+    try:
+        result = subprocess.run(
+            [_ffmpeg_exe(), "-hide_banner", "-loglevel", "error", "-y",
+             "-f", "concat", "-safe", "0", "-i", list_file.name,
+             "-c", "copy", "-movflags", "+faststart", output_path],
+            capture_output=True, text=True
+        )
+    finally:
+        os.remove(list_file.name)
+    if result.returncode != 0:
+        print(f"La concatenación sin recodificar falló: {result.stderr.strip()}")
+        return False
+    return True
+
+def _concat_reencode(clip_paths: list[str], output_path: str, with_audio: bool):
+    """Concatena recodificando a H.264/AAC 720x1280 (9:16), normalizando tamaño y fps."""
+    inputs = []
+    filters = []
+    streams = ""
+    for i, clip_path in enumerate(clip_paths):
+        inputs += ["-i", clip_path]
+        filters.append(
+            f"[{i}:v]scale={FINAL_WIDTH}:{FINAL_HEIGHT}:force_original_aspect_ratio=decrease,"
+            f"pad={FINAL_WIDTH}:{FINAL_HEIGHT}:(ow-iw)/2:(oh-ih)/2,setsar=1,fps={FINAL_FPS}[v{i}]"
+        )
+        streams += f"[v{i}]" + (f"[{i}:a]" if with_audio else "")
+    audio_flag = 1 if with_audio else 0
+    filters.append(f"{streams}concat=n={len(clip_paths)}:v=1:a={audio_flag}[v]" + ("[a]" if with_audio else ""))
+
+    command = [_ffmpeg_exe(), "-hide_banner", "-loglevel", "error", "-y", *inputs,
+               "-filter_complex", ";".join(filters), "-map", "[v]"]
+    if with_audio:
+        command += ["-map", "[a]", "-c:a", "aac", "-b:a", "192k"]
+    command += ["-c:v", "libx264", "-preset", "veryfast", "-crf", "20", "-pix_fmt", "yuv420p",
+                "-movflags", "+faststart", output_path]
+
+    result = subprocess.run(command, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"ffmpeg no pudo recodificar el video final: {result.stderr.strip()}")
+
+def assemble_final_video(project_id, clip_paths: list[str], output_path: str = None) -> str:
+    """
+    Une los clips de las escenas en un único video 9:16 (Reel).
+
+    Si todos los clips comparten códecs y parámetros se concatenan por stream
+    copy, sin recodificar; solo si difieren (o la copia falla) se recodifican.
+
+    Args:
+        project_id: Identificador del proyecto, usado para nombrar el archivo.
+        clip_paths (list[str]): URIs (o rutas locales) de los clips de las escenas, en orden.
+        output_path (str): Ruta local de salida opcional; si se indica, el video
+            no se guarda en el almacén de assets.
+
+    Returns:
+        str: La URI del video final (o `output_path`, si se indicó).
+    """
+    if not clip_paths:
+        raise ValueError("No hay clips para ensamblar el video final.")
+
+    store = get_asset_store()
+    clip_paths = [store.local_path(clip_path) for clip_path in clip_paths]
+    output_key = f"videos/{project_id}_final_cut.mp4"
+    local_output = output_path or store.working_path(output_key)
+
+    print(f"Ensamblando {len(clip_paths)} clips en el video final: {local_output}")
+    probes = [probe_video(clip_path) for clip_path in clip_paths]
+
+    if _can_stream_copy(probes) and _concat_stream_copy(clip_paths, local_output):
+        print("Video final ensamblado sin recodificar (stream copy).")
+    else:
+        print("Los clips no son compatibles para stream copy. Recodificando el video final...")
+        with_audio = all(probe["audio_codec"] for probe in probes)
+        _concat_reencode(clip_paths, local_output, with_audio)
+        print("Video final ensamblado con recodificación.")
+    return output_path or store.put_file(output_key, local_output)
+
+def _mux_audio(video_path: str, audio_path: str, output_path: str, offset: float = 0.0, duration: float = None):
+    """
+    Sustituye el audio de un video por un tramo de `audio_path`, copiando el video sin recodificar.
+
+    Args:
+        video_path (str): Video de entrada (su audio, si lo tiene, se descarta).
+        audio_path (str): Pista de audio de la que se toma el tramo.
+        output_path (str): Ruta del video resultante.
+        offset (float): Segundo de la pista en el que empieza el tramo.
+        duration (float): Duración del tramo; por defecto, la del video.
+    """
+    command = [_ffmpeg_exe(), "-hide_banner", "-loglevel", "error", "-y",
+               "-i", video_path, "-ss", f"{offset:.3f}"]
+    if duration:
+        command += ["-t", f"{duration:.3f}"]
+    command += ["-i", audio_path, "-map", "0:v:0", "-map", "1:a:0",
+                "-c:v", "copy", "-c:a", "aac", "-b:a", "192k", "-shortest",
+                "-movflags", "+faststart", output_path]
+    result = subprocess.run(command, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"ffmpeg no pudo añadir el audio a {video_path}: {result.stderr.strip()}")
+
+def _extract_audio(video_path: str, audio_path: str):
+    """Extrae la pista de audio de un video a un archivo AAC (.m4a)."""
+    result = subprocess.run(
+        [_ffmpeg_exe(), "-hide_banner", "-loglevel", "error", "-y",
+         "-i", video_path, "-vn", "-c:a", "aac", "-b:a", "192k", audio_path],
+        capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"ffmpeg no pudo extraer el audio de {video_path}: {result.stderr.strip()}")
+
+def add_ambient_audio(project_id, final_video_path: str, clip_paths: list[str], audio_prompt: str) -> dict:
+    """
+    Genera el sonido ambiente con una única llamada a mmaudio para todo el video
+    y lo mezcla localmente sobre el video final y sobre cada clip.
+
+    mmaudio recibe el video ya ensamblado con `duration` igual a su duración
+    total; de su salida solo se conserva la pista de audio, que se corta por
+    tramos para cada escena. Así se hace una sola predicción remota por
+    proyecto en lugar de una por escena y la banda sonora es continua.
+
+    Args:
+        project_id: Identificador del proyecto, usado para nombrar los archivos.
+        final_video_path (str): URI del video final ensamblado (sin audio).
+        clip_paths (list[str]): URIs de los clips de las escenas, en el mismo orden.
+        audio_prompt (str): Prompt del sonido ambiente.
+
+    Returns:
+        dict: Con las URIs de 'video_path' (video final con audio), 'audio_path'
+        (pista ambiente) y 'video_paths' (clips con su tramo de audio).
+    """
+    store = get_asset_store()
+    final_video_path = store.local_path(final_video_path)
+    final_video_key = f"videos/{os.path.basename(final_video_path)}"
+    clip_paths = [store.local_path(clip_path) for clip_path in clip_paths]
+
+    durations = [probe_video(clip_path)["duration"] or 0.0 for clip_path in clip_paths]
+    total_duration = probe_video(final_video_path)["duration"] or sum(durations)
+
+    print(f" \\_ Generando audio ambiente para todo el video ({total_duration:.1f}s): '{audio_prompt}'")
+    audio_input = {
+        "video": Path(final_video_path),
+        "prompt": audio_prompt,
+        "duration": round(total_duration, 2)
+    }
+
+    def produce_audio():
+        with open(final_video_path, "rb") as video_file:
+            audio_video_output = run_model(AUDIO_MODEL, {**audio_input, "video": video_file})
+        return audio_video_output.url
+
+    mmaudio_uri = _run_to_store(AUDIO_MODEL, audio_input, final_video_key.replace('.mp4', '_mmaudio.mp4'), produce_audio,
+                                label="Audio ambiente (video de mmaudio)")
+
+    audio_key = f"audio/{project_id}_ambient.m4a"
+    audio_path = store.working_path(audio_key)
+    _extract_audio(store.local_path(mmaudio_uri), audio_path)
+    audio_uri = store.put_file(audio_key, audio_path)
+
+    final_with_audio_key = final_video_key.replace('.mp4', '_with_audio.mp4')
+    final_with_audio_path = store.working_path(final_with_audio_key)
+    _mux_audio(final_video_path, audio_path, final_with_audio_path)
+    final_with_audio_uri = store.put_file(final_with_audio_key, final_with_audio_path)
+
+    clips_with_audio = []
+    offset = 0.0
+    for clip_path, duration in zip(clip_paths, durations):
+        clip_key = f"videos/{os.path.basename(clip_path).replace('.mp4', '_with_audio.mp4')}"
+        clip_with_audio_path = store.working_path(clip_key)
+        _mux_audio(clip_path, audio_path, clip_with_audio_path, offset=offset, duration=duration)
+        clips_with_audio.append(store.put_file(clip_key, clip_with_audio_path))
+        offset += duration
 
-            video_filename = f"{idea_id}_{i}_final.mp4"
-            save_path = os.path.join(video_dir, video_filename)
-            _download_video(output_url.url, save_path)
-
-            if audio_prompt:
-                print(f" \_ Generando audio para el video: '{audio_prompt}'")
-                with open(save_path, "rb") as video_file:
-                    audio_video_output = replicate.run(
-                        "zsxkib/mmaudio:62871fb59889b2d7c13777f08deb3b36bdff88f7e1d53a50ad7694548a41b484",
-                        input={
-                            "video": video_file,
-                            "prompt": audio_prompt
-                        }
-                    )
-                
-                final_video_path = save_path.replace('.mp4', '_with_audio.mp4')
-                _download_video(audio_video_output.url, final_video_path)
-                video_paths.append(final_video_path)
-            else:
-                video_paths.append(save_path)
-
-            # # ----------------
-            # save_path = "src/assets/videos/87_ae7a7fa1_0_final_with_audio.mp4"
-            # video_paths.append(save_path)
-            # # ----------------
-
-        except replicate.exceptions.ReplicateError as e:
-            print(f"Error de la API de Replicate al procesar {image_path}: {e}")
-            raise
-        except Exception as e:
-            print(f"Un error inesperado ocurrió al procesar {image_path}: {e}")
-            raise
-
-    print(f"Generación de videos completada. {len(video_paths)} videos creados.")
-    return video_paths
+    print(f"Audio ambiente añadido al video final y a {len(clips_with_audio)} clips.")
+    return {
+        "video_path": final_with_audio_uri,
+        "audio_path": audio_uri,
+        "video_paths": clips_with_audio
+    }